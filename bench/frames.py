@@ -0,0 +1,173 @@
+"""Headless end-to-end frame benchmark.
+
+Runs the game systems on a standalone OpenGL context with a fixed seed and a fixed frame time, then reports the timings
+of all measured scopes as JSON. Multiple asteroid counts can be given to find scaling cliffs, e.g.:
+
+    python -m bench.frames --asteroids 1000 10000 100000 1000000 --output report.json
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy
+import pygame
+
+import core
+import game
+from core import app
+
+
+# same asteroid density as the demo (500 asteroids on 16000x9000)
+ASTEROID_DENSITY: float = 500 / (16000 * 9000)
+
+
+def create_rows(template: core.Sprite, num_rows: int) -> numpy.ndarray:
+    """Creates sprite data for many copies of the given sprite without adding them one by one."""
+    return numpy.tile(template.to_array(), (num_rows, 1))
+
+
+class BenchmarkState(app.State):
+    """Populates a scene with the given number of objects and updates and renders it like the demo."""
+
+    def __init__(self, engine: app.Engine, num_asteroids: int, num_spacecrafts: int, num_particles: int) -> None:
+        super().__init__(engine)
+        # random streams derived from the engine's seed, so runs are reproducible like replays
+        rng = engine.make_rng('asteroids')
+        self.particle_rng = engine.make_rng('particle_origins')
+
+        self.num_particles = num_particles
+        self.scene = game.Scene(engine, max_num_particles=max(num_particles, 1))
+        self.physics = game.PhysicsSystem(self.scene, self.on_collision, continuous=True)
+        self.controls = game.ControlsSystem(self.scene)
+        self.renderer = game.RendererSystem(self.scene)
+
+        # spread asteroids over an area that keeps the density constant
+        world_size = (num_asteroids / ASTEROID_DENSITY) ** 0.5
+        asteroids = create_rows(core.Sprite(self.renderer.asteroids.get_texture()), num_asteroids)
+        asteroids[:, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y + 1] = \
+            rng.uniform(-world_size / 2, world_size / 2, (num_asteroids, 2))
+        asteroids[:, core.SpriteOffset.SIZE_X:core.SpriteOffset.SIZE_Y + 1] *= \
+            rng.uniform(0.05, 0.4, (num_asteroids, 1))
+        asteroids[:, core.SpriteOffset.ROTATION] = rng.uniform(0.0, 360.0, num_asteroids)
+        asteroids[:, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y + 1] = \
+            rng.uniform(-0.2, 0.2, (num_asteroids, 2))
+        self.scene.asteroids.data = asteroids.astype(numpy.float32)
+
+        # player in the center, surrounded by AI spacecrafts
+        spacecraft = core.Sprite(self.renderer.spacecrafts.get_texture(), clip=pygame.Rect(0, 0, 32, 32))
+        spacecrafts = create_rows(spacecraft, num_spacecrafts + 1)
+        spacecrafts[1:, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y + 1] = \
+            engine.make_rng('spacecrafts').uniform(-2000, 2000, (num_spacecrafts, 2))
+        self.scene.spacecrafts.data = spacecrafts.astype(numpy.float32)
+
+    def on_collision(self, index1: int, type1: game.ObjectType, index2: int, type2: game.ObjectType) -> None:
+        # keep the number of objects stable
+        pass
+
+    def process_event(self, event: pygame.event.Event) -> None:
+        pass
+
+    def update(self, elapsed_ms: float) -> None:
+        self.scene.save_state()
+
+        with self.engine.perf_monitor.scope('controls'):
+            self.controls.update(elapsed_ms)
+
+        with self.engine.perf_monitor.scope('physics'):
+            self.physics.update(elapsed_ms)
+
+        with self.engine.perf_monitor.scope('particles'):
+            # keep the number of particles stable
+            missing = self.num_particles - len(self.scene.particles)
+            if missing > 0:
+                origins = self.particle_rng.uniform(-800, 800, (missing, 2))
+                self.scene.particles.emit_batch(origins, radius=4.0, color=pygame.Color('orange'))
+            self.scene.particles.update(elapsed_ms)
+
+    def snapshot(self) -> None:
+        self.scene.snapshot()
+
+    def render(self, alpha: float) -> None:
+        with self.engine.perf_monitor.scope('camera'):
+            player = self.renderer.get_player_data(alpha)
+            self.scene.camera.center = core.Sprite.get_center(player)
+            self.scene.camera.rotation = player[core.SpriteOffset.ROTATION]
+            self.scene.camera.update()
+
+        self.renderer.render(alpha)
+
+
+def run_benchmark(engine: app.Engine, num_asteroids: int, num_spacecrafts: int, num_particles: int, num_frames: int,
+                  elapsed_ms: float) -> dict:
+    """Runs the given number of frames and returns a report of the timings. Objects are placed randomly, using streams
+    derived from the engine's seed.
+    """
+    engine.perf_monitor.history = num_frames
+    engine.perf_monitor.reset()
+    engine.push(BenchmarkState(engine, num_asteroids, num_spacecrafts, num_particles))
+
+    start = time.perf_counter()
+    engine.run_frames(num_frames, elapsed_ms)
+    # read back outstanding GPU queries
+    for _ in range(engine.gpu_profiler.latency):
+        engine.gpu_profiler.next_frame()
+    total_s = time.perf_counter() - start
+    engine.pop()
+
+    timings = dict()
+    for name in engine.perf_monitor.get_names():
+        stats = engine.perf_monitor.get_stats(name)
+        timings[name] = {
+            'count': stats.count,
+            'mean_ms': stats.mean_ms,
+            'p50_ms': stats.p50_ms,
+            'p95_ms': stats.p95_ms,
+            'p99_ms': stats.p99_ms,
+            'max_ms': stats.max_ms
+        }
+
+    return {
+        'asteroids': num_asteroids,
+        'spacecrafts': num_spacecrafts,
+        'particles': num_particles,
+        'frames': num_frames,
+        'elapsed_ms': elapsed_ms,
+        'fps': num_frames / total_s,
+        'timings': timings
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--asteroids', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000],
+                        help='asteroid counts to sweep')
+    parser.add_argument('--spacecrafts', type=int, default=100, help='number of AI spacecrafts')
+    parser.add_argument('--particles', type=int, default=10_000, help='number of particles kept alive')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the random number streams')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--elapsed-ms', type=float, default=1000 / 60, help='pretended duration of each frame')
+    parser.add_argument('--width', type=int, default=1600)
+    parser.add_argument('--height', type=int, default=900)
+    parser.add_argument('--output', help='JSON file to write, defaults to stdout')
+    args = parser.parse_args()
+
+    engine = app.Engine(args.width, args.height, headless=True, seed=args.seed)
+    engine.quality.enabled = False
+
+    reports = list()
+    for num_asteroids in args.asteroids:
+        report = run_benchmark(engine, num_asteroids, args.spacecrafts, args.particles, args.frames, args.elapsed_ms)
+        print(f'{num_asteroids} asteroids: {report["fps"]:.1f} fps', file=sys.stderr)
+        reports.append(report)
+
+    if args.output is None:
+        json.dump(reports, sys.stdout, indent=2)
+    else:
+        with open(args.output, 'w') as handle:
+            json.dump(reports, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""Micro-benchmarks for the hot kernels of the engine and the game systems.
+
+Each kernel is timed several times and its median duration per call is reported. Results can be stored as a baseline
+and later compared against it, where kernels slower than the threshold are reported as regressions:
+
+    python -m bench.kernels --save bench/baseline.json
+    python -m bench.kernels --compare bench/baseline.json --threshold 0.2
+"""
+
+import argparse
+import json
+import sys
+import timeit
+
+import glm
+import numpy
+import pygame
+
+from typing import Callable, Dict
+
+import core
+from core import app
+from game import physics
+
+
+NUM_SPRITES: int = 100_000
+NUM_PARTICLES: int = 50_000
+NUM_COLLIDING: int = 1_000
+
+Kernel = Callable[[], None]
+KERNELS: Dict[str, Callable[[app.Engine], Kernel]] = dict()
+
+
+def kernel(name: str) -> Callable:
+    """Registers a function that prepares a kernel's data and returns the callable to measure."""
+    def register(setup: Callable[[app.Engine], Kernel]) -> Callable[[app.Engine], Kernel]:
+        KERNELS[name] = setup
+        return setup
+    return register
+
+
+def create_sprites(engine: app.Engine, num_sprites: int) -> core.SpriteArray:
+    """Returns a sprite array with randomized positions, velocities and sizes."""
+    arr = core.SpriteArray()
+    arr.data = numpy.tile(core.Sprite(engine.context.texture((32, 32), 4)).to_array(), (num_sprites, 1))
+    positions = slice(core.SpriteOffset.POS_X, core.SpriteOffset.POS_Y + 1)
+    velocities = slice(core.SpriteOffset.VEL_X, core.SpriteOffset.VEL_Y + 1)
+    rng = engine.make_rng('sprites')
+    arr.data[:, positions] = rng.uniform(-5000, 5000, (num_sprites, 2))
+    arr.data[:, velocities] = rng.uniform(-0.2, 0.2, (num_sprites, 2))
+    return arr
+
+
+def create_particles(engine: app.Engine) -> core.ParticleSystem:
+    shaders = engine.cache.get_shaders('data/glsl/particles', ['vert', 'geom', 'frag'])
+    return core.ParticleSystem(engine.context, NUM_PARTICLES, 128, *shaders)
+
+
+@kernel('SpriteArray.add')
+def setup_sprite_array_add(engine: app.Engine) -> Kernel:
+    arr = core.SpriteArray()
+    s = core.Sprite(engine.context.texture((32, 32), 4))
+
+    def run() -> None:
+        arr.clear()
+        for _ in range(1_000):
+            arr.add(s)
+    return run
+
+
+@kernel('SpriteArray.clear')
+def setup_sprite_array_clear(engine: app.Engine) -> Kernel:
+    arr = create_sprites(engine, NUM_SPRITES)
+    arr.save_state()
+    data, previous = arr.data, arr.previous
+
+    def run() -> None:
+        # refill, so every run clears a full array (clearing replaces the data instead of modifying it)
+        arr.data, arr.previous = data, previous
+        arr.clear()
+    return run
+
+
+@kernel('Sprite.to_array')
+def setup_sprite_to_array(engine: app.Engine) -> Kernel:
+    return core.Sprite(engine.context.texture((32, 32), 4)).to_array
+
+
+@kernel('ParticleSystem.emit')
+def setup_particles_emit(engine: app.Engine) -> Kernel:
+    parts = create_particles(engine)
+    origin = pygame.math.Vector2(0, 0)
+    color = pygame.Color('orange')
+
+    def run() -> None:
+        parts.update(1_000_000)
+        for _ in range(1_000):
+            parts.emit(origin=origin, radius=4.0, color=color)
+    return run
+
+
+@kernel('ParticleSystem.update')
+def setup_particles_update(engine: app.Engine) -> Kernel:
+    parts = create_particles(engine)
+    parts.emit_batch(numpy.zeros((NUM_PARTICLES, 2)), radius=4.0, color=pygame.Color('orange'))
+    data = parts._data.copy()
+
+    def run() -> None:
+        parts._data = data.copy()
+        parts.update(16)
+    return run
+
+
+@kernel('ParticleSystem.render')
+def setup_particles_render(engine: app.Engine) -> Kernel:
+    parts = create_particles(engine)
+    parts.emit_batch(numpy.zeros((NUM_PARTICLES, 2)), radius=4.0, color=pygame.Color('orange'))
+
+    def run() -> None:
+        parts.render(glm.mat4x4(), glm.mat4x4())
+        engine.context.finish()
+    return run
+
+
+@kernel('Camera.query_visible')
+def setup_camera_query_visible(engine: app.Engine) -> Kernel:
+    camera = core.Camera(engine.context, engine.cache)
+    arr = create_sprites(engine, NUM_SPRITES)
+
+    def run() -> None:
+        # bypass the cache to measure the query itself
+        arr.touch()
+        camera.query_visible(arr)
+    return run
+
+
+@kernel('physics.query_collision_indices')
+def setup_query_collision_indices(engine: app.Engine) -> Kernel:
+    arr = create_sprites(engine, NUM_COLLIDING)
+    arr.data[:, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y + 1] *= 0.2
+    indices = numpy.arange(NUM_COLLIDING)
+    return lambda: physics.query_collision_indices(arr.data, indices, arr.data, indices, 1.0)
+
+
+@kernel('physics.update_movement')
+def setup_update_movement(engine: app.Engine) -> Kernel:
+    arr = create_sprites(engine, NUM_SPRITES)
+    return lambda: physics.update_movement(arr, 16, velocity_fade=0.0005)
+
+
+@kernel('RenderBatch.render')
+def setup_render_batch_render(engine: app.Engine) -> Kernel:
+    arr = create_sprites(engine, NUM_SPRITES)
+    texture = engine.context.texture((32, 32), 4)
+    batch = core.RenderBatch(engine.context, engine.cache, NUM_SPRITES, arr, texture)
+
+    def run() -> None:
+        batch.render(texture, glm.mat4x4(), glm.mat4x4())
+        engine.context.finish()
+    return run
+
+
+def measure(run: Kernel, repeat: int) -> float:
+    """Returns the median duration of a single call in ms."""
+    number = 1
+    # call often enough that a measurement takes at least 20ms
+    while timeit.timeit(run, number=number) < 0.02 and number < 10_000:
+        number *= 2
+
+    durations = timeit.repeat(run, number=number, repeat=repeat)
+    return float(numpy.median(durations)) / number * 1000
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> bool:
+    """Prints the results relative to the baseline and returns whether no kernel regressed beyond the threshold."""
+    passed = True
+    for name, duration_ms in results.items():
+        if name not in baseline:
+            print(f'{name}: {duration_ms:.4f}ms (no baseline)')
+            continue
+
+        change = duration_ms / baseline[name] - 1.0
+        regressed = change > threshold
+        passed &= not regressed
+        print(f'{name}: {duration_ms:.4f}ms ({change:+.1%}){" REGRESSION" if regressed else ""}')
+
+    return passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--save', help='write the results as baseline to this file')
+    parser.add_argument('--compare', help='compare the results against the baseline in this file')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown that counts as regression')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--seed', type=int, default=0, help='seed for the random number streams')
+    parser.add_argument('kernels', nargs='*', help='names of the kernels to run, defaults to all')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.kernels if name not in KERNELS]
+    if len(unknown) > 0:
+        parser.error(f'unknown kernels: {", ".join(unknown)}\navailable kernels: {", ".join(KERNELS)}')
+
+    engine = app.Engine(1600, 900, headless=True, seed=args.seed)
+
+    results = dict()
+    for name in args.kernels or KERNELS:
+        results[name] = measure(KERNELS[name](engine), args.repeat)
+
+    if args.save is not None:
+        with open(args.save, 'w') as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+        if not compare(results, baseline, args.threshold):
+            sys.exit(1)
+    else:
+        for name, duration_ms in results.items():
+            print(f'{name}: {duration_ms:.4f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,11 @@
 from .app import Engine, State
-from .render import RenderBatch, Camera, GuiCamera
-from .sprite import Sprite, SpriteArray
+from .render import RenderBatch, RenderQueue, RenderStats, CameraView, Camera, GuiCamera, RenderTarget
+from .sprite import Sprite, SpriteArray, SharedSpriteArray
 from .particles import ParticleSystem
+from .starfield import Starfield
+from .debug import DebugDraw
 from .sprite import Offset as SpriteOffset
-from .light import create_lightmap
-from .resources import Cache, texture_from_surface
+from .light import LightArray, LightRenderer
+from .resources import Cache, StreamingTexture, texture_from_surface
+from .archive import save_arrays, load_arrays
+from .quality import QualityKnob, QualityScheduler
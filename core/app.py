@@ -7,58 +7,356 @@ based on https://github.com/pyimgui/pyimgui/blob/master/doc/examples/integration
 
 import pygame
 import moderngl
+import numpy
+import threading
+import contextlib
+import collections
+import time
+import gc
+import json
+import os
+import zlib
+import concurrent.futures
 # FIXME
 # import imgui
 # from imgui.integrations.pygame import PygameRenderer
 
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Iterator, Tuple, Deque
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
 
-from . import resources
+from . import resources, quality, render, replay
 
 
-class PerformanceMonitor:
-    def __init__(self):
-        self.elapsed_ms: Dict[str, int] = {}
-        self._category: str = ''
-        self._enter_ticks = 0
+@dataclass
+class ScopeStats:
+    """Statistics of a scope's recent samples (in ms) and its total number of calls."""
+    count: int
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+@dataclass
+class TraceSpan:
+    """A span of time on a thread (or on the GPU track), as stored for trace export."""
+    name: str
+    category: str
+    start_ns: int
+    duration_ns: int
+    thread_id: int
+
 
-    def __enter__(self) -> None:
-        self._enter_ticks = pygame.time.get_ticks()
+GPU_THREAD_ID: int = -1
 
-    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
-        delta_time = pygame.time.get_ticks() - self._enter_ticks
-        self.elapsed_ms[self._category] = delta_time
 
-    def __call__(self, category: str) -> None:
-        self._category = category
+class PerformanceMonitor:
+    """Measures named scopes using a high resolution timer and keeps a history of samples per scope.
+
+    Scopes can be nested, where the inner scope's name is appended to the outer one's (e.g. 'physics/broadphase').
+    Nesting is tracked per thread.
+
+    Additionally, the most recent spans (scopes, GPU passes, asset loads, garbage collections) are kept, so they can be
+    exported as a Chrome trace (see dump_trace).
+    """
+
+    def __init__(self, history: int = 240, trace_capacity: int = 100_000) -> None:
+        """Create monitor that keeps the given number of samples per scope and spans for the trace."""
+        self.history = history
+        self._samples: Dict[str, numpy.ndarray] = dict()
+        self._counts: Dict[str, int] = dict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self._trace: Deque[TraceSpan] = collections.deque(maxlen=trace_capacity)
+        self._thread_names: Dict[int, str] = {GPU_THREAD_ID: 'GPU'}
+        self._start_ns = time.perf_counter_ns()
+        self._gc_start_ns = 0
+
+    def reset(self) -> None:
+        """Removes all samples and spans."""
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+        self._trace.clear()
+
+    def _get_stack(self) -> List[str]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = list()
+        return self._local.stack
+
+    @contextlib.contextmanager
+    def scope(self, name: str) -> Iterator[None]:
+        """Measures the time spent within the with-block."""
+        stack = self._get_stack()
+        path = f'{stack[-1]}/{name}' if len(stack) > 0 else name
+        stack.append(path)
+
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            elapsed_ns = time.perf_counter_ns() - start
+            stack.pop()
+            self.record(path, elapsed_ns / 1_000_000, start_ns=start)
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str) -> Iterator[None]:
+        """Adds the with-block to the trace without keeping statistics (e.g. for asset loading)."""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.trace(name, category, start, time.perf_counter_ns() - start)
+
+    def trace(self, name: str, category: str, start_ns: int, duration_ns: int,
+              thread_id: Optional[int] = None) -> None:
+        """Adds a span to the trace, where start_ns is based on time.perf_counter_ns. Defaults to the current thread."""
+        if thread_id is None:
+            thread = threading.current_thread()
+            thread_id = thread.ident
+            self._thread_names.setdefault(thread_id, thread.name)
+
+        self._trace.append(TraceSpan(name, category, start_ns, duration_ns, thread_id))
+
+    def record(self, name: str, elapsed_ms: float, start_ns: Optional[int] = None, category: str = 'cpu',
+               thread_id: Optional[int] = None) -> None:
+        """Stores a measurement that was taken elsewhere. If its start is known, it is also added to the trace."""
+        if start_ns is not None:
+            self.trace(name, category, start_ns, int(elapsed_ms * 1_000_000), thread_id)
+
+        with self._lock:
+            if name not in self._samples:
+                self._samples[name] = numpy.zeros(self.history, dtype=numpy.float64)
+                self._counts[name] = 0
+
+            self._samples[name][self._counts[name] % self.history] = elapsed_ms
+            self._counts[name] += 1
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._counts
+
+    def get_names(self) -> List[str]:
+        """Returns the names of all measured scopes, sorted so that nested scopes follow their parents."""
+        with self._lock:
+            return sorted(self._counts)
+
+    def get_last(self, name: str) -> float:
+        """Returns the last sample of the given scope."""
+        with self._lock:
+            return float(self._samples[name][(self._counts[name] - 1) % self.history])
+
+    def get_stats(self, name: str) -> ScopeStats:
+        """Returns statistics about the recent samples of the given scope."""
+        with self._lock:
+            count = self._counts[name]
+            samples = self._samples[name][:min(count, self.history)].copy()
+
+        p50, p95, p99 = numpy.percentile(samples, [50, 95, 99])
+        return ScopeStats(count=count, mean_ms=float(samples.mean()), p50_ms=float(p50), p95_ms=float(p95),
+                          p99_ms=float(p99), max_ms=float(samples.max()))
+
+    def _on_gc(self, phase: str, info: Dict[str, int]) -> None:
+        if phase == 'start':
+            self._gc_start_ns = time.perf_counter_ns()
+        else:
+            self.trace(f'gc (generation {info["generation"]})', 'gc', self._gc_start_ns,
+                       time.perf_counter_ns() - self._gc_start_ns)
+
+    def enable_gc_tracing(self, enable: bool) -> None:
+        """Adds garbage collection pauses to the trace."""
+        if enable and self._on_gc not in gc.callbacks:
+            gc.callbacks.append(self._on_gc)
+        elif not enable and self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+
+    def dump_trace(self, path: str) -> None:
+        """Writes the recorded spans as Chrome Trace Event JSON, which can be opened with chrome://tracing or Perfetto.
+        """
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id, 'args': {'name': name}}
+                  for thread_id, name in self._thread_names.items()]
+        for span in list(self._trace):
+            events.append({
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': (span.start_ns - self._start_ns) / 1000,
+                'dur': span.duration_ns / 1000,
+                'pid': pid,
+                'tid': span.thread_id
+            })
+
+        with open(path, 'w') as handle:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, handle)
+
+    def __str__(self) -> str:
+        lines = list()
+        for name in self.get_names():
+            stats = self.get_stats(name)
+            indent = '  ' * name.count('/')
+            lines.append(f'{indent}{name.split("/")[-1]}: {stats.mean_ms:.2f}ms (p95 {stats.p95_ms:.2f}ms, '
+                         f'max {stats.max_ms:.2f}ms) x{stats.count}')
+        return '\n'.join(lines)
+
+
+class GpuProfiler:
+    """Measures the GPU time, generated primitives and passed samples of render passes using OpenGL queries.
+
+    To avoid stalling the pipeline, results are read back after the given number of frames and recorded to the
+    performance monitor as 'gpu/<pass>'. Passes must not be nested.
+    """
+
+    def __init__(self, context: moderngl.Context, monitor: PerformanceMonitor, latency: int = 3) -> None:
+        """Create profiler that reports to the given monitor."""
+        self.context = context
+        self.monitor = monitor
+        self.latency = latency
+        self.enabled = True
+
+        # most recent results per pass
+        self.primitives: Dict[str, int] = dict()
+        self.samples: Dict[str, int] = dict()
+
+        self._frame = 0
+        self._queries: Dict[Tuple[int, str, int], moderngl.Query] = dict()
+        self._pending: List[List[Tuple[str, moderngl.Query, int]]] = [list() for _ in range(latency + 1)]
+
+    def _get_query(self, slot: int, name: str) -> moderngl.Query:
+        """Returns a query that is not in use by the given frame slot."""
+        occurrence = sum(1 for pending_name, *_ in self._pending[slot] if pending_name == name)
+        key = (slot, name, occurrence)
+        if key not in self._queries:
+            self._queries[key] = self.context.query(samples=True, time=True, primitives=True)
+        return self._queries[key]
+
+    @contextlib.contextmanager
+    def scope(self, name: str) -> Iterator[None]:
+        """Measures the render commands issued within the with-block."""
+        if not self.enabled:
+            yield
+            return
+
+        slot = self._frame % (self.latency + 1)
+        query = self._get_query(slot, name)
+        start_ns = time.perf_counter_ns()
+        with query:
+            yield
+        self._pending[slot].append((name, query, start_ns))
+
+    def next_frame(self) -> None:
+        """Reads back the results of the frame that was issued latency frames ago. Call this after each flip."""
+        self._frame += 1
+        slot = self._frame % (self.latency + 1)
+
+        elapsed_ns: Dict[str, int] = dict()
+        primitives: Dict[str, int] = dict()
+        samples: Dict[str, int] = dict()
+        for name, query, start_ns in self._pending[slot]:
+            elapsed_ns[name] = elapsed_ns.get(name, 0) + query.elapsed
+            primitives[name] = primitives.get(name, 0) + query.primitives
+            samples[name] = samples.get(name, 0) + query.samples
+            # the GPU's own clock is not available, so the span starts when the commands were issued
+            self.monitor.trace(f'gpu/{name}', 'gpu', start_ns, query.elapsed, GPU_THREAD_ID)
+        self._pending[slot] = list()
+
+        for name in elapsed_ns:
+            self.monitor.record(f'gpu/{name}', elapsed_ns[name] / 1_000_000)
+        self.primitives.update(primitives)
+        self.samples.update(samples)
 
     def __str__(self) -> str:
-        return '\n'.join(f'{key}: {self.elapsed_ms[key]}ms' for key in self.elapsed_ms)
+        return '\n'.join(f'{name}: {self.primitives[name]} primitives, {self.samples[name]} samples'
+                         for name in sorted(self.primitives))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class FixedTimestep:
+    """Accumulates frame times and splits them into fixed simulation steps.
+
+    If the simulation falls behind too far, at most max_steps are done per frame and the remaining time is dropped.
+    """
+
+    def __init__(self, rate: float, max_steps: int) -> None:
+        """Create timestep for the given simulation rate (in Hz)."""
+        self.step_ms = 1000.0 / rate
+        self.max_steps = max_steps
+        self.accumulator_ms = 0.0
+        # total time of all simulation steps so far
+        self.simulated_ms = 0.0
+
+    def advance(self, elapsed_ms: float) -> int:
+        """Adds the elapsed frame time and returns the number of simulation steps that are due."""
+        self.accumulator_ms += elapsed_ms
+
+        num_steps = int(self.accumulator_ms // self.step_ms)
+        if num_steps > self.max_steps:
+            # drop the time that cannot be caught up
+            num_steps = self.max_steps
+            self.accumulator_ms = self.step_ms * num_steps
+
+        self.accumulator_ms -= self.step_ms * num_steps
+        self.simulated_ms += self.step_ms * num_steps
+        return num_steps
+
+    def get_alpha(self) -> float:
+        """Returns how far the current frame is between the last and the next simulation step (from 0 to 1)."""
+        return self.accumulator_ms / self.step_ms
 
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
 class Engine:
-    """Manages the mainloop and holds a stack of game states, where the top one is handled until it quits."""
+    """Manages the mainloop and holds a stack of game states, where the top one is handled until it quits.
+
+    If pipelined is enabled, the simulation steps of a frame run on a worker thread while the main thread renders and
+    flips. Rendering then uses a snapshot of the state (see State.snapshot) that was taken before the simulation
+    continued.
+
+    States read their input from the input layer and draw random numbers from streams created by make_rng(). Both
+    together allow to record a session and replay it with exactly the same simulation (see record and replay).
+    """
 
     def __init__(self, width: float, height: float, ini_file: Optional[str] = None,
-                 log_file: Optional[str] = None) -> None:
+                 log_file: Optional[str] = None, headless: bool = False, seed: Optional[int] = None) -> None:
         """Create window and opengl context from the given resolution.
 
+        In headless mode, no visible window is opened. A standalone context renders into an offscreen framebuffer of
+        the given resolution instead (e.g. for benchmarks).
+
+        The seed is used for all random number streams. If it is None, a random seed is chosen.
+
         FIXME: document ini_file and log_file as soon as imgui works
         """
-        # setup pygame to work with opengl
-        pygame.init()
-        pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MAJOR_VERSION, 3)
-        pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MINOR_VERSION, 3)
-        pygame.display.gl_set_attribute(pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_CORE)
-
-        # create opengl context
-        pygame.display.set_mode((width, height), flags=pygame.OPENGL | pygame.DOUBLEBUF)
-        self.context = moderngl.create_context()
+        self.headless = headless
+
+        if headless:
+            # use a dummy window, so pygame's display and input functions keep working
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+            pygame.init()
+            pygame.display.set_mode((width, height))
+
+            self.context = moderngl.create_context(standalone=True)
+            self.context.simple_framebuffer((width, height)).use()
+        else:
+            # setup pygame to work with opengl
+            pygame.init()
+            pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MAJOR_VERSION, 3)
+            pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MINOR_VERSION, 3)
+            pygame.display.gl_set_attribute(pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_CORE)
+
+            # create opengl context
+            pygame.display.set_mode((width, height), flags=pygame.OPENGL | pygame.DOUBLEBUF)
+            self.context = moderngl.create_context()
+
         self.context.enable(moderngl.BLEND)  # required for alpha stuff
+        self.screen = self.context.fbo
 
         # prepare imgui
         # FIXME
@@ -72,10 +370,27 @@ class Engine:
         # prepare mainloop
         self.clock = pygame.time.Clock()
         self.max_fps = 800
+        self.timestep = FixedTimestep(rate=60, max_steps=5)
+        self.pipelined = False
+        # if set, the performance trace is written to this file when the mainloop quits
+        self.trace_file: Optional[str] = None
+        # if set, the recorded input is written to this file when the mainloop quits
+        self.record_file: Optional[str] = None
         self._queue = list()
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
 
-        self.cache = resources.Cache(self.context)
         self.perf_monitor = PerformanceMonitor()
+        self.perf_monitor.enable_gc_tracing(True)
+        self.cache = resources.Cache(self.context, self.perf_monitor)
+        self.gpu_profiler = GpuProfiler(self.context, self.perf_monitor)
+
+        # the scene is rendered at a scaled resolution and upscaled, while the gui is rendered at full resolution
+        self.render_target = render.RenderTarget(self.context, self.cache, (width, height))
+
+        self.quality = quality.QualityScheduler(self.perf_monitor, target_ms=1000 / 60)
+
+        self.seed = seed if seed is not None else numpy.random.SeedSequence().entropy
+        self.input = replay.InputLayer()
 
     def __del__(self):
         """Quit pygame when the engine is destroyed."""
@@ -89,43 +404,126 @@ class Engine:
         """Pops the current state from the stack."""
         self._queue.pop()
 
+    def make_rng(self, name: str) -> numpy.random.Generator:
+        """Returns a random number generator that is derived from the engine's seed and the given name.
+
+        Each system should use its own stream, so the numbers drawn by one system do not depend on the others.
+        """
+        return numpy.random.default_rng([self.seed, zlib.crc32(name.encode())])
+
+    def record(self, filename: str) -> None:
+        """Records the input from now on and writes it to the given file when the mainloop quits.
+
+        Quality adjustments are disabled, since they depend on the timing and would change the simulation.
+        """
+        self.record_file = filename
+        self.input.start_recording(self.seed)
+        self.quality.enabled = False
+
+    def replay(self, filename: str) -> None:
+        """Replays the recording from the given file at maximum speed, until it ends.
+
+        This has to be called before the states are created, because it restores the recorded seed. Quality
+        adjustments are disabled like while recording.
+        """
+        self.input.load(filename)
+        self.seed = self.input.seed
+        self.quality.enabled = False
+
+    def simulate(self, state: 'State', num_steps: int) -> None:
+        """Updates the given state by the given number of fixed simulation steps."""
+        with self.perf_monitor.scope('update'):
+            for _ in range(num_steps):
+                state.update(self.timestep.step_ms)
+
     def run(self) -> None:
         """Mainloop that forwards events, updates and renders the game state."""
-        while True:
-            # grab top state
-            try:
-                state = self._queue[-1]
-            except IndexError:
-                # quit mainloop
+        while len(self._queue) > 0 and not self.input.is_finished():
+            # replays run unlimited and use the recorded frame times instead
+            elapsed_ms = self.clock.tick(0 if self.input.is_replaying() else self.max_fps)
+            self.run_frame(elapsed_ms)
+
+        self.quit()
+
+    def run_frames(self, num_frames: int, elapsed_ms: float) -> None:
+        """Runs the given number of frames as fast as possible, pretending that each frame took elapsed_ms."""
+        for _ in range(num_frames):
+            if len(self._queue) == 0 or self.input.is_finished():
                 break
+            self.run_frame(elapsed_ms)
 
-            with self.perf_monitor:
-                self.perf_monitor('input_events')
+    def quit(self) -> None:
+        """Waits for background work and writes the trace and record files (if set)."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
 
-                # handle events
-                for event in pygame.event.get():
-                    # FIXME
-                    # self._impl.process_event(event)
-                    state.process_event(event)
+        if self.trace_file is not None:
+            self.perf_monitor.dump_trace(self.trace_file)
 
-            # update app logic
-            elapsed_ms = self.clock.tick(self.max_fps)
-            # FIXME
-            # imgui.new_frame()
+        if self.record_file is not None:
+            self.input.save(self.record_file)
 
-            state.update(elapsed_ms)
+    def run_frame(self, elapsed_ms: float) -> None:
+        """Forwards events, updates and renders the top state for a single frame that took elapsed_ms.
 
-            # render app
-            with self.perf_monitor:
-                self.perf_monitor('opengl_render')
+        While replaying, the recorded frame time is used instead of elapsed_ms.
+        """
+        if self.pipelined and self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='simulation')
 
-                self.context.clear()
-                state.render()
+        # grab top state
+        state = self._queue[-1]
+        frame_start = time.perf_counter_ns()
+
+        with self.perf_monitor.scope('input_events'):
+            # handle live, recorded or replayed events
+            elapsed_ms, events = self.input.poll(elapsed_ms)
+            for event in events:
                 # FIXME
-                # imgui.render()
-                # self._impl.render(imgui.get_draw_data())
+                # self._impl.process_event(event)
+                state.process_event(event)
+
+        # FIXME
+        # imgui.new_frame()
+
+        # update app logic using fixed simulation steps
+        num_steps = self.timestep.advance(elapsed_ms)
+        simulation = None
+        if self.pipelined:
+            # render a snapshot while the simulation continues in the background
+            state.snapshot()
+            simulation = self._executor.submit(self.simulate, state, num_steps)
+        else:
+            self.simulate(state, num_steps)
+
+        # render app
+        with self.perf_monitor.scope('opengl_render'):
+            self.render_target.use()
+            state.render(self.timestep.get_alpha())
+
+            self.screen.use()
+            self.context.clear()
+            self.render_target.blit()
+            state.render_gui()
+            # FIXME
+            # imgui.render()
+            # self._impl.render(imgui.get_draw_data())
+            if self.headless:
+                self.context.finish()
+            else:
                 pygame.display.flip()
 
+        self.gpu_profiler.next_frame()
+
+        if simulation is not None:
+            # wait for the simulation (and raise its exceptions) before handling the next events
+            simulation.result()
+
+        # adjust quality to the time this frame took
+        self.perf_monitor.record('frame', (time.perf_counter_ns() - frame_start) / 1_000_000, start_ns=frame_start)
+        self.quality.update()
+
 
 class State(ABC):
     """Abstract state class. Derive to create a custom game state (e.g. pause screen)."""
@@ -137,7 +535,21 @@ class State(ABC):
     def process_event(self, event: pygame.event.Event) -> None: ...
 
     @abstractmethod
-    def update(self, elapsed_ms: int) -> None: ...
+    def update(self, elapsed_ms: float) -> None:
+        """Advance the simulation by one fixed step of elapsed_ms."""
+
+    def snapshot(self) -> None:
+        """Copy everything that render() reads, so update() can modify the original data concurrently.
+
+        This is only called in pipelined mode. Default implementation does nothing.
+        """
 
     @abstractmethod
-    def render(self) -> None: ...
+    def render(self, alpha: float) -> None:
+        """Render the state, where alpha (from 0 to 1) is used to interpolate between the last two steps.
+
+        This renders into the engine's render target, which may use a lower resolution than the screen.
+        """
+
+    def render_gui(self) -> None:
+        """Render the user interface on top of the upscaled scene, at full resolution. Default does nothing."""
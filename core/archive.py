@@ -0,0 +1,82 @@
+"""Versioned binary archive of named numpy arrays, which are memory-mapped when loading.
+
+Layout: magic bytes, format version and header size (little endian uint32 each), followed by a JSON header and the
+raw array data. The header describes each array's offset, shape and dtype, and holds arbitrary metadata. Arrays are
+aligned, so they can be mapped without copying.
+"""
+
+import os
+import json
+import struct
+import numpy
+
+from typing import Any, Dict, Tuple
+
+
+MAGIC: bytes = b'PGMA'
+FORMAT_VERSION: int = 1
+ALIGNMENT: int = 64
+
+_PREFIX = struct.Struct('<4sII')
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_arrays(path: str, arrays: Dict[str, numpy.ndarray], metadata: Dict[str, Any]) -> None:
+    """Writes the given arrays and JSON-serializable metadata to the given file.
+
+    The file is replaced atomically, so arrays that are still mapped from it (see load_arrays) can be saved to it again.
+    """
+    arrays = {name: numpy.ascontiguousarray(arr) for name, arr in arrays.items()}
+
+    # the header's size is needed to compute the offsets, so they are relative to the end of the (aligned) header
+    entries = dict()
+    offset = 0
+    for name, arr in arrays.items():
+        entries[name] = {'offset': offset, 'shape': list(arr.shape), 'dtype': arr.dtype.str}
+        offset = _align(offset + arr.nbytes)
+    header = json.dumps({'arrays': entries, 'metadata': metadata}).encode('utf-8')
+    data_start = _align(_PREFIX.size + len(header))
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as handle:
+        handle.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+        handle.write(header)
+        for name, arr in arrays.items():
+            handle.seek(data_start + entries[name]['offset'])
+            arr.tofile(handle)
+        handle.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def load_arrays(path: str) -> Tuple[Dict[str, numpy.ndarray], Dict[str, Any]]:
+    """Maps the arrays of the given file into memory and returns them with the metadata.
+
+    The arrays are copy-on-write: they can be modified in place without changing the file. Raises a ValueError if the
+    file is no archive or was written by another format version.
+    """
+    with open(path, 'rb') as handle:
+        prefix = handle.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise ValueError(f'{path} is not an archive')
+        magic, version, header_size = _PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an archive')
+        if version != FORMAT_VERSION:
+            raise ValueError(f'{path} has format version {version}, expected {FORMAT_VERSION}')
+        header = json.loads(handle.read(header_size).decode('utf-8'))
+
+    data_start = _align(_PREFIX.size + header_size)
+    arrays = dict()
+    for name, entry in header['arrays'].items():
+        shape = tuple(entry['shape'])
+        if numpy.prod(shape) == 0:
+            # empty arrays cannot be mapped
+            arrays[name] = numpy.zeros(shape, dtype=entry['dtype'])
+        else:
+            arrays[name] = numpy.memmap(path, dtype=entry['dtype'], mode='c', offset=data_start + entry['offset'],
+                                        shape=shape).view(numpy.ndarray)
+
+    return arrays, header['metadata']
@@ -0,0 +1,121 @@
+"""Batched debug drawing of outlines (circles, lines, rectangles and arrows) using signed distance fields.
+
+Primitives are collected during a frame and drawn with a single instanced draw call, where each primitive is a quad
+around its bounds and the fragment shader evaluates the primitive's distance field.
+"""
+
+import moderngl
+import numpy
+import pygame
+import glm
+
+from enum import IntEnum, auto
+from typing import List, Union
+
+from . import resources
+
+
+class Shape(IntEnum):
+    CIRCLE = 0
+    LINE = auto()
+    RECT = auto()
+
+
+class Offset(IntEnum):
+    """Provides offsets for accessing individual data of a primitive."""
+    SHAPE = 0
+    # center (circle), start (line) or lower left corner (rect)
+    A_X = auto()
+    A_Y = auto()
+    # end (line) or upper right corner (rect)
+    B_X = auto()
+    B_Y = auto()
+    RADIUS = auto()
+    # line width in pixels
+    THICKNESS = auto()
+    COLOR_R = auto()
+    COLOR_G = auto()
+    COLOR_B = auto()
+    COLOR_A = auto()
+
+
+class DebugDraw:
+    """Collects debug primitives in world coordinates and renders them all at once."""
+
+    def __init__(self, context: moderngl.Context, cache: resources.Cache, max_num_primitives: int = 10_000) -> None:
+        """Creates the shaders and a buffer for the given number of primitives, which grows if necessary."""
+        self._max_num_primitives = max_num_primitives
+        self._primitives: List[numpy.ndarray] = list()
+
+        vertex_shader, fragment_shader = cache.get_shaders('data/glsl/debug', ['vert', 'frag'])
+        self._program = context.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader)
+        self._vbo = context.buffer(reserve=len(Offset) * 4 * max_num_primitives, dynamic=True)
+        self._vao = context.vertex_array(self._program, [(self._vbo, '1f 2f 2f 1f 1f 4f/i', 'in_shape', 'in_a', 'in_b',
+                                                          'in_radius', 'in_thickness', 'in_color')])
+
+    def __len__(self) -> int:
+        """Returns the number of primitives that are drawn with the next render call."""
+        return sum(len(primitives) for primitives in self._primitives)
+
+    def _add(self, shape: Shape, a: numpy.ndarray, b: numpy.ndarray, radius: Union[float, numpy.ndarray],
+             color: pygame.Color, thickness: float) -> None:
+        data = numpy.zeros((len(a), len(Offset)), dtype=numpy.float32)
+        data[:, Offset.SHAPE] = shape
+        data[:, Offset.A_X:Offset.A_Y+1] = a
+        data[:, Offset.B_X:Offset.B_Y+1] = b
+        data[:, Offset.RADIUS] = radius
+        data[:, Offset.THICKNESS] = thickness
+        data[:, Offset.COLOR_R:Offset.COLOR_A+1] = color.normalize()
+        self._primitives.append(data)
+
+    def circles(self, centers: numpy.ndarray, radii: Union[float, numpy.ndarray], color: pygame.Color,
+                thickness: float = 1.0) -> None:
+        """Add a circle outline per row of the given centers array."""
+        self._add(Shape.CIRCLE, centers, centers, radii, color, thickness)
+
+    def lines(self, starts: numpy.ndarray, ends: numpy.ndarray, color: pygame.Color, thickness: float = 1.0) -> None:
+        """Add a line from each row of starts to the same row of ends."""
+        self._add(Shape.LINE, starts, ends, 0.0, color, thickness)
+
+    def rects(self, mins: numpy.ndarray, maxs: numpy.ndarray, color: pygame.Color, thickness: float = 1.0) -> None:
+        """Add a rectangle outline per row, given its lower left and upper right corners."""
+        self._add(Shape.RECT, mins, maxs, 0.0, color, thickness)
+
+    def arrows(self, starts: numpy.ndarray, ends: numpy.ndarray, color: pygame.Color, thickness: float = 1.0,
+               head: float = 0.25) -> None:
+        """Add an arrow from each row of starts to the same row of ends, with a head relative to its length."""
+        self.lines(starts, ends, color, thickness)
+
+        # head consists of two lines, rotated by +-30 degree against the arrow's direction
+        back = (starts - ends) * head
+        for angle in (numpy.radians(30.0), numpy.radians(-30.0)):
+            cos, sin = numpy.cos(angle), numpy.sin(angle)
+            rotated = numpy.stack([back[:, 0] * cos - back[:, 1] * sin, back[:, 0] * sin + back[:, 1] * cos], axis=1)
+            self.lines(ends, ends + rotated, color, thickness)
+
+    def clear(self) -> None:
+        """Remove all primitives."""
+        self._primitives = list()
+
+    def render(self, view_matrix: glm.mat4x4, projection_matrix: glm.mat4x4, zoom: float) -> int:
+        """Render all primitives using the given camera matrices and zoom (to keep line widths in pixels), then
+        remove them. Returns the number of uploaded bytes.
+        """
+        if len(self._primitives) == 0:
+            return 0
+
+        data = numpy.concatenate(self._primitives)
+        self.clear()
+
+        if len(data) > self._max_num_primitives:
+            # grow buffer
+            self._max_num_primitives = len(data)
+            self._vbo.orphan(data.nbytes)
+        self._vbo.write(data.tobytes())
+
+        self._program['view'].write(view_matrix)
+        self._program['projection'].write(projection_matrix)
+        self._program['zoom'] = zoom
+
+        self._vao.render(mode=moderngl.TRIANGLE_STRIP, vertices=4, instances=len(data))
+        return data.nbytes
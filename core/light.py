@@ -1,70 +1,173 @@
+"""Lighting that accumulates many dynamic lights in a single instanced draw call into a low resolution light buffer,
+which is then composited over the scene.
+"""
+
 import moderngl
 import numpy
 import pygame
+import glm
 
+from enum import IntEnum, auto
+from typing import Optional
 
-# FIXME: load from data/glsl/light.vert and data/glsl/light.frag
-def create_lightmap(context: moderngl.Context, radius: int) -> moderngl.Texture:
-    vert = '''
-    #version 330
-
-    in vec2 in_vert;
-    in vec2 in_texcoord;
-
-    out vec2 texcoord;
-
-    void main() {
-        gl_Position = vec4(in_vert, 0.0, 1.0);
-        texcoord = in_texcoord;
-    }
-'''
-
-    frag = '''
-    #version 330
-
-    uniform vec2 center;
-    uniform float radius;
-    uniform vec4 color;
-
-    in vec2 texcoord;
-    out vec4 out_color;
-
-    void main() {
-        float dist = distance(texcoord, center);
-        float intensity = exp(-6.0 * dist / radius);
-        vec3 tmp_color = color.xyz * intensity;
-        out_color = vec4(tmp_color, color.a * intensity);
-    }
-'''
-
-    prog = context.program(vertex_shader=vert, fragment_shader=frag)
-
-    vertices = numpy.array([
-        # x, y, u, v
-        -1.0, -1.0, 0.0, 0.0,
-        1.0, -1.0, 1.0, 0.0,
-        1.0, 1.0, 1.0, 1.0,
-        -1.0, 1.0, 0.0, 1.0,
-    ])
-
-    vbo = context.buffer(vertices.astype('f4').tobytes())
-    vao = context.vertex_array(prog, [(vbo, '2f 2f', 'in_vert', 'in_texcoord')])
-
-    size = (2 * radius, 2 * radius)
-    texture = context.texture(size, 4)
-    fbo = context.framebuffer(color_attachments=[texture])
-
-    prog['center'].value = (0.5, 0.5)
-    prog['radius'].value = 1.0
-    prog['color'].value = pygame.Color('white').normalize()
-
-    fbo.use()
-    context.clear(0.0, 0.0, 0.0, 0.0)
-    vao.render(mode=moderngl.TRIANGLE_FAN)
-    context.screen.use()
+from . import resources
 
-    #data = numpy.frombuffer(texture.read(), dtype=numpy.uint8).reshape(*size, 4)
-    #surface = pygame.image.frombuffer(data, size, 'RGBA')
-    #pygame.image.save(surface, '/tmp/output.png')
 
-    return texture
+class Offset(IntEnum):
+    """Provides offsets for accessing individual data within the LightArray's array."""
+    POS_X = 0
+    POS_Y = auto()
+    RADIUS = auto()
+    COLOR_R = auto()
+    COLOR_G = auto()
+    COLOR_B = auto()
+    INTENSITY = auto()
+    # loss of intensity per ms, zero for lights that do not fade
+    DECAY = auto()
+
+
+# lights below this intensity are removed
+FADE_THRESHOLD: float = 0.01
+
+
+def restore_framebuffer(context: moderngl.Context, fbo: Optional[moderngl.Framebuffer]) -> None:
+    """Binds the given framebuffer again, which was bound before rendering offscreen.
+
+    Standalone contexts (e.g. headless) start without any framebuffer bound, so then the screen is bound if there is
+    one. Otherwise, the offscreen framebuffer stays bound.
+    """
+    if fbo is None:
+        fbo = context.screen
+    if fbo is not None:
+        fbo.use()
+
+
+class LightArray:
+    """Stores lights in a tightly packed form."""
+
+    def __init__(self) -> None:
+        self.data = numpy.zeros((0, len(Offset)), dtype=numpy.float32)
+        self.front: Optional['LightArray'] = None
+
+    def __len__(self) -> int:
+        """Returns the number of lights."""
+        return self.data.shape[0]
+
+    def add(self, center: pygame.math.Vector2, radius: float, color: pygame.Color, intensity: float = 1.0,
+            decay: float = 0.0) -> None:
+        """Add a single light."""
+        self.add_batch(numpy.array([center.xy]), radius, color, intensity, decay)
+
+    def add_batch(self, centers: numpy.ndarray, radius: float, color: pygame.Color, intensity: float = 1.0,
+                  decay: float = 0.0) -> None:
+        """Add one light per row of the given centers array at once."""
+        data = numpy.zeros((len(centers), len(Offset)), dtype=numpy.float32)
+        data[:, Offset.POS_X:Offset.POS_Y+1] = centers
+        data[:, Offset.RADIUS] = radius
+        data[:, Offset.COLOR_R:Offset.COLOR_B+1] = color.normalize()[:-1]
+        data[:, Offset.INTENSITY] = intensity
+        data[:, Offset.DECAY] = decay
+
+        self.data = numpy.concatenate([self.data, data])
+
+    def clear(self) -> None:
+        """Remove all lights."""
+        self.data = numpy.zeros((0, len(Offset)), dtype=numpy.float32)
+
+    def update(self, elapsed_ms: float) -> None:
+        """Fade the lights by their decay and remove the ones that faded out."""
+        self.data[:, Offset.INTENSITY] -= self.data[:, Offset.DECAY] * elapsed_ms
+        self.data = self.data[self.data[:, Offset.INTENSITY] > FADE_THRESHOLD]
+
+    def snapshot(self) -> None:
+        """Copy the lights to front, which is used for rendering while the original keeps being updated."""
+        front = LightArray()
+        front.data = self.data.copy()
+        self.front = front
+
+    def get_front(self) -> 'LightArray':
+        """Returns the array that is used for rendering: the last snapshot if there is one, otherwise the array."""
+        return self if self.front is None else self.front
+
+
+class LightRenderer:
+    """Renders lights additively into a light buffer at a fraction of the screen resolution and composites it.
+
+    All lights of a frame are drawn as instanced quads with a single draw call.
+    """
+
+    def __init__(self, context: moderngl.Context, cache: resources.Cache, scale: float = 0.5,
+                 max_num_lights: int = 1_000) -> None:
+        """Creates the shaders and a light buffer that is scaled relative to the window."""
+        self._context = context
+        self._max_num_lights = max_num_lights
+
+        vertex_shader, fragment_shader = cache.get_shaders('data/glsl/light', ['vert', 'frag'])
+        self._program = context.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader)
+        self._vbo = context.buffer(reserve=len(Offset) * 4 * max_num_lights, dynamic=True)
+        self._vao = context.vertex_array(self._program, [(self._vbo, '2f 1f 3f 1f 4x/i', 'in_position', 'in_radius',
+                                                          'in_color', 'in_intensity')])
+
+        vertex_shader, fragment_shader = cache.get_shaders('data/glsl/light_composite', ['vert', 'frag'])
+        self._composite_program = context.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader)
+        self._composite_program['light_texture'] = 0
+        self._composite_vao = context.vertex_array(self._composite_program, [])
+
+        self._texture: Optional[moderngl.Texture] = None
+        self._fbo: Optional[moderngl.Framebuffer] = None
+        self.set_scale(scale)
+
+    def set_scale(self, scale: float) -> None:
+        """(Re)creates the light buffer with the given fraction of the window resolution (e.g. 0.5 or 0.25)."""
+        self.scale = scale
+        width, height = pygame.display.get_window_size()
+        size = (max(int(width * scale), 1), max(int(height * scale), 1))
+
+        if self._fbo is not None:
+            self._fbo.release()
+            self._texture.release()
+
+        self._texture = self._context.texture(size, 4, dtype='f2')
+        self._texture.filter = moderngl.LINEAR, moderngl.LINEAR
+        self._fbo = self._context.framebuffer(color_attachments=[self._texture])
+
+    def get_texture(self) -> moderngl.Texture:
+        """Returns the light buffer."""
+        return self._texture
+
+    def render(self, view_matrix: glm.mat4x4, projection_matrix: glm.mat4x4, *arrays: LightArray) -> int:
+        """Accumulate the lights of all given arrays (or their last snapshots) in the light buffer. Returns the number
+        of uploaded bytes.
+        """
+        data = numpy.concatenate([numpy.zeros((0, len(Offset)), dtype=numpy.float32)] +
+                                 [arr.get_front().data for arr in arrays])
+
+        if len(data) > self._max_num_lights:
+            # grow buffer
+            self._max_num_lights = len(data)
+            self._vbo.orphan(len(Offset) * 4 * self._max_num_lights)
+        self._vbo.write(data.tobytes())
+
+        previous_fbo = self._context.fbo
+        previous_viewport = self._context.viewport
+        self._fbo.use()
+        self._context.clear(0.0, 0.0, 0.0, 0.0)
+
+        if len(data) > 0:
+            self._program['view'].write(view_matrix)
+            self._program['projection'].write(projection_matrix)
+            self._context.blend_func = moderngl.ADDITIVE_BLENDING
+            self._vao.render(mode=moderngl.TRIANGLE_STRIP, vertices=4, instances=len(data))
+            self._context.blend_func = moderngl.DEFAULT_BLENDING
+
+        restore_framebuffer(self._context, previous_fbo)
+        # keep the viewport of a scaled render target
+        self._context.viewport = previous_viewport
+        return data.nbytes
+
+    def composite(self) -> None:
+        """Add the light buffer onto the current framebuffer."""
+        self._texture.use(0)
+        self._context.blend_func = moderngl.ADDITIVE_BLENDING
+        self._composite_vao.render(mode=moderngl.TRIANGLES, vertices=3)
+        self._context.blend_func = moderngl.DEFAULT_BLENDING
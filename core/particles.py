@@ -4,7 +4,6 @@
 import pygame
 import moderngl
 import numpy
-import random
 import glm
 
 from enum import IntEnum, auto
@@ -37,17 +36,25 @@ class ParticleSystem:
     """Manages creating, updating and rendering lots of circular particles."""
 
     def __init__(self, context: moderngl.Context, max_num_particles: int, resolution: float, vertex_shader: str,
-                 geometry_shader: str, fragment_shader: str) -> None:
+                 geometry_shader: str, fragment_shader: str, rng: Optional[numpy.random.Generator] = None) -> None:
         """Create shader-based particle system with a given maximum number of particles, where each particle is a
         circle with the given texture resolution.
+
+        Random numbers are drawn from the given generator (e.g. a seeded one for reproducible runs).
         """
         self._max_num_particles = max_num_particles
+        self._limit = max_num_particles
+        self._rng = rng if rng is not None else numpy.random.default_rng()
         self._data = numpy.zeros((0, len(Offset)), dtype=numpy.float32)
+        self._front: Optional[numpy.ndarray] = None
 
         self._program = context.program(vertex_shader=vertex_shader, geometry_shader=geometry_shader,
                                         fragment_shader=fragment_shader)
         self._program['sprite_texture'] = 0
 
+        # fraction of emitted particles that are actually created
+        self.emission_rate = 1.0
+
         self._vbo = context.buffer(reserve=max_num_particles * len(Offset) * 4, dynamic=True)
         self._vao = context.vertex_array(self._program,
                                          [(self._vbo, '2f 2f 1f 1f 3f', 'in_position', 'in_direction', 'in_scale',
@@ -62,6 +69,20 @@ class ParticleSystem:
         """Returns the number of particles that are currently in use."""
         return len(self._data)
 
+    @property
+    def data(self) -> numpy.ndarray:
+        """Returns the particles' data (see Offset)."""
+        return self._data
+
+    @data.setter
+    def data(self, value: numpy.ndarray) -> None:
+        """Replaces all particles by the given data (see Offset)."""
+        self._data = value
+
+    def set_limit(self, limit: int) -> None:
+        """Limits the number of particles below the maximum. Existing particles are kept until they fade."""
+        self._limit = min(limit, self._max_num_particles)
+
     def emit(self, origin: pygame.math.Vector2, radius: float, color: pygame.Color,
              impact: Optional[pygame.math.Vector2] = None, delta_degree: float = 180.0, spread: float = 0.0,
              speed: float = 1.0) -> None:
@@ -71,7 +92,10 @@ class ParticleSystem:
         direction the particle is emitted. As default, the particle moves into the opposite direction (away from the
         impact vector). The velocity vector is randomly rotated within the given delta_degree value.
         """
-        if len(self) == self._max_num_particles:
+        if len(self) >= self._limit:
+            return
+
+        if self.emission_rate < 1.0 and self._rng.random() >= self.emission_rate:
             return
 
         if spread == 0.0:
@@ -81,26 +105,75 @@ class ParticleSystem:
         color_norm = color.normalize()[:-1]
 
         # randomize the particle's velocity vector
-        angle = 180 + random.uniform(-delta_degree, delta_degree)
+        angle = 180 + self._rng.uniform(-delta_degree, delta_degree)
         if impact is None:
             impact = pygame.math.Vector2(0, 1)
-        velocity = impact.rotate(angle) * random.uniform(1.0, 10.0) * speed
+        velocity = impact.rotate(angle) * self._rng.uniform(1.0, 10.0) * speed
+
+        if not self._data.flags.owndata:
+            # e.g. memory-mapped data cannot be resized in place
+            self._data = self._data.copy()
 
         # resize array
         self._data.resize((self._data.shape[0] + 1, self._data.shape[1]), refcheck=False)
         index = self._data.shape[0] - 1
 
         # create particle data
-        self._data[index, Offset.POS_X] = origin.x + random.uniform(-spread, spread)
-        self._data[index, Offset.POS_Y] = origin.y + random.uniform(-spread, spread)
+        self._data[index, Offset.POS_X] = origin.x + self._rng.uniform(-spread, spread)
+        self._data[index, Offset.POS_Y] = origin.y + self._rng.uniform(-spread, spread)
         self._data[index, Offset.DIR_X] = velocity.x
         self._data[index, Offset.DIR_Y] = velocity.y
         self._data[index, Offset.SIZE] = radius
-        self._data[index, Offset.SCALE] = 1 + random.random()
+        self._data[index, Offset.SCALE] = 1 + self._rng.random()
         self._data[index, Offset.COLOR_R] = color_norm[0]
         self._data[index, Offset.COLOR_G] = color_norm[1]
         self._data[index, Offset.COLOR_B] = color_norm[2]
 
+    def emit_batch(self, origins: numpy.ndarray, radius: float, color: pygame.Color,
+                   impacts: Optional[numpy.ndarray] = None, delta_degree: float = 180.0, spread: float = 0.0,
+                   speed: float = 1.0) -> None:
+        """Emit one particle per row of the given origins array at once, with an optional impact vector per row.
+
+        Works like emit() but without calling it per particle. Particles beyond the limit are skipped.
+        """
+        if impacts is None:
+            impacts = numpy.tile([0.0, 1.0], (len(origins), 1))
+
+        if self.emission_rate < 1.0:
+            keep = self._rng.random(len(origins)) < self.emission_rate
+            origins = origins[keep]
+            impacts = impacts[keep]
+
+        num_particles = min(len(origins), self._limit - len(self))
+        if num_particles <= 0:
+            return
+
+        origins = origins[:num_particles]
+        impacts = impacts[:num_particles]
+
+        if spread == 0.0:
+            spread = radius
+
+        # normalize color but skip alpha value
+        color_norm = color.normalize()[:-1]
+
+        # randomize the particles' velocity vectors
+        angles = numpy.radians(180 + self._rng.uniform(-delta_degree, delta_degree, num_particles))
+        cos, sin = numpy.cos(angles), numpy.sin(angles)
+        velocities = numpy.stack([impacts[:, 0] * cos - impacts[:, 1] * sin,
+                                  impacts[:, 0] * sin + impacts[:, 1] * cos], axis=1)
+        velocities *= self._rng.uniform(1.0, 10.0, (num_particles, 1)) * speed
+
+        # create particle data
+        data = numpy.zeros((num_particles, len(Offset)), dtype=numpy.float32)
+        data[:, Offset.POS_X:Offset.POS_Y+1] = origins + self._rng.uniform(-spread, spread, (num_particles, 2))
+        data[:, Offset.DIR_X:Offset.DIR_Y+1] = velocities
+        data[:, Offset.SIZE] = radius
+        data[:, Offset.SCALE] = 1 + self._rng.random(num_particles)
+        data[:, Offset.COLOR_R:Offset.COLOR_B+1] = color_norm
+
+        self._data = numpy.concatenate([self._data, data])
+
     def update(self, elapsed_ms: int) -> None:
         """Updates all particles.
 
@@ -118,13 +191,21 @@ class ParticleSystem:
         # remove particles with scale below threshold
         self._data = self._data[self._data[:, Offset.SCALE] >= FADE_THRESHOLD]
 
-    def render(self, view_matrix: glm.mat4x4, projection_matrix: glm.mat4x4) -> None:
-        """Render the particles using the given view and projection matrices."""
+    def snapshot(self) -> None:
+        """Copy the particles, so rendering uses the copy while the original keeps being updated."""
+        self._front = self._data.copy()
+
+    def render(self, view_matrix: glm.mat4x4, projection_matrix: glm.mat4x4) -> int:
+        """Render the particles (or their last snapshot) using the given view and projection matrices. Returns the
+        number of uploaded bytes.
+        """
+        data = self._data if self._front is None else self._front
         self._vbo.clear()
-        self._vbo.write(self._data.tobytes())
+        self._vbo.write(data.tobytes())
 
         self._texture.use(0)
         self._program['view'].write(view_matrix)
         self._program['projection'].write(projection_matrix)
 
-        self._vao.render(mode=moderngl.POINTS)
+        self._vao.render(mode=moderngl.POINTS, vertices=len(data))
+        return data.nbytes
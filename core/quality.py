@@ -0,0 +1,114 @@
+"""Adjusts registered quality settings at runtime, so the frame time stays within a given budget.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .app import PerformanceMonitor
+
+
+@dataclass
+class QualityKnob:
+    """A quality setting with discrete levels, ordered from the highest to the lowest quality.
+
+    Whenever the level changes, the corresponding value is passed to the apply callback.
+    """
+    name: str
+    levels: List[float]
+    apply: Callable[[float], None]
+    level: int = 0
+
+    def get_value(self) -> float:
+        """Returns the value of the current level."""
+        return self.levels[self.level]
+
+    def can_degrade(self) -> bool:
+        return self.level < len(self.levels) - 1
+
+    def can_improve(self) -> bool:
+        return self.level > 0
+
+    def set_level(self, level: int) -> None:
+        """Sets and applies the given level."""
+        self.level = level
+        self.apply(self.get_value())
+
+
+class QualityScheduler:
+    """Watches the frame time measured by a PerformanceMonitor and degrades or improves quality knobs.
+
+    The frame time is smoothed. Quality is degraded if it exceeds the target by the upper ratio and improved if it
+    falls below the target by the lower ratio. After each change, the scheduler waits a number of frames before
+    changing again (longer for improving), so the quality does not oscillate.
+    """
+
+    def __init__(self, monitor: 'PerformanceMonitor', target_ms: float, category: str = 'frame') -> None:
+        """Create scheduler for the given target frame time, which is read from the monitor's category."""
+        self.monitor = monitor
+        self.target_ms = target_ms
+        self.category = category
+
+        self.upper_ratio = 1.1
+        self.lower_ratio = 0.7
+        self.smoothing = 0.1
+        self.degrade_cooldown = 10
+        self.improve_cooldown = 60
+
+        self.enabled = True
+        self.knobs: List[QualityKnob] = list()
+        self.average_ms: Optional[float] = None
+        self._cooldown = 0
+
+    def register(self, knob: QualityKnob) -> None:
+        """Adds the given knob and applies its current level. Knobs registered first are degraded first."""
+        knob.set_level(knob.level)
+        self.knobs.append(knob)
+
+    def get_knob(self, name: str) -> QualityKnob:
+        """Returns the knob with the given name."""
+        for knob in self.knobs:
+            if knob.name == name:
+                return knob
+        raise KeyError(name)
+
+    def degrade(self) -> bool:
+        """Lowers the quality of the least degraded knob. Returns whether a knob was changed."""
+        candidates = [knob for knob in self.knobs if knob.can_degrade()]
+        if len(candidates) == 0:
+            return False
+
+        knob = min(candidates, key=lambda k: k.level / (len(k.levels) - 1))
+        knob.set_level(knob.level + 1)
+        return True
+
+    def improve(self) -> bool:
+        """Raises the quality of the most degraded knob. Returns whether a knob was changed."""
+        candidates = [knob for knob in reversed(self.knobs) if knob.can_improve()]
+        if len(candidates) == 0:
+            return False
+
+        knob = max(candidates, key=lambda k: k.level / (len(k.levels) - 1))
+        knob.set_level(knob.level - 1)
+        return True
+
+    def update(self) -> None:
+        """Reads the last frame time and adjusts the knobs if necessary. Call this once per frame."""
+        if not self.enabled or self.category not in self.monitor:
+            return
+
+        elapsed_ms = self.monitor.get_last(self.category)
+        if self.average_ms is None:
+            self.average_ms = elapsed_ms
+        self.average_ms += (elapsed_ms - self.average_ms) * self.smoothing
+
+        if self._cooldown > 0:
+            self._cooldown -= 1
+            return
+
+        if self.average_ms > self.target_ms * self.upper_ratio:
+            if self.degrade():
+                self._cooldown = self.degrade_cooldown
+        elif self.average_ms < self.target_ms * self.lower_ratio:
+            if self.improve():
+                self._cooldown = self.improve_cooldown
@@ -7,7 +7,13 @@ import pygame
 import moderngl
 import glm
 
-from . import resources, particles, sprite, text
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from . import resources, debug, light, particles, sprite, starfield, text
+
+if TYPE_CHECKING:
+    from .app import GpuProfiler
 
 
 class RenderBatch:
@@ -16,28 +22,35 @@ class RenderBatch:
     If multiple sprites are appended, they need to use the same texture.
 
     The data array is publicly available to allow for in place manipulation (e.g. interpolating positions).
+
+    If extrapolate is enabled, the shader moves the sprites along their velocities (and rotates them using spin)
+    instead of interpolating on the CPU. The data is then only uploaded if the sprite array was touched.
+
+    Animated sprites select their frame in the shader based on time, so animations need no uploads either.
     """
 
     def __init__(self, context: moderngl.Context, cache: resources.Cache, max_num_sprites: int,
                  sprite_array: sprite.SpriteArray, texture: moderngl.Texture) -> None:
-        """Initializes buffers for a maximum number of sprites."""
+        """Initializes buffers for the given number of sprites. The buffers grow if more sprites are rendered."""
         self._context = context
         self._max_num_sprites = max_num_sprites
 
         self._vbo = context.buffer(reserve=len(sprite.Offset) * 4 * max_num_sprites, dynamic=True)
-        self._program = context.program(vertex_shader=cache.get_shader('data/glsl/sprite.vert'),
-                                        geometry_shader=cache.get_shader('data/glsl/sprite.geom'),
-                                        fragment_shader=cache.get_shader('data/glsl/sprite.frag'))
+        self._program = cache.get_program('data/glsl/sprite', ['vert', 'geom', 'frag'])
         self._vao = context.vertex_array(self._program,
-                                         [(self._vbo, '2f 2f 2f 2f 1f 4f 2f 2f 1f', 'in_position', 'in_velocity',
+                                         [(self._vbo, '2f 2f 2f 2f 1f 4f 2f 2f 1f 4f', 'in_position', 'in_velocity',
                                            'in_origin', 'in_size', 'in_rotation', 'in_color',
-                                           'in_clip_offset', 'in_clip_size', 'in_brightness')])
+                                           'in_clip_offset', 'in_clip_size', 'in_brightness', 'in_animation')])
 
         self._num_sprites = 0
         self._texture = texture
-        self._alt_texture = None
         self._data = sprite_array
-        self._show_bounding_circles = False
+        self._uploaded_version = -1
+
+        self.extrapolate = False
+        self.spin = 0.0
+        # animation clock (in seconds)
+        self.time = 0.0
 
     def clear(self) -> None:
         """Resets the buffer data."""
@@ -47,75 +60,231 @@ class RenderBatch:
 
     def get_texture(self) -> moderngl.Texture:
         """Returns the texture that is bound to the renderer batch."""
-        return self._alt_texture if self._show_bounding_circles else self._texture
+        return self._texture
 
     def set_texture(self, texture: moderngl.Texture) -> None:
         """Sets the texture."""
         self._texture = texture
-        if self._show_bounding_circles:
-            self._renew_alt_texture()
 
-    def has_enabled_bounding_circles(self) -> bool:
-        return self._show_bounding_circles
+    def get_program(self) -> moderngl.Program:
+        """Returns the sprite program, which is shared by all batches."""
+        return self._program
+
+    def upload(self, alpha: float = 1.0) -> int:
+        """Uploads the sprite data for rendering: interpolated using alpha, or in extrapolation mode only if the sprite
+        array was touched. Returns the number of uploaded bytes.
+        """
+        arr = self._data.get_front()
+        if arr.data.nbytes > self._vbo.size:
+            # grow buffer to fit all sprites
+            self._vbo.orphan(arr.data.nbytes)
+            self._uploaded_version = -1
+
+        if self.extrapolate:
+            if self._uploaded_version == arr.version:
+                return 0
+            self._vbo.write(arr.data.tobytes())
+            self._uploaded_version = arr.version
+            return arr.data.nbytes
+
+        data = arr.interpolate(alpha)
+        self._vbo.write(data.tobytes())
+        self._uploaded_version = -1
+        return data.nbytes
+
+    def draw(self) -> None:
+        """Draws the uploaded sprites, expecting the program's uniforms and the texture to be set."""
+        self._vao.render(mode=moderngl.POINTS, vertices=len(self._data.get_front()))
+
+    def render(self, texture: moderngl.Texture, view_matrix: glm.mat4x4, projection_matrix: glm.mat4x4,
+               alpha: float = 1.0, delta_ms: float = 0.0) -> None:
+        """Renders the vertex data as points using the given texture, view matrix and projection matrix.
+
+        The sprite positions are interpolated between the last two simulation steps using alpha. In extrapolation
+        mode, they are moved by the time delta_ms that passed since the last simulation step instead.
+        """
+        self.upload(alpha)
+        if not self.extrapolate:
+            delta_ms = 0.0
+
+        self._program['time_delta'] = delta_ms
+        self._program['spin'] = self.spin
+        self._program['time'] = self.time
 
-    def enable_bounding_circles(self, show_bounding_circles: bool) -> None:
-        self._show_bounding_circles = show_bounding_circles
+        texture.use(0)
+        self._program['view'].write(view_matrix)
+        self._program['projection'].write(projection_matrix)
+        self._program['sprite_texture'] = 0
 
-        if show_bounding_circles and self._alt_texture is None:
-            self._renew_alt_texture()
+        self.draw()
 
-    def _renew_alt_texture(self) -> None:
-        # create copy of texture
-        w, h = self._texture.size
-        surface = pygame.image.frombuffer(self._texture.read(), (w, h), 'RGBA')
 
-        # draw circle over the first square frame (assuming it's a single row frame sheet)
-        radius = h // 2
-        pygame.gfxdraw.circle(surface, radius, radius, radius - 1, pygame.Color('red'))
+@dataclass
+class RenderStats:
+    """Counts the rendering work of a frame."""
+    draw_calls: int = 0
+    state_changes: int = 0
+    bytes_uploaded: int = 0
 
-        # store as alternative texture
-        self._alt_texture = resources.texture_from_surface(self._context, surface, False)
-        self._alt_texture.filter = moderngl.NEAREST, moderngl.NEAREST
+    def reset(self) -> None:
+        self.draw_calls = 0
+        self.state_changes = 0
+        self.bytes_uploaded = 0
 
-    def render(self, texture: moderngl.Texture, view_matrix: glm.mat4x4, projection_matrix: glm.mat4x4) -> None:
-        """Renders the vertex data as points using the given texture, view matrix and projection matrix."""
-        self._vbo.write(self._data.data.tobytes())
+    def __str__(self) -> str:
+        return (f'{self.draw_calls} draw calls, {self.state_changes} state changes, '
+                f'{self.bytes_uploaded / 1024:.1f} KiB uploaded')
+
+
+# draws a queued item using the view and projection matrices
+Draw = Callable[[glm.mat4x4, glm.mat4x4], None]
 
-        texture.use(0)
-        self._program['view'].write(view_matrix)
-        self._program['projection'].write(projection_matrix)
-        self._program['sprite_texture'] = 0
 
-        self._vao.render(mode=moderngl.POINTS, vertices=self._data.data.shape[0])
+@dataclass
+class QueuedDraw:
+    """Draw of a render queue along with its sort keys."""
+    layer: int
+    program: Optional[moderngl.Program]
+    texture: Optional[moderngl.Texture]
+    name: str
+    draw: Draw
+
+
+class RenderQueue:
+    """Collects the draws of a frame and issues them sorted by layer, then program, then texture.
+
+    Sprite batches of a layer that share the program (see Cache.get_program) and texture are drawn back to back, where
+    binding the texture and writing uniforms are skipped if the values are already set. Other passes (e.g. particles
+    or lights) set up their own state, so they are drawn in layer order and counted as one draw call and one program
+    change each.
+    """
+
+    def __init__(self, profiler: Optional['GpuProfiler'] = None) -> None:
+        """Creates an empty queue. If a profiler is given, each draw is timed by it using the submitted name."""
+        self.stats = RenderStats()
+        self._profiler = profiler
+        self._items: List[QueuedDraw] = list()
+
+        self._program: Optional[moderngl.Program] = None
+        self._textures: Dict[int, moderngl.Texture] = dict()
+        self._uniforms: Dict[Tuple[int, str], Any] = dict()
+
+    def __len__(self) -> int:
+        """Returns the number of queued draws."""
+        return len(self._items)
+
+    def submit(self, layer: int, batch: RenderBatch, alpha: float = 1.0, delta_ms: float = 0.0,
+               name: str = 'batch') -> None:
+        """Queues the given batch, which is interpolated (using alpha) or extrapolated (using delta_ms)."""
+        def draw(view_matrix: glm.mat4x4, projection_matrix: glm.mat4x4) -> None:
+            self.stats.bytes_uploaded += batch.upload(alpha)
+
+            program = batch.get_program()
+            self.use_program(program)
+            self.set_uniform(program, 'view', view_matrix)
+            self.set_uniform(program, 'projection', projection_matrix)
+            self.set_uniform(program, 'time_delta', delta_ms if batch.extrapolate else 0.0)
+            self.set_uniform(program, 'spin', batch.spin)
+            self.set_uniform(program, 'time', batch.time)
+            self.set_uniform(program, 'sprite_texture', 0)
+            self.use_texture(batch.get_texture(), 0)
+
+            batch.draw()
+            self.stats.draw_calls += 1
+
+        self._items.append(QueuedDraw(layer, batch.get_program(), batch.get_texture(), name, draw))
+
+    def submit_pass(self, layer: int, render: Callable[[glm.mat4x4, glm.mat4x4], Optional[int]],
+                    name: str = 'pass') -> None:
+        """Queues a pass that renders using the view and projection matrices and sets up its own state. It may return
+        the number of bytes it uploaded.
+        """
+        def draw(view_matrix: glm.mat4x4, projection_matrix: glm.mat4x4) -> None:
+            self.stats.bytes_uploaded += render(view_matrix, projection_matrix) or 0
+            self.stats.draw_calls += 1
+            self.stats.state_changes += 1
+            # the pass bound its own program and textures
+            self.invalidate()
+
+        self._items.append(QueuedDraw(layer, None, None, name, draw))
+
+    def use_program(self, program: moderngl.Program) -> None:
+        """Counts a program change if another program was used before. moderngl binds the program when drawing."""
+        if program is not self._program:
+            self._program = program
+            self.stats.state_changes += 1
+
+    def use_texture(self, texture: moderngl.Texture, location: int) -> None:
+        """Binds the texture to the given location unless it is already bound."""
+        if self._textures.get(location) is not texture:
+            texture.use(location)
+            self._textures[location] = texture
+            self.stats.state_changes += 1
+
+    def set_uniform(self, program: moderngl.Program, name: str, value: Any) -> None:
+        """Writes a scalar or matrix uniform unless it already has the given value."""
+        if not isinstance(value, (int, float)):
+            value = bytes(value)
+
+        key = (program.glo, name)
+        if self._uniforms.get(key) == value:
+            return
+
+        if isinstance(value, bytes):
+            program[name].write(value)
+        else:
+            program[name].value = value
+        self._uniforms[key] = value
+        self.stats.state_changes += 1
+
+    def invalidate(self) -> None:
+        """Forgets the bound program, textures and written uniforms, e.g. after rendering without the queue."""
+        self._program = None
+        self._textures.clear()
+        self._uniforms.clear()
+
+    def flush(self, view_matrix: glm.mat4x4, projection_matrix: glm.mat4x4) -> None:
+        """Draws and removes all queued items in sorted order using the given view and projection matrices."""
+        # the state may have changed since the last flush
+        self.invalidate()
+
+        # sorting is stable, so items with equal keys are drawn in submission order
+        self._items.sort(key=lambda item: (item.layer, 0 if item.program is None else item.program.glo,
+                                           0 if item.texture is None else item.texture.glo))
+        for item in self._items:
+            if self._profiler is None:
+                item.draw(view_matrix, projection_matrix)
+            else:
+                with self._profiler.scope(item.name):
+                    item.draw(view_matrix, projection_matrix)
+
+        self._items.clear()
 
 
 # ----------------------------------------------------------------------------------------------------------------------
 
 
-class Camera:
-    """Provides a 2D orthographic camera with the potential of rendering single sprites or entire sprite batches.
-    The camera can be modified using:
+class CameraView:
+    """Provides the visible area of a camera, as it was when the view was created or the camera was last updated.
 
-    center: as pygame.math.Vector2, defaults to (0, 0)
-    rotation: as float in degree, defaults to 0
-    zoom: as float, defaults to 1
+    Views can be queried independently of the camera, e.g. by the simulation while the camera keeps moving (pipelined
+    mode, see Camera.get_view).
     """
 
-    def __init__(self, context: moderngl.Context, cache: resources.Cache) -> None:
-        """Creates the camera and sprite rendering capabilities."""
-        self._data = sprite.SpriteArray()
-        self._renderer = RenderBatch(context, cache, 1, self._data, None)
+    def __init__(self, center: pygame.math.Vector2, rotation: float, zoom: float,
+                 screen_size: pygame.math.Vector2) -> None:
+        """Creates the view from the given camera settings."""
+        self.center = pygame.math.Vector2(center)
+        self.rotation = rotation
+        self.zoom = zoom
 
-        self.center = pygame.math.Vector2(0, 0)
-        self.rotation = 0.0
-        self.zoom = 1.0
+        self._screen_size = pygame.math.Vector2(screen_size)
 
-        self._up = glm.vec3(0, 1, 0)
-        self._into = glm.vec3(0, 0, 1)
-        self._screen_size = pygame.math.Vector2(pygame.display.get_window_size())
+        # view orientation for culling: center, camera axes and half size
+        self._view = self._get_view_frame()
 
-        self._m_view = self._get_view_matrix()
-        self._m_proj = self._get_projection_matrix()
+        # visible rows per array (by id) along with the array, its version and data they were queried for
+        self._visible: Dict[int, Tuple[sprite.SpriteArray, int, numpy.ndarray, numpy.ndarray]] = dict()
 
     def get_size(self) -> pygame.math.Vector2:
         """Returns the size of the zoomed viewport."""
@@ -135,13 +304,71 @@ class Camera:
         rect.center = self.center
         return rect
 
-    def query_visible(self, data: numpy.ndarray) -> numpy.ndarray:
-        """Query visible elements from the given array using an enlarged bounding rectangle."""
-        rect = self.get_bounding_rect()
-        return numpy.where(
-            (rect.left <= data[:, sprite.Offset.POS_X]) & (data[:, sprite.Offset.POS_X] <= rect.right) &
-            (rect.top <= data[:, sprite.Offset.POS_Y]) & (data[:, sprite.Offset.POS_Y] <= rect.bottom)
+    def _get_view_frame(self) -> numpy.ndarray:
+        """Returns the center, the camera's x-axis, its y-axis and the half size of the view (one row each)."""
+        angle = numpy.radians(self.rotation)
+        cos, sin = numpy.cos(angle), numpy.sin(angle)
+        return numpy.array([self.center.xy, (cos, sin), (-sin, cos), self.get_size() / 2], dtype=numpy.float32)
+
+    def query_visible(self, arr: sprite.SpriteArray) -> numpy.ndarray:
+        """Query elements from the given array that overlap the view of the last update.
+
+        The positions are projected onto the (rotated) camera axes and tested against the view, which is enlarged per
+        element by the distance from its position to its farthest corner (given its size and origin). Hence large
+        sprites are kept until they left the view entirely, regardless of their rotation.
+
+        The result is cached until the camera is updated or the array is modified (see SpriteArray.touch), so repeated
+        queries within a frame are free. Hence the returned indices are read-only.
+        """
+        data = arr.data
+        cached = self._visible.get(id(arr))
+        if cached is not None and cached[0] is arr and cached[1] == arr.version and cached[2] is data:
+            return cached[3]
+
+        center, axis_x, axis_y, half_size = self._view
+        pos = data[:, sprite.Offset.POS_X:sprite.Offset.POS_Y+1] - center
+        origin = data[:, sprite.Offset.ORIGIN_X:sprite.Offset.ORIGIN_Y+1]
+        size = numpy.abs(data[:, sprite.Offset.SIZE_X:sprite.Offset.SIZE_Y+1])
+        corner = numpy.maximum(origin, 1.0 - origin) * size
+        extent = numpy.hypot(corner[:, 0], corner[:, 1])
+
+        indices = numpy.where(
+            (numpy.abs(pos @ axis_x) <= half_size[0] + extent) & (numpy.abs(pos @ axis_y) <= half_size[1] + extent)
         )[0]
+        indices.flags.writeable = False
+
+        self._visible[id(arr)] = (arr, arr.version, data, indices)
+        return indices
+
+
+class Camera(CameraView):
+    """Provides a 2D orthographic camera with the potential of rendering single sprites or entire sprite batches.
+    The camera can be modified using:
+
+    center: as pygame.math.Vector2, defaults to (0, 0)
+    rotation: as float in degree, defaults to 0
+    zoom: as float, defaults to 1
+    """
+
+    def __init__(self, context: moderngl.Context, cache: resources.Cache) -> None:
+        """Creates the camera and sprite rendering capabilities."""
+        super().__init__(pygame.math.Vector2(0, 0), 0.0, 1.0,
+                         pygame.math.Vector2(pygame.display.get_window_size()))
+        self._data = sprite.SpriteArray()
+        self._renderer = RenderBatch(context, cache, 1, self._data, None)
+
+        self._up = glm.vec3(0, 1, 0)
+        self._into = glm.vec3(0, 0, 1)
+
+        self._m_view = self._get_view_matrix()
+        self._m_proj = self._get_projection_matrix()
+
+    def get_view(self) -> CameraView:
+        """Returns a copy of the camera's view, which is not affected by further changes of the camera."""
+        view = CameraView(self.center, self.rotation, self.zoom, self._screen_size)
+        # keep the view of the last update, even if the camera was moved since
+        view._view = self._view.copy()
+        return view
 
     def to_world_pos(self, screen_pos: pygame.math.Vector2) -> pygame.math.Vector2:
         """Transforms the position into a world position."""
@@ -166,6 +393,8 @@ class Camera:
         self._screen_size = pygame.math.Vector2(pygame.display.get_window_size())
         self._m_view = self._get_view_matrix()
         self._m_proj = self._get_projection_matrix()
+        self._view = self._get_view_frame()
+        self._visible.clear()
 
     def render(self, s: sprite.Sprite) -> None:
         """Render the given sprite."""
@@ -181,14 +410,30 @@ class Camera:
         self._data.add(t.sprite)
         self._renderer.render(t.sprite.texture, self._m_view, self._m_proj)
 
-    def render_batch(self, batch: RenderBatch) -> None:
-        """Render the given batch."""
-        batch.render(batch.get_texture(), self._m_view, self._m_proj)
+    def render_batch(self, batch: RenderBatch, alpha: float = 1.0, delta_ms: float = 0.0) -> None:
+        """Render the given batch, interpolating (using alpha) or extrapolating (using delta_ms) its sprites."""
+        batch.render(batch.get_texture(), self._m_view, self._m_proj, alpha, delta_ms)
 
     def render_particles(self, parts: particles.ParticleSystem) -> None:
         """Render the given particles."""
         parts.render(self._m_view, self._m_proj)
 
+    def render_queue(self, queue: RenderQueue) -> None:
+        """Render and clear the given queue."""
+        queue.flush(self._m_view, self._m_proj)
+
+    def render_debug(self, draw: debug.DebugDraw) -> None:
+        """Render the collected debug primitives."""
+        draw.render(self._m_view, self._m_proj, self.zoom)
+
+    def render_lights(self, renderer: light.LightRenderer, *arrays: light.LightArray) -> None:
+        """Accumulate the given lights in the renderer's light buffer."""
+        renderer.render(self._m_view, self._m_proj, *arrays)
+
+    def render_starfield(self, stars: starfield.Starfield) -> None:
+        """Render the given starfield behind the visible area."""
+        stars.render(self._m_view, self._m_proj, self.center, self.zoom)
+
 
 class GuiCamera(Camera):
     def __init__(self, context: moderngl.Context, cache: resources.Cache) -> None:
@@ -198,3 +443,48 @@ class GuiCamera(Camera):
         """Return the projection matrix (usually once)."""
         size = self.get_size()
         return glm.ortho(0, size[0], 0, size[1], 1, -1)
+
+
+class RenderTarget:
+    """Offscreen framebuffer that is rendered at a fraction of its size and upscaled to the screen.
+
+    The textures are allocated once at full size. Changing the scale only changes the viewport, so it can be adjusted
+    every frame without reallocating.
+    """
+
+    def __init__(self, context: moderngl.Context, cache: resources.Cache, size: Tuple[int, int]) -> None:
+        """Creates the framebuffer at the given (full) size and the upscaling shaders."""
+        self._context = context
+        self._texture = context.texture(size, 4)
+        self._texture.filter = moderngl.LINEAR, moderngl.LINEAR
+        self._texture.repeat_x = False
+        self._texture.repeat_y = False
+        self._fbo = context.framebuffer(color_attachments=[self._texture])
+
+        vertex_shader, fragment_shader = cache.get_shaders('data/glsl/upscale', ['vert', 'frag'])
+        self._program = context.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader)
+        self._program['scene_texture'] = 0
+        self._vao = context.vertex_array(self._program, [])
+
+        self.scale = 1.0
+
+    def get_viewport(self) -> Tuple[int, int, int, int]:
+        """Returns the part of the framebuffer that is rendered at the current scale."""
+        width, height = self._texture.size
+        return 0, 0, max(int(width * self.scale), 1), max(int(height * self.scale), 1)
+
+    def get_texture(self) -> moderngl.Texture:
+        return self._texture
+
+    def use(self) -> None:
+        """Clears the framebuffer and binds it, so everything is rendered into its scaled viewport."""
+        self._fbo.clear()
+        self._fbo.use()
+        self._context.viewport = self.get_viewport()
+
+    def blit(self) -> None:
+        """Upscales the rendered part of the framebuffer onto the current framebuffer."""
+        _, _, width, height = self.get_viewport()
+        self._program['uv_scale'] = width / self._texture.width, height / self._texture.height
+        self._texture.use(0)
+        self._vao.render(mode=moderngl.TRIANGLES, vertices=3)
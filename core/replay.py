@@ -0,0 +1,121 @@
+"""Input layer that records sessions and replays them deterministically.
+
+All input reaches the states through the layer: events per frame and the currently pressed keys. While recording, the
+frame times and events are stored. While replaying, they are fed back instead of the live input, so the same session
+does exactly the same work again (given that random numbers are drawn from seeded streams, see Engine.make_rng).
+"""
+
+import json
+import pygame
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+from dataclasses import dataclass, field
+
+
+# event attributes that can be stored and restored
+SERIALIZABLE_TYPES = (bool, int, float, str)
+
+
+@dataclass
+class InputFrame:
+    """Input of a single frame: how long it took and which events occured."""
+    elapsed_ms: float
+    events: List[Tuple[int, Dict[str, Any]]] = field(default_factory=list)
+
+
+def serialize_event(event: pygame.event.Event) -> Tuple[int, Dict[str, Any]]:
+    """Returns the event's type and all attributes that can be stored as JSON (e.g. window references are skipped)."""
+    attributes = dict()
+    for key, value in event.dict.items():
+        if isinstance(value, SERIALIZABLE_TYPES):
+            attributes[key] = value
+        elif isinstance(value, tuple) and all(isinstance(item, SERIALIZABLE_TYPES) for item in value):
+            attributes[key] = list(value)
+
+    return event.type, attributes
+
+
+def deserialize_event(event_type: int, attributes: Dict[str, Any]) -> pygame.event.Event:
+    """Recreates an event from its type and attributes."""
+    attributes = {key: tuple(value) if isinstance(value, list) else value for key, value in attributes.items()}
+    return pygame.event.Event(event_type, attributes)
+
+
+class InputLayer:
+    """Provides the events and pressed keys per frame, either live (and optionally recorded) or from a replay.
+
+    The pressed keys are tracked from the key events instead of asking pygame, so they are replayed as well.
+    """
+
+    def __init__(self) -> None:
+        self.recording = False
+        self.seed: Optional[int] = None
+        self._frames: List[InputFrame] = list()
+        self._replay_index: Optional[int] = None
+        self._pressed: Set[int] = set()
+
+    def __len__(self) -> int:
+        """Returns the number of recorded or loaded frames."""
+        return len(self._frames)
+
+    def start_recording(self, seed: int) -> None:
+        """Starts a new recording. The seed is stored to recreate the random number streams on replay."""
+        self.seed = seed
+        self.recording = True
+        self._frames = list()
+
+    def is_replaying(self) -> bool:
+        return self._replay_index is not None
+
+    def is_finished(self) -> bool:
+        """Returns whether a replay ran out of frames."""
+        return self._replay_index is not None and self._replay_index >= len(self._frames)
+
+    def poll(self, elapsed_ms: float) -> Tuple[float, List[pygame.event.Event]]:
+        """Returns the frame time and the events of the current frame.
+
+        While replaying, the recorded frame time and events are returned instead of the given time and pygame's events.
+        Live events are still fetched to keep the window responsive but they are dropped.
+        """
+        events = pygame.event.get()
+
+        if self._replay_index is not None:
+            frame = self._frames[self._replay_index]
+            self._replay_index += 1
+            elapsed_ms = frame.elapsed_ms
+            events = [deserialize_event(event_type, attributes) for event_type, attributes in frame.events]
+
+        elif self.recording:
+            self._frames.append(InputFrame(elapsed_ms, [serialize_event(event) for event in events]))
+
+        for event in events:
+            if event.type == pygame.KEYDOWN:
+                self._pressed.add(event.key)
+            elif event.type == pygame.KEYUP:
+                self._pressed.discard(event.key)
+            elif event.type == pygame.WINDOWFOCUSLOST:
+                self._pressed.clear()
+
+        return elapsed_ms, events
+
+    def is_pressed(self, key: int) -> bool:
+        """Returns whether the given key (e.g. pygame.K_w) is currently held down."""
+        return key in self._pressed
+
+    def save(self, filename: str) -> None:
+        """Writes the seed and the recorded frames to the given JSON file."""
+        frames = [{'elapsed_ms': frame.elapsed_ms, 'events': frame.events} for frame in self._frames]
+        with open(filename, 'w') as handle:
+            json.dump({'seed': self.seed, 'frames': frames}, handle)
+
+    def load(self, filename: str) -> None:
+        """Loads a recording from the given JSON file and starts replaying it."""
+        with open(filename) as handle:
+            recording = json.load(handle)
+
+        self.seed = recording['seed']
+        self._frames = [InputFrame(frame['elapsed_ms'], [tuple(event) for event in frame['events']])
+                        for frame in recording['frames']]
+        self._replay_index = 0
+        self._pressed.clear()
+        self.recording = False
@@ -1,40 +1,163 @@
 """Provides a resource cache for loading various resources from disk.
 """
 
+import sys
 import pygame
 import moderngl
+import numpy
 import io
+import contextlib
 import cairosvg
 
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Optional, Iterator, Union, TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from .app import PerformanceMonitor
 
-def texture_from_surface(context: moderngl.Context, surface: pygame.Surface,
-                         flipped: bool = True) -> moderngl.Texture:
-    img_data = pygame.image.tostring(surface, 'RGBA', flipped)
-    return context.texture(size=surface.get_size(), components=4, data=img_data)
+
+# program arguments of the shader types by file extension
+SHADER_STAGES: Dict[str, str] = {'vert': 'vertex_shader', 'geom': 'geometry_shader', 'frag': 'fragment_shader'}
+
+
+def to_32bit(surface: pygame.Surface) -> pygame.Surface:
+    """Returns the surface if it uses 32 bits per pixel, otherwise a 32-bit copy with alpha."""
+    if surface.get_bytesize() == 4:
+        return surface
+
+    converted = pygame.Surface(surface.get_size(), pygame.SRCALPHA, 32)
+    converted.blit(surface, (0, 0))
+    return converted
+
+
+def get_swizzle(surface: pygame.Surface) -> str:
+    """Returns the texture swizzle that reads a 32-bit surface's channels (e.g. stored as BGRA) as RGBA."""
+    swizzle = ''
+    for mask, shift in zip(surface.get_masks(), surface.get_shifts()):
+        if mask == 0:
+            # no alpha channel
+            swizzle += '1'
+            continue
+        index = shift // 8 if sys.byteorder == 'little' else 3 - shift // 8
+        swizzle += 'RGBA'[index]
+    return swizzle
+
+
+def get_pixels(surface: pygame.Surface) -> Union[memoryview, numpy.ndarray]:
+    """Returns the pixels of a 32-bit surface, top row first. This is a view of the surface's buffer, unless its rows
+    are padded, which requires a compact copy.
+    """
+    pixels = memoryview(surface.get_buffer())
+    width, height = surface.get_size()
+    if surface.get_pitch() == width * 4:
+        return pixels
+
+    rows = numpy.frombuffer(pixels, dtype=numpy.uint8).reshape(height, surface.get_pitch())
+    return numpy.ascontiguousarray(rows[:, :width * 4])
+
+
+def texture_from_surface(context: moderngl.Context, surface: pygame.Surface) -> moderngl.Texture:
+    """Creates a texture from the surface's buffer without converting it first.
+
+    The texture is stored top-down (the first row is the surface's top row), which the shaders' texture coordinates
+    account for. The surface's channel order is handled by the texture's swizzle.
+    """
+    surface = to_32bit(surface)
+    texture = context.texture(size=surface.get_size(), components=4, data=get_pixels(surface))
+    texture.swizzle = get_swizzle(surface)
+    return texture
+
+
+class StreamingTexture:
+    """Texture that is updated from surfaces frequently (e.g. text), using two pixel buffers in turns.
+
+    Each update copies the surface into a pixel buffer and lets the GPU transfer it into the texture asynchronously,
+    while the other buffer may still be read by the previous transfer. Hence updates do not wait for the GPU. The
+    texture only grows, so each surface is written into its top left corner (see update's clip).
+    """
+
+    def __init__(self, context: moderngl.Context, size: Tuple[int, int] = (1, 1)) -> None:
+        """Creates the texture and pixel buffers with the given initial size."""
+        self._context = context
+        self._buffers = [context.buffer(reserve=size[0] * size[1] * 4, dynamic=True) for _ in range(2)]
+        self._index = 0
+        self._texture = self._create_texture(size)
+
+    def _create_texture(self, size: Tuple[int, int]) -> moderngl.Texture:
+        texture = self._context.texture(size, 4)
+        # the area beyond the clip may hold older surfaces, which must not bleed in
+        texture.filter = moderngl.NEAREST, moderngl.NEAREST
+        return texture
+
+    def get_texture(self) -> moderngl.Texture:
+        return self._texture
+
+    def update(self, surface: pygame.Surface) -> pygame.Rect:
+        """Uploads the surface and returns the part of the texture that shows it.
+
+        Padded rows are uploaded as they are (they are outside of the returned clip), so the surface's buffer is
+        copied to the pixel buffer without any conversion.
+        """
+        surface = to_32bit(surface)
+        width, height = surface.get_size()
+        row_width = surface.get_pitch() // 4
+
+        if row_width > self._texture.width or height > self._texture.height:
+            # grow the texture, so sprites have to use get_texture() after updating
+            size = max(row_width, self._texture.width), max(height, self._texture.height)
+            self._texture.release()
+            self._texture = self._create_texture(size)
+
+        pixels = memoryview(surface.get_buffer())
+        if pixels.nbytes == 0:
+            # e.g. an empty string
+            return pygame.Rect(0, 0, width, height)
+
+        buffer = self._buffers[self._index]
+        self._index = (self._index + 1) % len(self._buffers)
+        if pixels.nbytes > buffer.size:
+            buffer.orphan(pixels.nbytes)
+        buffer.write(pixels)
+
+        self._texture.write(buffer, viewport=(0, 0, row_width, height))
+        self._texture.swizzle = get_swizzle(surface)
+        return pygame.Rect(0, 0, width, height)
+
+    def release(self) -> None:
+        self._texture.release()
+        for buffer in self._buffers:
+            buffer.release()
 
 
 class Cache:
     """Manages loading and caching data from disk."""
 
-    def __init__(self, context: moderngl.Context) -> None:
-        """Initializes the resource caches."""
+    def __init__(self, context: moderngl.Context, monitor: Optional['PerformanceMonitor'] = None) -> None:
+        """Initializes the resource caches. If a monitor is given, loading is added to its trace."""
         self.context = context
+        self.monitor = monitor
         self.png_cache: Dict[str, moderngl.Texture] = dict()
         self.svg_cache: Dict[Tuple[str, float], moderngl.Texture] = dict()
         self.shader_cache: Dict[str, str] = dict()
+        self.program_cache: Dict[Tuple[str, Tuple[str, ...]], moderngl.Program] = dict()
+
+    @contextlib.contextmanager
+    def _trace(self, name: str) -> Iterator[None]:
+        if self.monitor is None:
+            yield
+            return
+
+        with self.monitor.span(name, 'load'):
+            yield
 
     def get_png(self, path: str) -> moderngl.Texture:
         """Loads a PNG file from path and returns the corresponding texture."""
         if path not in self.png_cache:
-            # load image file
-            surface = pygame.image.load(path)
-            img_data = pygame.image.tostring(surface, 'RGBA', True)
+            with self._trace(f'load {path}'):
+                # load image file
+                surface = pygame.image.load(path)
 
-            # load texture from surface
-            texture = self.context.texture(size=surface.get_size(), components=4, data=img_data)
-            self.png_cache[path] = texture
+                # load texture from surface
+                self.png_cache[path] = texture_from_surface(self.context, surface)
 
         return self.png_cache[path]
 
@@ -43,14 +166,13 @@ class Cache:
         key = (path, scale)
 
         if key not in self.svg_cache:
-            # rasterize vector graphics
-            png_data = cairosvg.svg2png(url=path, scale=scale)
-            surface = pygame.image.load(io.BytesIO(png_data))
-            img_data = pygame.image.tostring(surface, 'RGBA', True)
+            with self._trace(f'load {path} x{scale}'):
+                # rasterize vector graphics
+                png_data = cairosvg.svg2png(url=path, scale=scale)
+                surface = pygame.image.load(io.BytesIO(png_data))
 
-            # load texture from surface
-            texture = self.context.texture(size=surface.get_size(), components=4, data=img_data)
-            self.svg_cache[key] = texture
+                # load texture from surface
+                self.svg_cache[key] = texture_from_surface(self.context, surface)
 
         return self.svg_cache[key]
 
@@ -58,7 +180,7 @@ class Cache:
         """Loads a shader sourcefile from path."""
         if path not in self.shader_cache:
             # load source from file
-            with open(path, 'r') as handle:
+            with self._trace(f'load {path}'), open(path, 'r') as handle:
                 self.shader_cache[path] = handle.read()
 
         return self.shader_cache[path]
@@ -70,6 +192,19 @@ class Cache:
             shaders.append(self.get_shader(f'{path}.{type_}'))
         return shaders
 
+    def get_program(self, path: str, types: List[str]) -> moderngl.Program:
+        """Loads and links the shaders of related source files (see get_shaders) into a program, which is shared by
+        all callers. Hence uniforms have to be set before each use.
+        """
+        key = (path, tuple(types))
+        if key not in self.program_cache:
+            shaders = self.get_shaders(path, types)
+            with self._trace(f'link {path}'):
+                kwargs = {SHADER_STAGES[type_]: shader for type_, shader in zip(types, shaders)}
+                self.program_cache[key] = self.context.program(**kwargs)
+
+        return self.program_cache[key]
+
     def get_font(self, font_name: str = '', font_size: int = 18) -> pygame.font.Font:
         """Loads a SysFont via filename and font size."""
         if font_name == '':
@@ -4,6 +4,8 @@ import numpy
 
 from dataclasses import dataclass, field
 from enum import IntEnum, auto
+from multiprocessing import shared_memory
+from typing import Optional
 
 
 @dataclass
@@ -21,6 +23,13 @@ class Sprite:
     rotation: float = 0.0
     brightness: float = 1.0
 
+    # sprite-sheet animation: frames are laid out next to each other, starting at the clip rect. The shader shows
+    # frame_start + (time * fps + phase) modulo num_frames, where phase is given in frames.
+    frame_start: int = 0
+    num_frames: int = 1
+    fps: float = 0.0
+    phase: float = 0.0
+
     def __post_init__(self):
         self.color.a = 0
         if self.clip.w == -1:
@@ -54,6 +63,10 @@ class Sprite:
         data[Offset.CLIP_W] = clip_wh.x
         data[Offset.CLIP_H] = clip_wh.y
         data[Offset.BRIGHTNESS] = self.brightness
+        data[Offset.FRAME_START] = self.frame_start
+        data[Offset.NUM_FRAMES] = self.num_frames
+        data[Offset.FPS] = self.fps
+        data[Offset.PHASE] = self.phase
 
         return data
 
@@ -62,27 +75,30 @@ class Sprite:
         return pygame.math.Vector2(*data[Offset.POS_X:Offset.POS_Y+1])
 
     # FIXME: go for smaller portions like get_size() etc.
-    """
     @staticmethod
     def from_array(data: numpy.ndarray, texture: moderngl.Texture) -> 'Sprite':
+        """Creates a sprite from the given row of sprite data (see to_array), which refers to the given texture."""
         s = Sprite(texture=texture)
         s.center = Sprite.get_center(data)
         s.velocity.x = data[Offset.VEL_X]
         s.velocity.y = data[Offset.VEL_Y]
         s.origin.x = data[Offset.ORIGIN_X]
         s.origin.y = data[Offset.ORIGIN_Y]
-        s.rotation = data[Offset.ROTATION]
-        s.color = pygame.Color([int(data[offset] * 255) for offset in [Offset.COLOR_R, Offset.COLOR_G, Offset.COLOR_B,
-                                                                       Offset.COLOR_A]])
-        s.brightness = data[Offset.BRIGHTNESS]
-        s.clip.x = data[Offset.CLIP_X] * texture.size[0]
-        s.clip.y = data[Offset.CLIP_Y] * texture.size[1]
-        s.clip.w = data[Offset.CLIP_W] * texture.size[0]
-        s.clip.h = data[Offset.CLIP_H] * texture.size[1]
-
-        s.scale = data[Offset.SIZE_X] / s.clip.w
+        s.rotation = float(data[Offset.ROTATION])
+        s.color = pygame.Color(*[round(data[offset] * 255) for offset in [Offset.COLOR_R, Offset.COLOR_G,
+                                                                          Offset.COLOR_B, Offset.COLOR_A]])
+        s.brightness = float(data[Offset.BRIGHTNESS])
+        s.clip.x = round(data[Offset.CLIP_X] * texture.size[0])
+        s.clip.y = round(data[Offset.CLIP_Y] * texture.size[1])
+        s.clip.w = round(data[Offset.CLIP_W] * texture.size[0])
+        s.clip.h = round(data[Offset.CLIP_H] * texture.size[1])
+        s.frame_start = int(data[Offset.FRAME_START])
+        s.num_frames = int(data[Offset.NUM_FRAMES])
+        s.fps = float(data[Offset.FPS])
+        s.phase = float(data[Offset.PHASE])
+
+        s.scale = float(data[Offset.SIZE_X]) / s.clip.w
         return s
-    """
 
 
 class Offset(IntEnum):
@@ -105,6 +121,10 @@ class Offset(IntEnum):
     CLIP_W = auto()
     CLIP_H = auto()
     BRIGHTNESS = auto()
+    FRAME_START = auto()
+    NUM_FRAMES = auto()
+    FPS = auto()
+    PHASE = auto()
 
 
 class SpriteArray:
@@ -113,6 +133,9 @@ class SpriteArray:
     def __init__(self):
         """Initializes the array."""
         self.data = numpy.zeros((0, len(Offset)), dtype=numpy.float32)
+        self.previous: Optional[numpy.ndarray] = None
+        self.version = 0
+        self.front: Optional['SpriteArray'] = None
 
     def __len__(self) -> int:
         """Returns the number of sprite."""
@@ -120,13 +143,173 @@ class SpriteArray:
 
     def add(self, sprite: Sprite) -> None:
         """Add the given sprite to the sprite array."""
+        if not self.data.flags.owndata:
+            # e.g. memory-mapped data cannot be resized in place
+            self.data = self.data.copy()
+
         # resize array
         self.data.resize((self.data.shape[0] + 1, self.data.shape[1]), refcheck=False)
         index = self.data.shape[0] - 1
 
         # insert sprite data
         self.data[index] = sprite.to_array()
+        self.touch()
+
+    def append(self, data: numpy.ndarray) -> None:
+        """Append the given rows at once. Their previous positions (if saved) are set to their current ones."""
+        if self.previous is not None and self.previous.shape[0] == self.data.shape[0]:
+            self.previous = numpy.concatenate([self.previous, data[:, Offset.POS_X:Offset.POS_Y+1]])
+        self.data = numpy.concatenate([self.data, data]).astype(numpy.float32, copy=False)
+        self.touch()
 
     def clear(self) -> None:
         """Clear the entire array."""
         self.data = numpy.zeros((0, len(Offset)), dtype=numpy.float32)
+        self.previous = None
+        self.touch()
+
+    def touch(self) -> None:
+        """Marks the data as modified. Call this after manipulating the data in place."""
+        self.version += 1
+
+    def select(self, indices: numpy.ndarray) -> None:
+        """Keep only the given rows in the given order (e.g. for sorting), including their previous positions."""
+        self.data = self.data[indices]
+        if self.previous is not None:
+            self.previous = self.previous[indices]
+        self.touch()
+
+    def remove(self, indices: numpy.ndarray) -> None:
+        """Remove the given rows, including their previous positions."""
+        self.data = numpy.delete(self.data, indices, axis=0)
+        if self.previous is not None:
+            self.previous = numpy.delete(self.previous, indices, axis=0)
+        self.touch()
+
+    def save_state(self) -> None:
+        """Remember the current positions. Call this before each simulation step to allow for interpolation."""
+        self.previous = self.data[:, Offset.POS_X:Offset.POS_Y+1].copy()
+
+    def snapshot(self) -> None:
+        """Copy the array to front, which is used for rendering while the original keeps being simulated."""
+        front = SpriteArray()
+        front.data = self.data.copy()
+        front.previous = None if self.previous is None else self.previous.copy()
+        front.version = self.version
+        self.front = front
+
+    def get_front(self) -> 'SpriteArray':
+        """Returns the array that is used for rendering: the last snapshot if there is one, otherwise the array."""
+        return self if self.front is None else self.front
+
+    def interpolate(self, alpha: float) -> numpy.ndarray:
+        """Returns the data with positions interpolated between the saved and the current state.
+
+        If no matching state was saved (e.g. sprites were added after it), the current data is returned unchanged.
+        """
+        if self.previous is None or self.previous.shape[0] != self.data.shape[0] or alpha >= 1.0:
+            return self.data
+
+        data = self.data.copy()
+        current = self.data[:, Offset.POS_X:Offset.POS_Y+1]
+        data[:, Offset.POS_X:Offset.POS_Y+1] = self.previous + (current - self.previous) * alpha
+        return data
+
+    def extrapolate(self, delta_ms: float) -> numpy.ndarray:
+        """Returns the data with positions moved along their velocities by delta_ms, as the sprite shader does."""
+        data = self.data.copy()
+        data[:, Offset.POS_X:Offset.POS_Y+1] += data[:, Offset.VEL_X:Offset.VEL_Y+1] * delta_ms
+        return data
+
+
+class SharedSpriteArray(SpriteArray):
+    """Sprite array whose data lives in shared memory, so other processes can access it without copying.
+
+    The memory block is allocated with a capacity of rows and replaced by a larger one if the data outgrows it. Hence
+    its name changes and other processes have to attach again. The creating process owns the block and has to
+    release() it. Only the owner can grow the array.
+    """
+
+    def __init__(self, capacity: int = 1024, name: Optional[str] = None) -> None:
+        """Creates a new block for the given number of rows or attaches to the existing block with the given name."""
+        self._memory: Optional[shared_memory.SharedMemory] = None
+        self._buffer = numpy.zeros((0, len(Offset)), dtype=numpy.float32)
+        self._count = 0
+        self._owner = name is None
+
+        if name is None:
+            self._allocate(capacity)
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+            self._map()
+
+        super().__init__()
+
+    @property
+    def data(self) -> numpy.ndarray:
+        """Returns a view of the used rows in shared memory."""
+        return self._buffer[:self._count]
+
+    @data.setter
+    def data(self, value: numpy.ndarray) -> None:
+        """Copies the given rows into shared memory, growing it if necessary."""
+        if len(value) > len(self._buffer):
+            self._allocate(max(len(value), 2 * len(self._buffer)))
+
+        self._buffer[:len(value)] = value
+        self._count = len(value)
+
+    @property
+    def name(self) -> str:
+        """Returns the name of the current memory block, which is used to attach from other processes."""
+        return self._memory.name
+
+    def _map(self) -> None:
+        row_size = len(Offset) * numpy.dtype(numpy.float32).itemsize
+        self._buffer = numpy.ndarray((self._memory.size // row_size, len(Offset)), dtype=numpy.float32,
+                                     buffer=self._memory.buf)
+
+    def _allocate(self, capacity: int) -> None:
+        """Replaces the memory block by one with the given number of rows and keeps the used rows.
+
+        Raises a ValueError if the block is not owned, because the new block would never be freed.
+        """
+        if not self._owner:
+            raise ValueError(f'cannot grow {self._memory.name}, which is owned by another array')
+
+        row_size = len(Offset) * numpy.dtype(numpy.float32).itemsize
+        memory = shared_memory.SharedMemory(create=True, size=max(capacity, 1) * row_size)
+        rows = self._buffer[:self._count].copy()
+
+        self.release()
+        self._memory = memory
+        self._map()
+        self._buffer[:len(rows)] = rows
+
+    def resize(self, count: int) -> None:
+        """Sets the number of used rows, e.g. after the owning process changed them."""
+        self._count = min(count, len(self._buffer))
+
+    def add(self, sprite: Sprite) -> None:
+        """Add the given sprite to the sprite array."""
+        if self._count == len(self._buffer):
+            self._allocate(2 * len(self._buffer))
+
+        self._buffer[self._count] = sprite.to_array()
+        self._count += 1
+        self.touch()
+
+    def release(self) -> None:
+        """Unmaps the memory block and, if owned, frees it. Views of the data must not be used afterwards."""
+        if self._memory is None:
+            return
+
+        self._buffer = numpy.zeros((0, len(Offset)), dtype=numpy.float32)
+        try:
+            self._memory.close()
+        except BufferError:
+            # views of the data are still alive, the mapping is closed as soon as they are gone
+            pass
+        if self._owner:
+            self._memory.unlink()
+        self._memory = None
@@ -0,0 +1,43 @@
+import moderngl
+import glm
+import pygame
+
+from . import resources
+
+
+class Starfield:
+    """Renders a procedural starfield with parallax layers in a single full-screen pass.
+
+    Stars are generated by hashing grid cells in the fragment shader, so neither textures nor per-frame CPU work are
+    required. Each layer moves and zooms less than the camera, the more distant it is.
+    """
+
+    MAX_LAYERS: int = 4
+
+    def __init__(self, context: moderngl.Context, cache: resources.Cache, seed: float = 0.0) -> None:
+        """Creates the starfield shaders, the seed selects a different set of stars."""
+        vertex_shader, fragment_shader = cache.get_shaders('data/glsl/starfield', ['vert', 'frag'])
+        self._program = context.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader)
+        self._vao = context.vertex_array(self._program, [])
+
+        self.seed = seed
+        self.num_layers = 3
+        # size of each star's grid cell and the fraction of cells that contain a star
+        self.cell_size = 64.0
+        self.density = 0.15
+
+    def render(self, view_matrix: glm.mat4x4, projection_matrix: glm.mat4x4, center: pygame.math.Vector2,
+               zoom: float) -> None:
+        """Render the stars behind the visible area of the given camera matrices."""
+        if self.num_layers <= 0:
+            return
+
+        self._program['inverse_view_projection'].write(glm.inverse(projection_matrix * view_matrix))
+        self._program['center'] = tuple(center)
+        self._program['zoom'] = zoom
+        self._program['seed'] = self.seed
+        self._program['num_layers'] = min(self.num_layers, Starfield.MAX_LAYERS)
+        self._program['cell_size'] = self.cell_size
+        self._program['density'] = self.density
+
+        self._vao.render(mode=moderngl.TRIANGLES, vertices=3)
@@ -0,0 +1,50 @@
+#version 330
+
+const int CIRCLE = 0;
+const int LINE = 1;
+const int RECT = 2;
+
+flat in int shape;
+flat in vec2 a;
+flat in vec2 b;
+flat in float radius;
+flat in float half_width;
+flat in vec4 color;
+in vec2 world_pos;
+
+out vec4 frag_color;
+
+float circle_distance(vec2 p) {
+    return abs(distance(p, a) - radius);
+}
+
+float line_distance(vec2 p) {
+    vec2 direction = b - a;
+    float t = clamp(dot(p - a, direction) / max(dot(direction, direction), 1e-6), 0.0, 1.0);
+    return distance(p, a + direction * t);
+}
+
+float rect_distance(vec2 p) {
+    vec2 center = (a + b) * 0.5;
+    vec2 d = abs(p - center) - abs(b - a) * 0.5;
+    return abs(length(max(d, 0.0)) + min(max(d.x, d.y), 0.0));
+}
+
+void main() {
+    float dist;
+    if (shape == CIRCLE) {
+        dist = circle_distance(world_pos);
+    } else if (shape == LINE) {
+        dist = line_distance(world_pos);
+    } else {
+        dist = rect_distance(world_pos);
+    }
+
+    // antialiased outline, fwidth gives the size of a pixel in world units
+    float pixel = max(fwidth(world_pos.x), fwidth(world_pos.y));
+    float coverage = clamp(0.5 - (dist - half_width) / pixel, 0.0, 1.0);
+    if (coverage <= 0.0) {
+        discard;
+    }
+    frag_color = vec4(color.rgb, color.a * coverage);
+}
@@ -0,0 +1,39 @@
+#version 330
+
+uniform mat4 view;
+uniform mat4 projection;
+uniform float zoom;
+
+in float in_shape;
+in vec2 in_a;
+in vec2 in_b;
+in float in_radius;
+in float in_thickness;
+in vec4 in_color;
+
+flat out int shape;
+flat out vec2 a;
+flat out vec2 b;
+flat out float radius;
+flat out float half_width;
+flat out vec4 color;
+out vec2 world_pos;
+
+void main() {
+    shape = int(in_shape);
+    a = in_a;
+    b = in_b;
+    radius = in_radius;
+    // line width is given in pixels
+    half_width = 0.5 * in_thickness / zoom;
+    color = in_color;
+
+    // quad around the primitive's bounds (plus the line width and a pixel for antialiasing)
+    float border = half_width + 1.0 / zoom;
+    vec2 lower = min(in_a, in_b) - vec2(in_radius + border);
+    vec2 upper = max(in_a, in_b) + vec2(in_radius + border);
+    vec2 corner = vec2(gl_VertexID & 1, (gl_VertexID >> 1) & 1);
+
+    world_pos = mix(lower, upper, corner);
+    gl_Position = projection * view * vec4(world_pos, 0.0, 1.0);
+}
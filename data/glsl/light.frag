@@ -0,0 +1,11 @@
+#version 330
+
+in vec2 offset;
+in vec3 v_color;
+
+out vec4 frag_color;
+
+void main() {
+    float falloff = max(1.0 - length(offset), 0.0);
+    frag_color = vec4(v_color * falloff * falloff, 1.0);
+}
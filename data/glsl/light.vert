@@ -0,0 +1,19 @@
+#version 330
+
+uniform mat4 view;
+uniform mat4 projection;
+
+in vec2 in_position;
+in float in_radius;
+in vec3 in_color;
+in float in_intensity;
+
+out vec2 offset;
+out vec3 v_color;
+
+void main() {
+    // quad corners from the vertex id (as triangle strip)
+    offset = vec2(gl_VertexID & 1, (gl_VertexID >> 1) & 1) * 2.0 - 1.0;
+    v_color = in_color * in_intensity;
+    gl_Position = projection * view * vec4(in_position + offset * in_radius, 0.0, 1.0);
+}
@@ -0,0 +1,10 @@
+#version 330
+
+out vec2 uv;
+
+void main() {
+    // full-screen triangle from the vertex id, no vertex buffer needed
+    vec2 ndc = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2) * 2.0 - 1.0;
+    uv = ndc * 0.5 + 0.5;
+    gl_Position = vec4(ndc, 0.0, 1.0);
+}
@@ -1,6 +1,7 @@
 #version 330
 
 in vec2 in_position;
+in vec2 in_velocity;
 in vec2 in_origin;
 in vec2 in_size;
 in float in_scale;
@@ -9,6 +10,14 @@ in vec4 in_color;
 in vec2 in_clip_offset;
 in vec2 in_clip_size;
 in float in_brightness;
+// start frame, number of frames, frames per second and phase (in frames)
+in vec4 in_animation;
+
+// time since the last simulation step (in ms) and rotation speed (in degree per ms) for extrapolating the motion
+uniform float time_delta;
+uniform float spin;
+// animation clock (in seconds)
+uniform float time;
 
 out vec2 origin;
 out vec2 size;
@@ -19,12 +28,14 @@ out vec2 clip_size;
 out float brightness;
 
 void main() {
-    gl_Position = vec4(in_position, 0, 1);
+    gl_Position = vec4(in_position + in_velocity * time_delta, 0, 1);
     origin = in_origin;
     size = in_size;
-    rotation = in_rotation;
+    rotation = in_rotation + spin * time_delta;
     color = in_color;
-    clip_offset = in_clip_offset;
+    // frames are laid out next to each other, starting at the clip rect
+    float frame = in_animation.x + mod(floor(time * in_animation.z + in_animation.w), max(in_animation.y, 1.0));
+    clip_offset = in_clip_offset + vec2(frame * in_clip_size.x, 0.0);
     clip_size = in_clip_size;
     brightness = in_brightness;
 }
\ No newline at end of file
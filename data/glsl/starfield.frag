@@ -0,0 +1,52 @@
+#version 330
+
+const int MAX_LAYERS = 4;
+
+uniform vec2 center;
+uniform float zoom;
+uniform float seed;
+uniform int num_layers;
+uniform float cell_size;
+uniform float density;
+
+in vec2 world_pos;
+
+out vec4 frag_color;
+
+// cheap 2d -> 3d hash with values in [0, 1)
+vec3 hash(vec2 p) {
+    vec3 q = fract(vec3(p.xyx) * vec3(0.1031, 0.1030, 0.0973));
+    q += dot(q, q.yxz + 33.33);
+    return fract((q.xxy + q.yzz) * q.zyx);
+}
+
+float layer_stars(vec2 pos, float layer) {
+    vec2 cell = floor(pos / cell_size);
+    vec3 random = hash(cell + vec2(seed, layer * 17.0));
+    if (random.z > density) {
+        return 0.0;
+    }
+
+    // place the star within the inner part of its cell, so neighbor cells can be ignored
+    vec2 star = (cell + 0.2 + 0.6 * random.xy) * cell_size;
+    float radius = mix(0.5, 2.0, random.z / density);
+    float brightness = mix(0.3, 1.0, fract(random.x * 7.0));
+    return brightness * (1.0 - smoothstep(0.0, radius, distance(pos, star)));
+}
+
+void main() {
+    float value = 0.0;
+    for (int i = 0; i < MAX_LAYERS; ++i) {
+        if (i >= num_layers) {
+            break;
+        }
+
+        // far layers move and zoom less than the camera, which creates the parallax effect
+        float depth = 1.0 / float(i + 2);
+        float layer_zoom = mix(1.0, zoom, depth);
+        vec2 pos = (world_pos - center) * zoom / layer_zoom + center * depth;
+        value += layer_stars(pos, float(i)) * (1.0 - 0.5 * float(i) / float(MAX_LAYERS));
+    }
+
+    frag_color = vec4(vec3(value), value);
+}
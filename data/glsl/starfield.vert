@@ -0,0 +1,12 @@
+#version 330
+
+uniform mat4 inverse_view_projection;
+
+out vec2 world_pos;
+
+void main() {
+    // full-screen triangle from the vertex id, no vertex buffer needed
+    vec2 ndc = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2) * 2.0 - 1.0;
+    world_pos = (inverse_view_projection * vec4(ndc, 0.0, 1.0)).xy;
+    gl_Position = vec4(ndc, 0.0, 1.0);
+}
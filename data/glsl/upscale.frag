@@ -0,0 +1,11 @@
+#version 330
+
+uniform sampler2D scene_texture;
+
+in vec2 uv;
+
+out vec4 frag_color;
+
+void main() {
+    frag_color = vec4(texture(scene_texture, uv).rgb, 1.0);
+}
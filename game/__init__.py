@@ -1,4 +1,6 @@
 from .scene import Scene
 from .physics import ObjectType, PhysicsSystem
-from .renderer import RendererSystem
+from .sharding import ShardedPhysicsSystem
+from .streaming import WorldStreamer
+from .renderer import Layer, RendererSystem
 from .controls import ControlsSystem
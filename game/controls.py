@@ -4,10 +4,70 @@ import random
 
 import core
 
-from . import scene
+from . import physics, scene
 
 
 BREAK: float = 0.0015
+TURN_RATE: float = 0.075
+
+# AI steering
+PURSUIT_LOOKAHEAD_MS: float = 500.0
+SEPARATION_RADIUS: float = 100.0
+SEPARATION_WEIGHT: float = 2.0
+FLEE_RADIUS: float = 150.0
+MAX_PURSUIT_DISTANCE: float = 10000.0
+
+
+def normalize(vectors: numpy.ndarray) -> numpy.ndarray:
+    """Returns the given row vectors scaled to unit length, keeping zero vectors."""
+    length = numpy.linalg.norm(vectors, axis=1, keepdims=True)
+    return numpy.divide(vectors, length, out=numpy.zeros_like(vectors), where=length > 0)
+
+
+def get_forward(rotations: numpy.ndarray) -> numpy.ndarray:
+    """Returns the forward vectors for the given rotations (in degree), matching forward.rotate(rotation)."""
+    angles = numpy.radians(rotations)
+    return numpy.stack([-numpy.sin(angles), numpy.cos(angles)], axis=1)
+
+
+def steer_seek(positions: numpy.ndarray, target: numpy.ndarray) -> numpy.ndarray:
+    """Returns the directions from all positions towards the target."""
+    return normalize(target - positions)
+
+
+def steer_flee(positions: numpy.ndarray, threat: numpy.ndarray) -> numpy.ndarray:
+    """Returns the directions from all positions away from the threat."""
+    return -steer_seek(positions, threat)
+
+
+def steer_pursuit(positions: numpy.ndarray, target: numpy.ndarray, target_velocity: numpy.ndarray,
+                  lookahead_ms: float) -> numpy.ndarray:
+    """Returns the directions from all positions towards the target's predicted position."""
+    return steer_seek(positions, target + target_velocity * lookahead_ms)
+
+
+def steer_separation(data: numpy.ndarray, radius: float) -> numpy.ndarray:
+    """Returns the directions of all sprites away from their neighbors within the radius, weighted by their closeness.
+
+    Only sprites within neighboring regions (of the radius' size) are compared.
+    """
+    positions = data[:, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y + 1]
+    result = numpy.zeros_like(positions)
+    if len(data) == 0:
+        return result
+
+    regions = physics.group_by_region(data, numpy.arange(len(data)), radius)
+    for (x, y), indices in regions.items():
+        neighbors = [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+        neighbor_indices = numpy.concatenate([regions[key] for key in neighbors if key in regions])
+
+        diff = positions[indices, numpy.newaxis, :] - positions[numpy.newaxis, neighbor_indices, :]
+        dist = numpy.linalg.norm(diff, axis=2, keepdims=True)
+        weight = numpy.clip(1.0 - dist / radius, 0.0, None)
+        away = numpy.divide(diff, dist, out=numpy.zeros_like(diff), where=dist > 0)
+        result[indices] = numpy.sum(away * weight, axis=1)
+
+    return result
 
 
 class ControlsSystem(scene.BaseSystem):
@@ -33,7 +93,7 @@ class ControlsSystem(scene.BaseSystem):
 
     def rotate(self, index: int, elapsed_ms: int) -> None:
         # NOTE: elapsed_ms is negative if rotating in the opposite direction
-        delta = 0.075 * elapsed_ms
+        delta = TURN_RATE * elapsed_ms
 
         vel_x, vel_y = self.scene.spacecrafts.data[index, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y + 1]
         vel = pygame.math.Vector2(vel_x, vel_y).rotate(delta)
@@ -43,58 +103,71 @@ class ControlsSystem(scene.BaseSystem):
 
     def update_player(self, elapsed_ms: int) -> None:
 
-        keys = pygame.key.get_pressed()
+        # read keys through the engine, so recorded sessions can be replayed
+        is_pressed = self.scene.engine.input.is_pressed
 
         # basic controls
-        if keys[pygame.K_w]:
+        if is_pressed(pygame.K_w):
             self.accelerate(0, elapsed_ms)
-        if keys[pygame.K_s]:
+        if is_pressed(pygame.K_s):
             self.decelerate(0, elapsed_ms)
-        if keys[pygame.K_q]:
+        if is_pressed(pygame.K_q):
             self.rotate(0, elapsed_ms)
-        if keys[pygame.K_e]:
+        if is_pressed(pygame.K_e):
             self.rotate(0, -elapsed_ms)
 
         # zoom
-        if keys[pygame.K_PLUS]:
+        if is_pressed(pygame.K_PLUS):
             self.scene.camera.zoom *= (1 + 0.001 * elapsed_ms)
             if self.scene.camera.zoom > 5.0:
                 self.scene.camera.zoom = 5.0
-        if keys[pygame.K_MINUS]:
+        if is_pressed(pygame.K_MINUS):
             self.scene.camera.zoom *= (1 - 0.001 * elapsed_ms)
             if self.scene.camera.zoom < 0.25:
                 self.scene.camera.zoom = 0.25
 
-    def update_enemy(self, index: int, elapsed_ms: int) -> None:
-        self.scene.spacecrafts.data[index, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y+1] = \
-            self.scene.spacecrafts.data[0, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y+1]
-
-        self.scene.spacecrafts.data[index, core.SpriteOffset.ROTATION] = \
-            self.scene.spacecrafts.data[0, core.SpriteOffset.ROTATION]
-
-        """
-        player_pos = pygame.math.Vector2(
-            *self.scene.spacecrafts.data[0, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y + 1])
-        own_pos = pygame.math.Vector2(
-            *self.scene.spacecrafts.data[index, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y + 1])
-        direction = player_pos - own_pos
-
-        if direction.length() > 10000.0:
-            self.decelerate(index, elapsed_ms)
+    def update_enemies(self, elapsed_ms: int) -> None:
+        """Steers all AI spacecrafts at once: they pursue the player, keep their distance and avoid each other."""
+        data = self.scene.spacecrafts.data
+        if len(data) < 2:
             return
 
-        delta = self.forward.rotate(self.scene.spacecrafts.data[index, core.SpriteOffset.ROTATION]).angle_to(direction)
-
-        if delta < 0:
-            self.rotate(index, -elapsed_ms)
-        if delta > 0:
-            self.rotate(index, elapsed_ms)
-
-        self.accelerate(index, elapsed_ms)
-        """
+        ai = data[1:]
+        positions = ai[:, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y + 1]
+        player_pos = data[0, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y + 1]
+        player_vel = data[0, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y + 1]
+
+        # combine steering behaviors
+        distance = numpy.linalg.norm(player_pos - positions, axis=1)
+        too_close = (distance < FLEE_RADIUS)[:, numpy.newaxis]
+        direction = numpy.where(too_close, steer_flee(positions, player_pos),
+                                steer_pursuit(positions, player_pos, player_vel, PURSUIT_LOOKAHEAD_MS))
+        direction += steer_separation(ai, SEPARATION_RADIUS) * SEPARATION_WEIGHT
+
+        # rotate towards the desired direction (including velocity), limited by the turn rate
+        desired = numpy.degrees(numpy.arctan2(-direction[:, 0], direction[:, 1]))
+        delta = (desired - ai[:, core.SpriteOffset.ROTATION] + 180.0) % 360.0 - 180.0
+        max_delta = TURN_RATE * elapsed_ms
+        delta = numpy.clip(delta, -max_delta, max_delta)
+        delta[numpy.all(direction == 0, axis=1)] = 0.0
+        ai[:, core.SpriteOffset.ROTATION] += delta
+
+        cos, sin = numpy.cos(numpy.radians(delta)), numpy.sin(numpy.radians(delta))
+        vel_x, vel_y = ai[:, core.SpriteOffset.VEL_X].copy(), ai[:, core.SpriteOffset.VEL_Y].copy()
+        ai[:, core.SpriteOffset.VEL_X] = vel_x * cos - vel_y * sin
+        ai[:, core.SpriteOffset.VEL_Y] = vel_x * sin + vel_y * cos
+
+        # accelerate towards the player unless too far away
+        forward = get_forward(ai[:, core.SpriteOffset.ROTATION])
+        accelerating = distance <= MAX_PURSUIT_DISTANCE
+        ai[accelerating, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y + 1] = forward[accelerating]
+        ai[~accelerating, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y + 1] *= numpy.exp(-BREAK * elapsed_ms)
+
+        # emit exhaust for all accelerating spacecrafts
+        origins = positions[accelerating] - forward[accelerating] * 16
+        self.scene.particles.emit_batch(origins, radius=4.0, color=pygame.Color('orange'),
+                                        impacts=forward[accelerating], delta_degree=170)
 
     def update(self, elapsed_ms: int) -> None:
         self.update_player(elapsed_ms)
-
-        for index in range(len(self.scene.spacecrafts)-1):
-            self.update_enemy(index + 1, elapsed_ms)
+        self.update_enemies(elapsed_ms)
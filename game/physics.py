@@ -1,13 +1,21 @@
 import numpy
 import pygame
 
-from typing import Callable
+from typing import Callable, Dict, Tuple, Union, Optional
 from enum import IntEnum, auto
 
 import core
 from game import scene
 
 
+ASTEROID_SPIN: float = 0.01
+
+# world is split into square regions, far regions are simulated at a lower tick rate
+REGION_SIZE: float = 2000.0
+NEAR_MARGIN: float = 1000.0
+FAR_TICK_RATE: int = 8
+
+
 def update_movement(arr: core.SpriteArray, elapsed_ms: int, velocity_fade: float) -> None:
     """Update the sprites' positions using their velocity vectors."""
     # update positions
@@ -17,6 +25,8 @@ def update_movement(arr: core.SpriteArray, elapsed_ms: int, velocity_fade: float
     # decrease velocity
     arr.data[:, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y+1] *= numpy.exp(-velocity_fade * elapsed_ms)
 
+    arr.touch()
+
 
 def query_collision_indices(first: numpy.ndarray, first_indices: numpy.ndarray, second: numpy.ndarray,
                             second_indices: numpy.ndarray, radius_mod: float) -> list:
@@ -44,6 +54,108 @@ def query_collision_indices(first: numpy.ndarray, first_indices: numpy.ndarray,
     return [(full_first_indices[i], full_second_indices[i]) for i in range(len(collisions[0]))]
 
 
+def query_swept_collision_indices(first: numpy.ndarray, first_indices: numpy.ndarray,
+                                  first_elapsed_ms: Union[float, numpy.ndarray], second: numpy.ndarray,
+                                  second_indices: numpy.ndarray, second_elapsed_ms: Union[float, numpy.ndarray],
+                                  radius_mod: float) -> list:
+    """Calculate all collisions between the given objects that happened while they moved during the last step.
+
+    Each object is assumed to have moved along its velocity for its elapsed time, given either for all objects or per
+    row of the full array. Returns a list of (first index, second index, time of impact), where the time of impact
+    ranges from 0 (start of the step) to 1 (end of the step).
+    """
+    # extract relevant rows from the full arrays
+    first_subset = first[first_indices, :]
+    second_subset = second[second_indices, :]
+    first_elapsed = numpy.broadcast_to(first_elapsed_ms, (len(first),))[first_indices]
+    second_elapsed = numpy.broadcast_to(second_elapsed_ms, (len(second),))[second_indices]
+
+    # calculate motion during the step and relative positions at its start
+    first_motion = (first_subset[:, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y + 1] *
+                    first_elapsed[:, numpy.newaxis])
+    second_motion = (second_subset[:, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y + 1] *
+                     second_elapsed[:, numpy.newaxis])
+    motion = first_motion[:, numpy.newaxis, :] - second_motion[numpy.newaxis, :, :]
+    start = (first_subset[:, numpy.newaxis, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y + 1] -
+             second_subset[numpy.newaxis, :, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y + 1]) - motion
+    max_radii = (first_subset[:, core.SpriteOffset.SIZE_X, numpy.newaxis] * 0.5 * radius_mod +
+                 second_subset[:, core.SpriteOffset.SIZE_X, numpy.newaxis].T * 0.5 * radius_mod) ** 2
+
+    # solve |start + motion * t|^2 = radii^2 for the first t
+    a = numpy.sum(motion ** 2, axis=2)
+    b = 2 * numpy.sum(start * motion, axis=2)
+    c = numpy.sum(start ** 2, axis=2) - max_radii
+    discriminant = b ** 2 - 4 * a * c
+
+    time_of_impact = numpy.full(c.shape, numpy.inf, dtype=numpy.float32)
+    approaching = (c > 0) & (a > 0) & (discriminant >= 0)
+    time_of_impact[approaching] = (-b[approaching] - numpy.sqrt(discriminant[approaching])) / (2 * a[approaching])
+    time_of_impact[time_of_impact < 0] = numpy.inf
+    # already overlapping at the start
+    time_of_impact[c <= 0] = 0.0
+
+    # calculate all collisions
+    rows, cols = numpy.where(time_of_impact <= 1.0)
+
+    # convert collisions' indices from subset to full array
+    full_first_indices = first_indices[rows]
+    full_second_indices = second_indices[cols]
+
+    # create list of collision indices and their times of impact
+    times = time_of_impact[rows, cols]
+    return [(full_first_indices[i], full_second_indices[i], times[i]) for i in range(len(rows))]
+
+
+def advance_rows(arr: core.SpriteArray, indices: numpy.ndarray, elapsed_ms: numpy.ndarray, spin: float) -> None:
+    """Move and rotate the given rows analytically by their individual elapsed times (without velocity fade)."""
+    arr.data[indices, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y+1] += \
+        arr.data[indices, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y+1] * elapsed_ms[:, numpy.newaxis]
+    arr.data[indices, core.SpriteOffset.ROTATION] += elapsed_ms * spin
+
+    arr.touch()
+
+
+def get_regions(data: numpy.ndarray, region_size: float) -> numpy.ndarray:
+    """Returns the region coordinates of all given objects."""
+    return numpy.floor(data[:, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y+1] / region_size).astype(numpy.int64)
+
+
+def group_by_region(data: numpy.ndarray, indices: numpy.ndarray,
+                    region_size: float) -> Dict[Tuple[int, int], numpy.ndarray]:
+    """Groups the given object indices by their regions."""
+    regions = get_regions(data[indices], region_size)
+    order = numpy.lexsort((regions[:, 1], regions[:, 0]))
+    keys, starts = numpy.unique(regions[order], axis=0, return_index=True)
+    groups = numpy.split(indices[order], starts[1:])
+
+    return {(x, y): group for (x, y), group in zip(keys.tolist(), groups)}
+
+
+def query_region_collision_indices(data: numpy.ndarray, indices: numpy.ndarray, region_size: float,
+                                   radius_mod: float, elapsed_ms: Optional[numpy.ndarray] = None) -> list:
+    """Calculate all collisions between the given objects, only testing objects within neighboring regions.
+
+    The region size must be larger than the objects' diameters (plus their motion). If the objects' elapsed times are
+    given, swept collisions are calculated.
+    """
+    if len(indices) == 0:
+        return []
+
+    regions = group_by_region(data, indices, region_size)
+
+    collisions = list()
+    for (x, y), first_indices in regions.items():
+        neighbors = [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+        second_indices = numpy.concatenate([regions[key] for key in neighbors if key in regions])
+        if elapsed_ms is None:
+            collisions += query_collision_indices(data, first_indices, data, second_indices, radius_mod)
+        else:
+            collisions += query_swept_collision_indices(data, first_indices, elapsed_ms, data, second_indices,
+                                                        elapsed_ms, radius_mod)
+
+    return collisions
+
+
 # ----------------------------------------------------------------------------------------------------------------------
 
 
@@ -59,11 +171,31 @@ CollisionCallback = Callable[[int, ObjectType, int, ObjectType], None]
 
 
 class PhysicsSystem(scene.BaseSystem):
+    """Moves objects and detects their collisions.
 
-    def __init__(self, scene_obj: scene.Scene, callback: CollisionCallback):
+    Asteroids in regions near the camera are simulated every tick, while far regions are only simulated every n-th
+    tick using a larger step. Each asteroid keeps track of its not yet simulated time, so moving between near and far
+    regions does not lose or duplicate any motion.
+
+    If continuous is enabled, collisions are detected along the objects' paths during the last step instead of only at
+    their current positions, so fast objects cannot pass through each other.
+    """
+
+    def __init__(self, scene_obj: scene.Scene, callback: CollisionCallback, continuous: bool = False):
         super().__init__(scene_obj)
 
         self._callback = callback
+        self.continuous = continuous
+
+        self.region_size = REGION_SIZE
+        self.near_margin = NEAR_MARGIN
+        self.far_tick_rate = FAR_TICK_RATE
+
+        self._tick = 0
+        self._lag_ms = numpy.zeros(0, dtype=numpy.float32)
+        self._step_ms = numpy.zeros(0, dtype=numpy.float32)
+        self._near_indices = numpy.zeros(0, dtype=numpy.int64)
+        self._elapsed_ms = 0
 
     def get_sprite_center(self, index: int, type_: ObjectType) -> pygame.math.Vector2:
         if type_ == ObjectType.ASTEROID:
@@ -85,12 +217,78 @@ class PhysicsSystem(scene.BaseSystem):
 
         self._callback(index1, type1, index2, type2)
 
+    def query_near(self, data: numpy.ndarray) -> numpy.ndarray:
+        """Returns a mask of all objects within the regions around the camera's (enlarged) visible area."""
+        rect = self.scene.get_view().get_bounding_rect().inflate(2 * self.near_margin, 2 * self.near_margin)
+        min_x, min_y = numpy.floor(numpy.array(rect.topleft) / self.region_size)
+        max_x, max_y = numpy.floor(numpy.array(rect.bottomright) / self.region_size)
+
+        regions = get_regions(data, self.region_size)
+        return ((min_x <= regions[:, 0]) & (regions[:, 0] <= max_x) &
+                (min_y <= regions[:, 1]) & (regions[:, 1] <= max_y))
+
+    def is_far_tick(self) -> bool:
+        """Returns whether far regions are simulated during the current tick."""
+        return self._tick % self.far_tick_rate == 0
+
+    def resize_lag(self) -> None:
+        """Matches the pending time to the number of asteroids, keeping it for the existing rows. Asteroids that were
+        appended have no pending time.
+        """
+        count = len(self.scene.asteroids)
+        if self._lag_ms.shape[0] == count:
+            return
+
+        lag_ms = numpy.zeros(count, dtype=numpy.float32)
+        kept = min(count, self._lag_ms.shape[0])
+        lag_ms[:kept] = self._lag_ms[:kept]
+        self._lag_ms = lag_ms
+
+    def flush(self) -> None:
+        """Moves all asteroids by their pending time, so none is pending anymore.
+
+        The pending time is stored per row, so this has to be called before asteroids are reordered, removed or
+        replaced outside of the system (e.g. before loading or saving a scene).
+        """
+        arr = self.scene.asteroids
+        self.resize_lag()
+
+        pending = numpy.where(self._lag_ms > 0.0)[0]
+        if len(pending) > 0:
+            advance_rows(arr, pending, self._lag_ms[pending], ASTEROID_SPIN)
+            self._lag_ms[pending] = 0.0
+
+    def update_asteroids_movement(self, elapsed_ms: int) -> None:
+        """Moves asteroids in near regions every tick and all asteroids on far ticks."""
+        arr = self.scene.asteroids
+        self.resize_lag()
+
+        self._tick += 1
+        self._lag_ms += elapsed_ms
+
+        near = self.query_near(arr.data)
+        due = numpy.arange(len(arr)) if self.is_far_tick() else numpy.where(near)[0]
+        advance_rows(arr, due, self._lag_ms[due], ASTEROID_SPIN)
+
+        # remember how far each asteroid moved for swept collisions
+        self._step_ms = numpy.zeros(len(arr), dtype=numpy.float32)
+        self._step_ms[due] = self._lag_ms[due]
+        self._lag_ms[due] = 0.0
+
+        # sort asteroids by SIZE_X (descending)
+        indices = numpy.argsort(-arr.data[:, core.SpriteOffset.SIZE_X])
+        arr.select(indices)
+        self._lag_ms = self._lag_ms[indices]
+        self._step_ms = self._step_ms[indices]
+        self._near_indices = numpy.where(near[indices])[0]
+
     def update_pure_asteroids_collision(self) -> None:
-        """Detects and handles collisions between asteroids."""
+        """Detects and handles collisions between asteroids in near regions or, on far ticks, in all regions."""
         data = self.scene.asteroids.data
-        indices = self.scene.camera.query_visible(data)
-        collision_indices = query_collision_indices(data, indices, data, indices, 1.0)
-        for left, right in collision_indices:
+        indices = numpy.arange(len(data)) if self.is_far_tick() else self._near_indices
+        elapsed_ms = self._step_ms if self.continuous else None
+        collision_indices = query_region_collision_indices(data, indices, self.region_size, 1.0, elapsed_ms)
+        for left, right, *_ in collision_indices:
             if left == right:
                 continue
             self.on_collision(left, ObjectType.ASTEROID, right, ObjectType.ASTEROID)
@@ -98,9 +296,13 @@ class PhysicsSystem(scene.BaseSystem):
     def update_pure_spacecraft_collision(self) -> None:
         """Detects and handles collisions between spacecrafts."""
         data = self.scene.spacecrafts.data
-        indices = self.scene.camera.query_visible(data)
-        collision_indices = query_collision_indices(data, indices, data, indices, 1.0)
-        for left, right in collision_indices:
+        indices = self.scene.get_view().query_visible(self.scene.spacecrafts)
+        if self.continuous:
+            collision_indices = query_swept_collision_indices(data, indices, self._elapsed_ms, data, indices,
+                                                              self._elapsed_ms, 1.0)
+        else:
+            collision_indices = query_collision_indices(data, indices, data, indices, 1.0)
+        for left, right, *_ in collision_indices:
             if left == right:
                 continue
             self.on_collision(left, ObjectType.SPACECRAFT, right, ObjectType.SPACECRAFT)
@@ -108,12 +310,17 @@ class PhysicsSystem(scene.BaseSystem):
     def update_mixed_collision(self) -> None:
         """Detects and handles collisions between asteroids and spacecrafts."""
         asteroid_data = self.scene.asteroids.data
-        asteroid_indices = self.scene.camera.query_visible(asteroid_data)
+        asteroid_indices = self.scene.get_view().query_visible(self.scene.asteroids)
         spacecraft_data = self.scene.spacecrafts.data
-        spacecraft_indices = self.scene.camera.query_visible(spacecraft_data)
-        collision_indices = query_collision_indices(asteroid_data, asteroid_indices, spacecraft_data,
-                                                    spacecraft_indices, 1.0)
-        for asteroid_index, fighter_index in collision_indices:
+        spacecraft_indices = self.scene.get_view().query_visible(self.scene.spacecrafts)
+        if self.continuous:
+            collision_indices = query_swept_collision_indices(asteroid_data, asteroid_indices, self._step_ms,
+                                                              spacecraft_data, spacecraft_indices, self._elapsed_ms,
+                                                              1.0)
+        else:
+            collision_indices = query_collision_indices(asteroid_data, asteroid_indices, spacecraft_data,
+                                                        spacecraft_indices, 1.0)
+        for asteroid_index, fighter_index, *_ in collision_indices:
             self.on_collision(asteroid_index, ObjectType.ASTEROID, fighter_index, ObjectType.SPACECRAFT)
 
     # FIXME:
@@ -134,18 +341,21 @@ class PhysicsSystem(scene.BaseSystem):
     """
 
     def update(self, elapsed_ms) -> None:
-        # update spacecrafts
-        update_movement(self.scene.spacecrafts, elapsed_ms, velocity_fade=0.0005)
+        self._elapsed_ms = elapsed_ms
 
-        # use asteroids (pos, rotate
-        update_movement(self.scene.asteroids, elapsed_ms, velocity_fade=0.0)
-        self.scene.asteroids.data[:, core.SpriteOffset.ROTATION] += elapsed_ms * 0.01
+        monitor = self.scene.engine.perf_monitor
 
-        # sort asteroids by SIZE_X (descending)
-        indices = numpy.argsort(-self.scene.asteroids.data[:, core.SpriteOffset.SIZE_X])
-        self.scene.asteroids.data = self.scene.asteroids.data[indices]
+        with monitor.scope('movement'):
+            # update spacecrafts
+            update_movement(self.scene.spacecrafts, elapsed_ms, velocity_fade=0.0005)
+
+            # update asteroids (position and rotation)
+            self.update_asteroids_movement(elapsed_ms)
 
         # handle collision stuff
-        self.update_pure_asteroids_collision()
-        self.update_pure_spacecraft_collision()
-        self.update_mixed_collision()
+        with monitor.scope('asteroids_collision'):
+            self.update_pure_asteroids_collision()
+        with monitor.scope('spacecraft_collision'):
+            self.update_pure_spacecraft_collision()
+        with monitor.scope('mixed_collision'):
+            self.update_mixed_collision()
@@ -1,91 +1,148 @@
-import random
-import math
-
+import numpy
 import moderngl
 import pygame
 import pygame.gfxdraw
+import glm
+
+from enum import IntEnum, auto
 
 import core
-from game import scene
+from game import scene, physics
+
 
+EXHAUST_LIGHT_RADIUS: float = 150.0
+# debug arrows show how far objects move within this time
+DEBUG_VELOCITY_MS: float = 500.0
 
-STARFIELD_LOD: int = 4
+
+class Layer(IntEnum):
+    """Draw order of the render queue, from back to front."""
+    BACKGROUND = 0
+    ASTEROIDS = auto()
+    PARTICLES = auto()
+    SPACECRAFTS = auto()
+    LIGHTS = auto()
+    DEBUG = auto()
 
 
 class RendererSystem(scene.BaseSystem):
-    def __init__(self, scene_obj: scene.Scene):
+    def __init__(self, scene_obj: scene.Scene, extrapolate: bool = True):
         super().__init__(scene_obj)
 
+        # move sprites on the GPU between simulation steps instead of uploading interpolated positions each frame
+        self.extrapolate = extrapolate
+        # draw collision circles, broadphase regions and velocities
+        self.show_debug = False
+        self.region_size = physics.REGION_SIZE
+
         # setup asteroids rendering batch
-        asteroids_tex = scene_obj.engine.cache.get_svg('data/sprites/asteroid.svg', scale=10)
+        scene_obj.texture_refs['asteroids'] = 'data/sprites/asteroid.svg'
+        asteroids_tex = scene_obj.engine.cache.get_svg(scene_obj.texture_refs['asteroids'], scale=10)
         asteroids_tex.filter = moderngl.NEAREST, moderngl.NEAREST
         self.asteroids = core.RenderBatch(scene_obj.engine.context, scene_obj.engine.cache, 10_000, scene_obj.asteroids,
                                           asteroids_tex)
 
         # setup spacecraft rendering batch
-        spacecraft_tex = scene_obj.engine.cache.get_png('data/sprites/ship.png')
+        scene_obj.texture_refs['spacecrafts'] = 'data/sprites/ship.png'
+        spacecraft_tex = scene_obj.engine.cache.get_png(scene_obj.texture_refs['spacecrafts'])
         spacecraft_tex.filter = moderngl.NEAREST, moderngl.NEAREST
         self.spacecrafts = core.RenderBatch(scene_obj.engine.context, scene_obj.engine.cache, 2_000,
                                             scene_obj.spacecrafts, spacecraft_tex)
 
-        # setup starfield sprite
-        self.starfield_tex = self.generate_starfield(*pygame.display.get_window_size(), 200)
-        self.starfield_array = core.SpriteArray()
-        self.starfield = core.RenderBatch(scene_obj.engine.context, scene_obj.engine.cache, 1_000,
-                                          self.starfield_array, self.starfield_tex)
-
-        self.lightmap = core.create_lightmap(scene_obj.engine.context, 1_000)
-        self.light_sprite = core.Sprite(self.lightmap)
-        self.light_sprite.color = pygame.Color('yellow')
-        self.light_sprite.color.a = 50
-
-    def generate_starfield(self, width: int, height: int, num_stars: int) -> moderngl.Texture:
-        width *= STARFIELD_LOD
-        height *= STARFIELD_LOD
-        surface = pygame.Surface((width, height), flags=pygame.SRCALPHA)
-        for _ in range(num_stars):
-            x = random.randrange(width - 8 * STARFIELD_LOD) + 4 * STARFIELD_LOD
-            y = random.randrange(height - 8 * STARFIELD_LOD) + 4 * STARFIELD_LOD
-            v = random.randrange(255)
-            color = pygame.Color(v, v, v, 255)
-            for radius in reversed(range(STARFIELD_LOD)):
-                color_step = (color.r, color.g, color.b, 255 - int(color.a * radius / STARFIELD_LOD))
-                pygame.draw.circle(surface, color_step, (x, y), radius * random.uniform(2.0, 4.0))
-
-        texture = core.texture_from_surface(self.scene.engine.context, surface)
-        texture.filter = moderngl.NEAREST, moderngl.NEAREST
-
-        return texture
-
-    def continue_starfield(self, x: float, y: float) -> None:
-        size = pygame.display.get_window_size()
-        cell_x = int(x) // size[0]
-        cell_y = int(y) // size[1]
-
-        cam_size = self.scene.camera.get_size()
-        x_border = int(math.ceil(cam_size[0] / size[0])) + 1
-        y_border = int(math.ceil(cam_size[1] / size[1])) + 1
-
-        self.starfield_array.clear()
-        for dy in range(-y_border, y_border+1):
-            for dx in range(-x_border, x_border+1):
-                s = core.Sprite(texture=self.starfield_tex, origin=pygame.Vector2())
-                s.center.x = (cell_x + dx) * size[0] - size[0] // 2
-                s.center.y = (cell_y + dy) * size[1] - size[1] // 2
-                s.scale /= 4
-                self.starfield_array.add(s)
+        self.asteroids.extrapolate = extrapolate
+        self.asteroids.spin = physics.ASTEROID_SPIN
+        self.spacecrafts.extrapolate = extrapolate
 
-    def update(self, elapsed_ms: int) -> None:
-        pass
+        # setup procedural starfield
+        seed = scene_obj.engine.make_rng('starfield').uniform(0.0, 1000.0)
+        self.starfield = core.Starfield(scene_obj.engine.context, scene_obj.engine.cache, seed)
+
+        # setup lights, where the exhausts' lights are recreated every frame
+        self.lighting = core.LightRenderer(scene_obj.engine.context, scene_obj.engine.cache, scale=0.5)
+        self.exhausts = core.LightArray()
 
-    def render(self) -> None:
-        self.scene.camera.render_batch(self.starfield)
+        self.debug = core.DebugDraw(scene_obj.engine.context, scene_obj.engine.cache)
 
-        #self.light_sprite.center.x = self.scene.spacecrafts.data[0, core.SpriteOffset.POS_X]
-        #self.light_sprite.center.y = self.scene.spacecrafts.data[0, core.SpriteOffset.POS_Y]
-        #self.scene.camera.render(self.light_sprite)
+        self.queue = core.RenderQueue(scene_obj.engine.gpu_profiler)
 
-        self.scene.camera.render_batch(self.asteroids)
-        self.scene.camera.render_particles(self.scene.particles)
-        self.scene.camera.render_batch(self.spacecrafts)
+    def update(self, elapsed_ms: int) -> None:
+        pass
 
+    def get_player_data(self, alpha: float) -> numpy.ndarray:
+        """Returns the player's sprite data as it is rendered, so the camera can follow without jitter."""
+        spacecrafts = self.scene.spacecrafts.get_front()
+        if self.extrapolate:
+            return spacecrafts.extrapolate(self.get_delta_ms(alpha))[0]
+        return spacecrafts.interpolate(alpha)[0]
+
+    def get_delta_ms(self, alpha: float) -> float:
+        """Returns the time that passed since the last simulation step."""
+        return alpha * self.scene.engine.timestep.step_ms
+
+    def get_rendered_rows(self, arr: core.SpriteArray, indices: numpy.ndarray, alpha: float) -> numpy.ndarray:
+        """Returns the given rows of the array as they are rendered, i.e. extrapolated or interpolated."""
+        front = arr.get_front()
+        if not self.extrapolate:
+            return front.interpolate(alpha)[indices]
+
+        data = front.data[indices]
+        data[:, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y + 1] += \
+            data[:, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y + 1] * self.get_delta_ms(alpha)
+        return data
+
+    def update_exhausts(self, alpha: float) -> None:
+        """Places a light at each spacecraft's rendered position."""
+        spacecrafts = self.scene.spacecrafts.get_front()
+        data = self.get_rendered_rows(spacecrafts, numpy.arange(len(spacecrafts)), alpha)
+
+        self.exhausts.clear()
+        self.exhausts.add_batch(data[:, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y + 1], EXHAUST_LIGHT_RADIUS,
+                                pygame.Color('orange'), intensity=0.5)
+
+    def render(self, alpha: float = 1.0) -> None:
+        """Queues all draws of the frame and renders them in layer order. The queue's stats cover this frame."""
+        delta_ms = self.get_delta_ms(alpha)
+        camera = self.scene.camera
+
+        # animations run on simulated time, so they pause and replay with the simulation
+        self.asteroids.time = self.spacecrafts.time = (self.scene.engine.timestep.simulated_ms + delta_ms) / 1000.0
+
+        self.queue.stats.reset()
+        self.queue.submit_pass(Layer.BACKGROUND, lambda view_matrix, projection_matrix: self.starfield.render(
+            view_matrix, projection_matrix, camera.center, camera.zoom), 'starfield')
+        self.queue.submit(Layer.ASTEROIDS, self.asteroids, alpha, delta_ms, 'asteroids')
+        self.queue.submit_pass(Layer.PARTICLES, self.scene.particles.render, 'particles')
+        self.queue.submit(Layer.SPACECRAFTS, self.spacecrafts, alpha, delta_ms, 'spacecrafts')
+
+        self.update_exhausts(alpha)
+        self.queue.submit_pass(Layer.LIGHTS, self.render_lights, 'lights')
+
+        if self.show_debug:
+            self.add_debug_primitives(alpha)
+            self.queue.submit_pass(Layer.DEBUG, lambda view_matrix, projection_matrix: self.debug.render(
+                view_matrix, projection_matrix, camera.zoom), 'debug')
+
+        camera.render_queue(self.queue)
+
+    def render_lights(self, view_matrix: glm.mat4x4, projection_matrix: glm.mat4x4) -> int:
+        """Accumulates the scene's and exhausts' lights and adds them onto the frame. Returns the uploaded bytes."""
+        uploaded = self.lighting.render(view_matrix, projection_matrix, self.scene.lights, self.exhausts)
+        self.lighting.composite()
+        return uploaded
+
+    def add_debug_primitives(self, alpha: float) -> None:
+        """Adds the visible objects' collision circles, their broadphase regions and their velocities."""
+        camera = self.scene.camera
+        asteroids = self.get_rendered_rows(self.scene.asteroids,
+                                           camera.query_visible(self.scene.asteroids.get_front()), alpha)
+        spacecrafts = self.get_rendered_rows(self.scene.spacecrafts,
+                                             camera.query_visible(self.scene.spacecrafts.get_front()), alpha)
+
+        regions = numpy.unique(physics.get_regions(asteroids, self.region_size), axis=0) * self.region_size
+        self.debug.rects(regions, regions + self.region_size, pygame.Color(128, 128, 128, 128))
+
+        for data, color in ((asteroids, pygame.Color('red')), (spacecrafts, pygame.Color('yellow'))):
+            positions = data[:, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y + 1]
+            velocities = data[:, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y + 1]
+            self.debug.circles(positions, data[:, core.SpriteOffset.SIZE_X] * 0.5, color)
+            self.debug.arrows(positions, positions + velocities * DEBUG_VELOCITY_MS, pygame.Color('green'))
@@ -1,23 +1,31 @@
 import numpy
 import pygame
 
-from typing import List
+from typing import Dict, List, Optional
 from abc import ABC, abstractmethod
 
 import core
 
 
 class Scene:
-    def __init__(self, engine: core.Engine) -> None:
+    def __init__(self, engine: core.Engine, max_num_particles: int = 50_000, shared_asteroids: bool = False) -> None:
         self.engine = engine
+        # paths of the textures that the sprite arrays' data refers to (e.g. by clipping), by array name
+        self.texture_refs: Dict[str, str] = dict()
 
         self.spacecrafts = core.SpriteArray()
-        self.asteroids = core.SpriteArray()
+        # asteroids in shared memory can be simulated by other processes
+        self.asteroids = core.SharedSpriteArray() if shared_asteroids else core.SpriteArray()
 
         shaders = engine.cache.get_shaders('data/glsl/particles', ['vert', 'geom', 'frag'])
-        self.particles = core.ParticleSystem(engine.context, 50_000, 128, *shaders)
+        self.particles = core.ParticleSystem(engine.context, max_num_particles, 128, *shaders,
+                                             rng=engine.make_rng('particles'))
+        # lights that outlive a single frame (e.g. explosions)
+        self.lights = core.LightArray()
         self.camera = core.Camera(engine.context, engine.cache)
         self.gui = core.GuiCamera(engine.context, engine.cache)
+        # camera view that the simulation queries while the camera keeps moving (pipelined mode)
+        self.view: Optional[core.CameraView] = None
 
     def explode_spacecrafts(self, indices: List[int]) -> None:
         if len(indices) == 0:
@@ -29,9 +37,66 @@ class Scene:
             pos = core.Sprite.get_center(self.spacecrafts.data[index])
             for _ in range(150):
                 self.particles.emit(origin=pos, radius=5.0, spread=10.0, speed=10.0, color=pygame.Color('white'))
+            self.lights.add(pos, radius=400.0, color=pygame.Color('orange'), intensity=2.0, decay=0.002)
 
         tmp = sorted(indices, reverse=True)
-        self.spacecrafts.data = numpy.delete(self.spacecrafts.data, tmp, axis=0)
+        self.spacecrafts.remove(tmp)
+
+    def save(self, path: str) -> None:
+        """Writes all sprite and particle arrays with their texture references to the given file."""
+        arrays = {
+            'spacecrafts': self.spacecrafts.data,
+            'asteroids': self.asteroids.data,
+            'particles': self.particles.data
+        }
+        core.save_arrays(path, arrays, {'texture_refs': self.texture_refs})
+
+    def load(self, path: str) -> None:
+        """Replaces all sprite and particle arrays by the ones from the given file.
+
+        The arrays are memory-mapped instead of parsed, so even huge scenes load quickly. Raises a ValueError if the
+        file refers to other textures than the scene uses or stores sprites or particles with other columns.
+        """
+        arrays, metadata = core.load_arrays(path)
+        num_columns = {
+            'spacecrafts': len(core.SpriteOffset),
+            'asteroids': len(core.SpriteOffset),
+            'particles': self.particles.data.shape[1]
+        }
+        for name, expected in num_columns.items():
+            if arrays[name].ndim != 2 or arrays[name].shape[1] != expected:
+                raise ValueError(f'{path} stores {name} with {arrays[name].shape[-1]} columns, expected {expected}')
+        for name, ref in metadata['texture_refs'].items():
+            if self.texture_refs.get(name, ref) != ref:
+                raise ValueError(f'{path} uses {ref} for {name} instead of {self.texture_refs[name]}')
+
+        for name, arr in (('spacecrafts', self.spacecrafts), ('asteroids', self.asteroids)):
+            arr.data = arrays[name]
+            arr.previous = None
+            arr.touch()
+        self.particles.data = arrays['particles']
+
+    def release(self) -> None:
+        """Frees the shared memory of the asteroids (if used)."""
+        if isinstance(self.asteroids, core.SharedSpriteArray):
+            self.asteroids.release()
+
+    def save_state(self) -> None:
+        """Remember the sprites' positions before a simulation step, so rendering can interpolate them."""
+        self.spacecrafts.save_state()
+        self.asteroids.save_state()
+
+    def snapshot(self) -> None:
+        """Copy everything that is rendered, so the simulation can continue while rendering (pipelined mode)."""
+        self.spacecrafts.snapshot()
+        self.asteroids.snapshot()
+        self.particles.snapshot()
+        self.lights.snapshot()
+        self.view = self.camera.get_view()
+
+    def get_view(self) -> core.CameraView:
+        """Returns the view that is simulated around: the last snapshot's view if there is one, otherwise the camera."""
+        return self.camera if self.view is None else self.view
 
 
 class BaseSystem(ABC):
@@ -0,0 +1,122 @@
+import os
+import concurrent.futures
+
+import numpy
+
+from typing import Dict, List, Optional, Tuple
+
+import core
+from game import scene, physics
+
+
+# shared arrays that a worker process attached to, by name of their memory blocks
+_attached: Dict[str, core.SharedSpriteArray] = dict()
+
+
+def get_shared_array(name: str, count: int) -> core.SharedSpriteArray:
+    """Attaches to the shared array with the given name (once per worker process) and sets its number of rows."""
+    arr = _attached.get(name)
+    if arr is None:
+        # the array was reallocated, so the old memory block is not used anymore
+        for old in _attached.values():
+            old.release()
+        _attached.clear()
+
+        arr = core.SharedSpriteArray(name=name)
+        _attached[name] = arr
+
+    arr.resize(count)
+    return arr
+
+
+def integrate_shard(name: str, count: int, start: int, stop: int, elapsed_ms: float, spin: float) -> None:
+    """Moves and rotates the given rows of the shared array in place."""
+    data = get_shared_array(name, count).data[start:stop]
+    data[:, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y+1] += \
+        data[:, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y+1] * elapsed_ms
+    data[:, core.SpriteOffset.ROTATION] += elapsed_ms * spin
+
+
+def collide_shard(name: str, count: int, low: float, high: float, margin: float, region_size: float,
+                  elapsed_ms: Optional[float]) -> List[Tuple[int, int]]:
+    """Returns the collisions of all objects whose x-coordinates are within [low, high).
+
+    Objects within the margin beyond the borders are included as ghosts, so collisions across the borders are found.
+    Each collision is only returned by the shard that owns its first object, hence neighboring shards do not report the
+    same collision. Like query_region_collision_indices, both orders of a pair are returned.
+    """
+    data = get_shared_array(name, count).data
+    x = data[:, core.SpriteOffset.POS_X]
+    candidates = numpy.where((low - margin <= x) & (x < high + margin))[0]
+
+    collisions = physics.query_region_collision_indices(data, candidates, region_size, 1.0, elapsed_ms)
+    return [(int(left), int(right)) for left, right, *_ in collisions
+            if left != right and low <= x[left] < high]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class ShardedPhysicsSystem(physics.PhysicsSystem):
+    """Physics system that distributes the asteroids onto worker processes, so large asteroid fields use all cores.
+
+    The asteroids have to be stored in shared memory (see Scene), so the workers access them without copying. Each tick
+    runs in two phases: first, every worker integrates a contiguous range of rows. Then every worker collides a strip
+    of the world along the x-axis, including a border of ghost objects from its neighbors. The strips are chosen to
+    hold about the same number of asteroids.
+
+    All asteroids are simulated every tick, far regions are not skipped.
+    """
+
+    def __init__(self, scene_obj: scene.Scene, callback: physics.CollisionCallback, continuous: bool = False,
+                 num_shards: Optional[int] = None):
+        super().__init__(scene_obj, callback, continuous)
+
+        if not isinstance(scene_obj.asteroids, core.SharedSpriteArray):
+            raise ValueError('sharded physics requires asteroids in shared memory')
+
+        self.num_shards = num_shards if num_shards is not None else os.cpu_count()
+        self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.num_shards)
+
+    def shutdown(self) -> None:
+        """Stops the worker processes."""
+        self._executor.shutdown()
+
+    def get_strip_bounds(self, data: numpy.ndarray) -> numpy.ndarray:
+        """Returns num_shards + 1 x-coordinates that split the given objects into strips of similar size."""
+        # estimate the quantiles from a sample
+        sample = data[::max(1, len(data) // 10_000), core.SpriteOffset.POS_X]
+        inner = numpy.quantile(sample, numpy.linspace(0.0, 1.0, self.num_shards + 1)[1:-1]) if len(sample) > 0 else []
+        return numpy.concatenate([[-numpy.inf], inner, [numpy.inf]])
+
+    def update_asteroids_movement(self, elapsed_ms: int) -> None:
+        """Moves all asteroids using the worker processes."""
+        arr = self.scene.asteroids
+        if self._step_ms.shape[0] != len(arr):
+            # asteroids were added or removed: sort them by SIZE_X (descending)
+            arr.select(numpy.argsort(-arr.data[:, core.SpriteOffset.SIZE_X]))
+        self._tick += 1
+
+        chunks = numpy.linspace(0, len(arr), self.num_shards + 1).astype(numpy.int64)
+        futures = [self._executor.submit(integrate_shard, arr.name, len(arr), int(start), int(stop), elapsed_ms,
+                                         physics.ASTEROID_SPIN)
+                   for start, stop in zip(chunks[:-1], chunks[1:])]
+        for future in futures:
+            future.result()
+        arr.touch()
+
+        # remember how far each asteroid moved for swept collisions
+        self._step_ms = numpy.full(len(arr), elapsed_ms, dtype=numpy.float32)
+
+    def update_pure_asteroids_collision(self) -> None:
+        """Detects collisions between asteroids using the worker processes and handles them."""
+        arr = self.scene.asteroids
+        bounds = self.get_strip_bounds(arr.data)
+        elapsed_ms = self._elapsed_ms if self.continuous else None
+
+        futures = [self._executor.submit(collide_shard, arr.name, len(arr), low, high, self.region_size,
+                                         self.region_size, elapsed_ms)
+                   for low, high in zip(bounds[:-1], bounds[1:])]
+        for future in futures:
+            for left, right in future.result():
+                self.on_collision(left, physics.ObjectType.ASTEROID, right, physics.ObjectType.ASTEROID)
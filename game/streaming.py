@@ -0,0 +1,172 @@
+import os
+import concurrent.futures
+
+import numpy
+import pygame
+
+from typing import Dict, Iterator, Set, Tuple
+
+import core
+from game import scene
+
+
+CHUNK_SIZE: float = 8000.0
+# chunks within this distance (in chunks) around the camera are kept in memory
+ACTIVE_RADIUS: int = 1
+# chunks around the position the camera reaches within this time are loaded ahead
+PREFETCH_MS: float = 2000.0
+
+ChunkKey = Tuple[int, int]
+
+
+def get_chunks(data: numpy.ndarray, chunk_size: float) -> numpy.ndarray:
+    """Returns the chunk coordinates of all given objects."""
+    return numpy.floor(data[:, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y+1] / chunk_size).astype(numpy.int64)
+
+
+def get_surrounding_chunks(pos: pygame.math.Vector2, chunk_size: float, radius: int) -> Iterator[ChunkKey]:
+    """Yields the chunk that contains the given position and all chunks within the given radius around it."""
+    x, y = int(pos.x // chunk_size), int(pos.y // chunk_size)
+    for dy in range(-radius, radius + 1):
+        for dx in range(-radius, radius + 1):
+            yield x + dx, y + dy
+
+
+def get_keys(chunks: numpy.ndarray) -> Set[ChunkKey]:
+    """Returns the distinct chunks of the given chunk coordinates."""
+    return set(map(tuple, numpy.unique(chunks, axis=0).tolist()))
+
+
+class WorldStreamer:
+    """Keeps the asteroids of the chunks around the camera in the scene, while all other chunks are stored on disk.
+
+    Each chunk is a square area of the world, stored as .npy file of its asteroids' sprite data. Chunks are paged in
+    when the camera comes close and written back when it moves away, where asteroids are stored with the chunk they
+    moved into. Chunks that the camera is heading to are read in the background ahead of time.
+
+    Paging changes the asteroids' rows, hence it should be done when no other system keeps per-row state (e.g. on far
+    physics ticks).
+    """
+
+    def __init__(self, scene_obj: scene.Scene, directory: str, chunk_size: float = CHUNK_SIZE,
+                 radius: int = ACTIVE_RADIUS) -> None:
+        """Streams the scene's asteroids from and to the given directory."""
+        self.scene = scene_obj
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.radius = radius
+        self.prefetch_ms = PREFETCH_MS
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._loaded: Set[ChunkKey] = set()
+        self._prefetched: Dict[ChunkKey, concurrent.futures.Future] = dict()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='streaming')
+
+        self._last_center = pygame.math.Vector2(self.scene.get_view().center)
+        self.velocity = pygame.math.Vector2()
+
+    def shutdown(self) -> None:
+        """Writes all asteroids in memory back to disk and waits for pending reads."""
+        chunks = get_chunks(self.scene.asteroids.data, self.chunk_size)
+        self.write_back(chunks, get_keys(chunks) | self._loaded)
+        self._executor.shutdown()
+
+    def has_chunks(self) -> bool:
+        """Returns whether any chunks are stored on disk."""
+        return any(name.startswith('chunk_') for name in os.listdir(self.directory))
+
+    def get_path(self, key: ChunkKey) -> str:
+        return os.path.join(self.directory, f'chunk_{key[0]}_{key[1]}.npy')
+
+    def read_chunk(self, key: ChunkKey) -> numpy.ndarray:
+        """Reads the given chunk's asteroids from disk (empty if it does not exist). Raises a ValueError if the chunk
+        stores sprites with other columns.
+        """
+        path = self.get_path(key)
+        if not os.path.exists(path):
+            return numpy.zeros((0, len(core.SpriteOffset)), dtype=numpy.float32)
+
+        data = numpy.load(path, mmap_mode='r')
+        if data.ndim != 2 or data.shape[1] != len(core.SpriteOffset):
+            raise ValueError(f'{path} stores asteroids with {data.shape[-1]} columns, expected '
+                             f'{len(core.SpriteOffset)}')
+        return numpy.array(data)
+
+    def write_chunk(self, key: ChunkKey, data: numpy.ndarray) -> None:
+        """Replaces the given chunk on disk. The file is replaced atomically, so background reads never see a partial
+        file.
+        """
+        # a pending read would be outdated
+        self._prefetched.pop(key, None)
+
+        path = self.get_path(key)
+        tmp_path = f'{path}.tmp.npy'
+        numpy.save(tmp_path, data)
+        os.replace(tmp_path, path)
+
+    def store(self, data: numpy.ndarray) -> None:
+        """Adds the given asteroids to the chunks on disk that they are located in (e.g. to build a world)."""
+        chunks = get_chunks(data, self.chunk_size)
+        for key in get_keys(chunks):
+            mask = numpy.all(chunks == key, axis=1)
+            if key in self._loaded:
+                self.scene.asteroids.append(data[mask])
+            else:
+                self.write_chunk(key, numpy.concatenate([self.read_chunk(key), data[mask]]))
+
+    def write_back(self, chunks: numpy.ndarray, keys: Set[ChunkKey]) -> numpy.ndarray:
+        """Writes the asteroids of the given chunks to disk, where chunks holds each asteroid's chunk coordinates.
+        Returns a mask of the written asteroids.
+        """
+        written = numpy.zeros(len(chunks), dtype=bool)
+        for key in keys:
+            mask = numpy.all(chunks == key, axis=1)
+            data = self.scene.asteroids.data[mask]
+            if key not in self._loaded:
+                # asteroids moved into a chunk that is stored on disk
+                data = numpy.concatenate([self.read_chunk(key), data])
+            self.write_chunk(key, data)
+            written |= mask
+
+        return written
+
+    def update(self, elapsed_ms: float) -> None:
+        """Estimates the camera's velocity and starts reading the chunks ahead of it."""
+        center = pygame.math.Vector2(self.scene.get_view().center)
+        if elapsed_ms > 0:
+            self.velocity = (center - self._last_center) / elapsed_ms
+        self._last_center = center
+
+        ahead = center + self.velocity * self.prefetch_ms
+        wanted = set(get_surrounding_chunks(ahead, self.chunk_size, self.radius))
+        for key in wanted - self._loaded - self._prefetched.keys():
+            self._prefetched[key] = self._executor.submit(self.read_chunk, key)
+
+        # forget reads of chunks that are neither ahead nor near anymore
+        near = set(get_surrounding_chunks(center, self.chunk_size, self.radius + 1))
+        for key in list(self._prefetched.keys()):
+            if key not in wanted and key not in near:
+                self._prefetched.pop(key).cancel()
+
+    def page(self) -> None:
+        """Writes the chunks that are far from the camera back to disk and loads the chunks near it."""
+        arr = self.scene.asteroids
+        wanted = set(get_surrounding_chunks(self.scene.get_view().center, self.chunk_size, self.radius))
+
+        # evict far asteroids, grouped by the chunks they are located in now (loaded chunks may be empty by now)
+        chunks = get_chunks(arr.data, self.chunk_size)
+        far = (get_keys(chunks) | self._loaded) - wanted
+        if len(far) > 0:
+            evicted = self.write_back(chunks, far)
+            arr.select(numpy.where(~evicted)[0])
+
+        self._loaded &= wanted
+
+        # load near chunks, using the reads that were started ahead of time
+        for key in wanted - self._loaded:
+            future = self._prefetched.pop(key, None)
+            data = future.result() if future is not None and not future.cancelled() else self.read_chunk(key)
+            if len(data) > 0:
+                arr.append(data)
+            self._loaded.add(key)
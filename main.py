@@ -1,8 +1,9 @@
+import argparse
+import os
 import pygame
 import pygame.gfxdraw
-import random
 
-from typing import List
+from typing import List, Optional
 
 import core
 from core import app, sprite, text
@@ -11,45 +12,95 @@ import game
 
 
 class DemoState(app.State):
-    def __init__(self, engine: app.Engine):
+    def __init__(self, engine: app.Engine, num_shards: int = 0, stream_dir: Optional[str] = None):
         super().__init__(engine)
-        self.scene = game.Scene(engine)
+        self.scene = game.Scene(engine, shared_asteroids=num_shards > 0)
 
-        self.physics = game.PhysicsSystem(self.scene, self.on_collision)
+        if num_shards > 0:
+            self.physics = game.ShardedPhysicsSystem(self.scene, self.on_collision, continuous=True,
+                                                     num_shards=num_shards)
+        else:
+            self.physics = game.PhysicsSystem(self.scene, self.on_collision, continuous=True)
         self.controls = game.ControlsSystem(self.scene)
         self.renderer = game.RendererSystem(self.scene)
 
-        self.total_ms = 0
+        self.next_overlay_ticks = 0
         self.fps = text.Text(self.engine.context, self.engine.cache.get_font(font_size=30))
         self.perf = text.Text(self.engine.context, self.engine.cache.get_font(font_size=24))
 
         self.destroy: List[int] = []
 
         # create asteroids
+        rng = engine.make_rng('asteroids')
         for _ in range(500):
             s = sprite.Sprite(self.renderer.asteroids.get_texture())
-            s.center.x = random.randrange(0, 1600 * 10)
-            s.center.y = random.randrange(0, 900 * 10)
-            s.rotation = random.uniform(0.0, 360.0)
-            s.scale *= random.uniform(0.5, 4.0) / 10
-            s.velocity = pygame.math.Vector2(0, 1).rotate(random.uniform(0.0, 360.0)) * random.uniform(0.5, 4.0)
+            s.center.x = int(rng.integers(0, 1600 * 10))
+            s.center.y = int(rng.integers(0, 900 * 10))
+            s.rotation = rng.uniform(0.0, 360.0)
+            s.scale *= rng.uniform(0.5, 4.0) / 10
+            s.velocity = pygame.math.Vector2(0, 1).rotate(rng.uniform(0.0, 360.0)) * rng.uniform(0.5, 4.0)
             s.velocity *= 0.05
             self.scene.asteroids.add(s)
 
+        # page the asteroid field from disk around the camera
+        self.streaming: Optional[game.WorldStreamer] = None
+        if stream_dir is not None:
+            self.streaming = game.WorldStreamer(self.scene, stream_dir)
+            if not self.streaming.has_chunks():
+                self.streaming.store(self.scene.asteroids.data)
+            self.scene.asteroids.clear()
+            self.streaming.page()
+
         # create spacecrafts
-        s = sprite.Sprite(self.renderer.spacecrafts.get_texture(), clip=pygame.Rect(0, 0, 32, 32))
+        s = sprite.Sprite(self.renderer.spacecrafts.get_texture(), clip=pygame.Rect(0, 0, 32, 32), num_frames=3,
+                          fps=10.0)
         s.center.x = 800
         s.center.y = 450
         self.scene.spacecrafts.add(s)
 
         for i in range(5):
-            s = sprite.Sprite(self.renderer.spacecrafts.get_texture(), clip=pygame.Rect(0, 0, 32, 32))
+            s = sprite.Sprite(self.renderer.spacecrafts.get_texture(), clip=pygame.Rect(0, 0, 32, 32), num_frames=3,
+                              fps=10.0, phase=i)
             s.center.x += 100 + i * 50
             s.color = pygame.Color('red')
             s.color.a = 96
             self.scene.spacecrafts.add(s)
 
-        self.renderer.continue_starfield(*core.Sprite.get_center(self.scene.spacecrafts.data[0]))
+        # quality settings that are lowered if frames take too long, from the first to sacrifice to the last
+        quality = self.engine.quality
+        quality.register(core.QualityKnob('particle_emission', [1.0, 0.5, 0.25], self.set_particle_emission))
+        quality.register(core.QualityKnob('particle_limit', [50_000, 20_000, 5_000], self.set_particle_limit))
+        quality.register(core.QualityKnob('culling_margin', [1000.0, 500.0, 0.0], self.set_culling_margin))
+        quality.register(core.QualityKnob('light_resolution', [0.5, 0.25], self.set_light_resolution))
+        quality.register(core.QualityKnob('render_scale', [1.0, 0.75, 0.5], self.set_render_scale))
+        quality.register(core.QualityKnob('starfield_layers', [3, 2, 1], self.set_starfield_layers))
+
+    def shutdown(self) -> None:
+        """Writes streamed chunks back, stops the physics worker processes (if used) and frees shared memory."""
+        if self.streaming is not None:
+            self.physics.flush()
+            self.streaming.shutdown()
+        if isinstance(self.physics, game.ShardedPhysicsSystem):
+            self.physics.shutdown()
+        self.scene.release()
+
+    def set_particle_emission(self, value: float) -> None:
+        self.scene.particles.emission_rate = value
+
+    def set_particle_limit(self, value: float) -> None:
+        self.scene.particles.set_limit(int(value))
+
+    def set_culling_margin(self, value: float) -> None:
+        self.physics.near_margin = value
+
+    def set_light_resolution(self, value: float) -> None:
+        self.renderer.lighting.set_scale(value)
+
+    def set_render_scale(self, value: float) -> None:
+        self.engine.render_target.scale = value
+
+    def set_starfield_layers(self, value: float) -> None:
+        self.renderer.starfield.num_layers = int(value)
 
     def on_collision(self, index1: int, type1: game.ObjectType, index2: int, type2: game.ObjectType) -> None:
         if type1 == game.ObjectType.ASTEROID and type2 == game.ObjectType.SPACECRAFT:
@@ -64,15 +115,25 @@ class DemoState(app.State):
         if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
             self.engine.pop()
 
-        """
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F12:
+            self.engine.perf_monitor.dump_trace('trace.json')
+
+        # quicksave and quickload
+        # far asteroids must not have pending motion while their rows are saved or replaced
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F5:
+            self.physics.flush()
+            self.scene.save('quicksave.scene')
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F9 and os.path.exists('quicksave.scene'):
+            self.physics.flush()
+            self.scene.load('quicksave.scene')
+
         if event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN:
-            enable = not self.asteroids.has_enabled_bounding_circles()
-            self.asteroids.enable_bounding_circles(enable)
-            self.fighters.enable_bounding_circles(enable)
+            self.renderer.show_debug = not self.renderer.show_debug
 
+        """
         if event.type == pygame.MOUSEBUTTONDOWN:
             pos = self.camera.to_world_pos(pygame.math.Vector2(pygame.mouse.get_pos()))
-            indices = self.camera.query_visible(self.asteroids.sprites.data)
+            indices = self.camera.query_visible(self.asteroids.sprites)
 
             # query at which asteroids the user clicked
             clicked = list()
@@ -98,65 +159,98 @@ class DemoState(app.State):
         """
 
     def update(self, elapsed_ms) -> None:
-        with self.engine.perf_monitor:
-            self.engine.perf_monitor('controls')
+        self.scene.save_state()
+
+        with self.engine.perf_monitor.scope('controls'):
             self.controls.update(elapsed_ms)
 
-        with self.engine.perf_monitor:
-            self.engine.perf_monitor('physics')
+        with self.engine.perf_monitor.scope('physics'):
             self.physics.update(elapsed_ms)
             self.scene.explode_spacecrafts(self.destroy)
             self.destroy = []
 
-        with self.engine.perf_monitor:
-            self.engine.perf_monitor('particles')
-            self.scene.particles.update(elapsed_ms)
-
-        with self.engine.perf_monitor:
-            self.engine.perf_monitor('camera')
+        if self.streaming is not None:
+            with self.engine.perf_monitor.scope('streaming'):
+                self.streaming.update(elapsed_ms)
+                if self.physics.is_far_tick():
+                    self.physics.flush()
+                    self.streaming.page()
 
-            # let camera follow player
-            if len(self.scene.spacecrafts) > 0:
-                self.scene.camera.center = core.Sprite.get_center(self.scene.spacecrafts.data[0])
-                self.scene.camera.rotation = self.scene.spacecrafts.data[0, sprite.Offset.ROTATION]
+        with self.engine.perf_monitor.scope('particles'):
+            self.scene.particles.update(elapsed_ms)
+            self.scene.lights.update(elapsed_ms)
 
-            self.renderer.continue_starfield(*core.Sprite.get_center(self.scene.spacecrafts.data[0]))
+    def snapshot(self) -> None:
+        self.scene.snapshot()
 
-            self.scene.camera.update()
+    def update_overlay(self) -> None:
+        """Updates the performance overlay every 100ms. Creating textures has to be done by the rendering thread."""
+        ticks = pygame.time.get_ticks()
+        if ticks < self.next_overlay_ticks:
+            return
+        self.next_overlay_ticks = ticks + 100
 
-        self.total_ms += elapsed_ms
         num_fps = int(self.engine.clock.get_fps())
-        if self.total_ms > 100:
-            self.fps.set_string(f'FPS: {num_fps}')
-
-            systems = {
-                'asteroids': len(self.scene.asteroids),
-                'spacecrafts': len(self.scene.spacecrafts),
-                'particles': len(self.scene.particles)
-            }
-            pos = core.Sprite.get_center(self.scene.spacecrafts.data[0])
-            rot = self.scene.spacecrafts.data[0, core.SpriteOffset.ROTATION]
-            monitor_string = str(self.engine.perf_monitor)
-            monitor_string += '\n' * 2 + '\n'.join(f'{key}: {systems[key]} elements' for key in systems)
-            monitor_string += '\n' * 2 + f'Player: ({int(pos[0]):04d} | {int(pos[1]):04d}) >> {int(rot)}°'
+        self.fps.set_string(f'FPS: {num_fps}')
+
+        systems = {
+            'asteroids': len(self.scene.asteroids),
+            'spacecrafts': len(self.scene.spacecrafts),
+            'particles': len(self.scene.particles)
+        }
+        spacecrafts = self.scene.spacecrafts.get_front()
+        pos = core.Sprite.get_center(spacecrafts.data[0])
+        rot = spacecrafts.data[0, core.SpriteOffset.ROTATION]
+        monitor_string = str(self.engine.perf_monitor)
+        monitor_string += '\n' * 2 + str(self.engine.gpu_profiler)
+        monitor_string += '\n' + str(self.renderer.queue.stats)
+        monitor_string += '\n' * 2 + '\n'.join(f'{key}: {systems[key]} elements' for key in systems)
+        monitor_string += '\n' * 2 + f'Player: ({int(pos[0]):04d} | {int(pos[1]):04d}) >> {int(rot)}°'
+
+        self.perf.set_string(monitor_string)
+        self.perf.sprite.center.y = pygame.display.get_window_size()[1]
+        self.perf.sprite.origin.y = 1.0
+
+    def render(self, alpha: float) -> None:
+        with self.engine.perf_monitor.scope('camera'):
+
+            # let camera follow the player's rendered position
+            if len(self.scene.spacecrafts.get_front()) > 0:
+                player = self.renderer.get_player_data(alpha)
+                self.scene.camera.center = core.Sprite.get_center(player)
+                self.scene.camera.rotation = player[sprite.Offset.ROTATION]
 
-            self.perf.set_string(monitor_string)
-            self.perf.sprite.center.y = pygame.display.get_window_size()[1]
-            self.perf.sprite.origin.y = 1.0
-
-            self.total_ms -= 100
+            self.scene.camera.update()
 
-    def render(self) -> None:
-        self.renderer.render()
+        self.renderer.render(alpha)
 
+    def render_gui(self) -> None:
+        self.update_overlay()
         self.scene.gui.render_text(self.fps)
         self.scene.gui.render_text(self.perf)
 
 
 def main() -> None:
-    engine = app.Engine(1600, 900)
-    engine.push(DemoState(engine))
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--record', help='record the session to this file')
+    parser.add_argument('--replay', help='replay a recorded session headless and as fast as possible')
+    parser.add_argument('--trace', help='write the performance trace to this file on quit')
+    parser.add_argument('--seed', type=int, help='seed for the random number streams')
+    parser.add_argument('--shards', type=int, default=0, help='number of physics worker processes (0 to disable)')
+    parser.add_argument('--stream', help='directory to stream the asteroid field from and to')
+    args = parser.parse_args()
+
+    engine = app.Engine(1600, 900, headless=args.replay is not None, seed=args.seed)
+    engine.trace_file = args.trace
+    if args.replay is not None:
+        engine.replay(args.replay)
+    elif args.record is not None:
+        engine.record(args.record)
+
+    state = DemoState(engine, num_shards=args.shards, stream_dir=args.stream)
+    engine.push(state)
     engine.run()
+    state.shutdown()
 
 
 if __name__ == '__main__':
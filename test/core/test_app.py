@@ -1,4 +1,8 @@
 import unittest
+import moderngl
+import tempfile
+import pathlib
+import json
 
 from core import app
 
@@ -7,12 +11,119 @@ class AppTest(unittest.TestCase):
 
     def test_performance_monitor(self):
         pm = app.PerformanceMonitor()
-        with pm:
-            pm('foo')
+        with pm.scope('foo'):
+            pass
 
-        with pm:
-            pm('bar')
+        with pm.scope('bar'):
+            with pm.scope('baz'):
+                pass
 
+        self.assertEqual(pm.get_names(), ['bar', 'bar/baz', 'foo'])
         data = str(pm).split('\n')
-        self.assertIn('foo', data[0])
-        self.assertIn('bar', data[1])
+        self.assertIn('bar', data[0])
+        self.assertIn('  baz', data[1])
+        self.assertIn('foo', data[2])
+
+    def test_performance_monitor_stats(self):
+        pm = app.PerformanceMonitor(history=4)
+        for elapsed_ms in [100, 1, 2, 3, 4]:
+            pm.record('foo', elapsed_ms)
+
+        self.assertIn('foo', pm)
+        self.assertAlmostEqual(pm.get_last('foo'), 4)
+
+        stats = pm.get_stats('foo')
+        self.assertEqual(stats.count, 5)
+        self.assertAlmostEqual(stats.mean_ms, 2.5)
+        self.assertAlmostEqual(stats.p50_ms, 2.5)
+        self.assertAlmostEqual(stats.max_ms, 4)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+class FixedTimestepTest(unittest.TestCase):
+
+    def test_advance(self):
+        ts = app.FixedTimestep(rate=50, max_steps=5)
+        self.assertAlmostEqual(ts.step_ms, 20.0)
+
+        self.assertEqual(ts.advance(10), 0)
+        self.assertAlmostEqual(ts.get_alpha(), 0.5)
+
+        self.assertEqual(ts.advance(35), 2)
+        self.assertAlmostEqual(ts.get_alpha(), 0.25)
+        self.assertAlmostEqual(ts.simulated_ms, 40.0)
+
+    def test_catch_up_is_capped(self):
+        ts = app.FixedTimestep(rate=50, max_steps=5)
+        self.assertEqual(ts.advance(1000), 5)
+        self.assertAlmostEqual(ts.get_alpha(), 0.0)
+        self.assertAlmostEqual(ts.simulated_ms, 100.0)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+class GpuProfilerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.ctx = moderngl.create_context(standalone=True)
+        self.monitor = app.PerformanceMonitor()
+        self.profiler = app.GpuProfiler(self.ctx, self.monitor, latency=2)
+
+    def tearDown(self) -> None:
+        self.ctx.release()
+
+    def test_results_are_delayed(self):
+        with self.profiler.scope('foo'):
+            self.ctx.clear()
+
+        # results are read after finishing the frame that was issued two frames later
+        self.profiler.next_frame()
+        self.profiler.next_frame()
+        self.assertNotIn('gpu/foo', self.monitor)
+
+        self.profiler.next_frame()
+        self.assertIn('gpu/foo', self.monitor)
+        self.assertIn('foo', self.profiler.primitives)
+        self.assertIn('foo', str(self.profiler))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+
+class TraceTest(unittest.TestCase):
+
+    def test_dump_trace(self):
+        pm = app.PerformanceMonitor()
+        with pm.scope('foo'):
+            with pm.span('load bar', 'load'):
+                pass
+        pm.trace('gpu/baz', 'gpu', 0, 1000, app.GPU_THREAD_ID)
+        pm.record('without_start', 1.0)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir) / 'trace.json'
+            pm.dump_trace(str(path))
+            with open(path) as handle:
+                data = json.load(handle)
+
+        spans = [event for event in data['traceEvents'] if event['ph'] == 'X']
+        self.assertEqual([span['name'] for span in spans], ['load bar', 'foo', 'gpu/baz'])
+        self.assertEqual(spans[2]['tid'], app.GPU_THREAD_ID)
+        self.assertAlmostEqual(spans[2]['dur'], 1.0)
+
+    def test_trace_capacity(self):
+        pm = app.PerformanceMonitor(trace_capacity=2)
+        for name in ['foo', 'bar', 'baz']:
+            with pm.scope(name):
+                pass
+
+        self.assertEqual([span.name for span in pm._trace], ['bar', 'baz'])
+
+    def test_reset(self):
+        pm = app.PerformanceMonitor()
+        with pm.scope('foo'):
+            pass
+
+        pm.reset()
+        self.assertNotIn('foo', pm)
+        self.assertEqual(len(pm._trace), 0)
@@ -0,0 +1,60 @@
+import unittest
+import tempfile
+import pathlib
+import struct
+import numpy
+
+from core import archive
+
+
+class ArchiveTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = str(pathlib.Path(self.tmp.name) / 'test.bin')
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_save_and_load(self):
+        first = numpy.arange(12, dtype=numpy.float32).reshape(4, 3)
+        second = numpy.arange(5, dtype=numpy.int64)
+        empty = numpy.zeros((0, 3), dtype=numpy.float32)
+        archive.save_arrays(self.path, {'first': first, 'second': second, 'empty': empty}, {'foo': 'bar'})
+
+        arrays, metadata = archive.load_arrays(self.path)
+        self.assertEqual(metadata, {'foo': 'bar'})
+        numpy.testing.assert_array_equal(arrays['first'], first)
+        numpy.testing.assert_array_equal(arrays['second'], second)
+        self.assertEqual(arrays['empty'].shape, (0, 3))
+
+        # modifying the mapped arrays does not change the file
+        arrays['first'][0, 0] = 42
+        arrays, _ = archive.load_arrays(self.path)
+        self.assertEqual(arrays['first'][0, 0], 0)
+
+    def test_save_loaded_arrays(self):
+        first = numpy.arange(110_000, dtype=numpy.float32).reshape(-1, 22)
+        archive.save_arrays(self.path, {'first': first}, {})
+
+        # save the arrays that are still mapped from the same file
+        arrays, _ = archive.load_arrays(self.path)
+        arrays['first'][0, 0] = 42
+        archive.save_arrays(self.path, arrays, {})
+
+        arrays, _ = archive.load_arrays(self.path)
+        first[0, 0] = 42
+        numpy.testing.assert_array_equal(arrays['first'], first)
+
+    def test_invalid_file(self):
+        with open(self.path, 'wb') as handle:
+            handle.write(b'nothing')
+        with self.assertRaises(ValueError):
+            archive.load_arrays(self.path)
+
+        archive.save_arrays(self.path, {}, {})
+        with open(self.path, 'r+b') as handle:
+            handle.seek(4)
+            handle.write(struct.pack('<I', archive.FORMAT_VERSION + 1))
+        with self.assertRaises(ValueError):
+            archive.load_arrays(self.path)
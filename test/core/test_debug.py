@@ -0,0 +1,47 @@
+import unittest
+import moderngl
+import pygame
+import glm
+import numpy
+
+from core import debug, resources
+
+
+class DebugDrawTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.ctx = moderngl.create_context(standalone=True)
+        self.ctx.enable(moderngl.BLEND)
+        self.fbo = self.ctx.simple_framebuffer((64, 64))
+        self.fbo.use()
+        self.draw = debug.DebugDraw(self.ctx, resources.Cache(self.ctx), max_num_primitives=2)
+
+    def tearDown(self) -> None:
+        self.ctx.release()
+
+    def test_add(self):
+        self.draw.circles(numpy.zeros((3, 2)), 5.0, pygame.Color('red'))
+        self.draw.lines(numpy.zeros((2, 2)), numpy.ones((2, 2)), pygame.Color('red'))
+        self.draw.rects(numpy.zeros((1, 2)), numpy.ones((1, 2)), pygame.Color('red'))
+        self.assertEqual(len(self.draw), 6)
+
+        # arrows consist of a line and two lines for the head
+        self.draw.arrows(numpy.zeros((2, 2)), numpy.ones((2, 2)), pygame.Color('red'))
+        self.assertEqual(len(self.draw), 12)
+
+        self.draw.clear()
+        self.assertEqual(len(self.draw), 0)
+
+    def test_render(self):
+        self.draw.circles(numpy.array([[0.0, 0.0]]), 20.0, pygame.Color('red'), thickness=2.0)
+        self.draw.lines(numpy.array([[-32.0, -29.5], [-32.0, 29.5]]), numpy.array([[32.0, -29.5], [32.0, 29.5]]),
+                        pygame.Color('green'))
+        self.fbo.clear()
+        self.draw.render(glm.mat4x4(), glm.ortho(-32, 32, -32, 32, 1, -1), 1.0)
+        self.assertEqual(len(self.draw), 0)
+
+        data = numpy.frombuffer(self.fbo.read(), dtype=numpy.uint8).reshape(64, 64, 3)
+        # circle outline is drawn, but not its inside
+        self.assertGreater(data[32, 52, 0], 128)
+        self.assertEqual(data[32, 32, 0], 0)
+        self.assertGreater(data[2, 32, 1], 128)
@@ -1,19 +1,104 @@
 import unittest
+import os
 import moderngl
+import pygame
+import glm
+import numpy
 
-from core import light
+from core import light, resources
 
 
-class LightTest(unittest.TestCase):
+class LightArrayTest(unittest.TestCase):
 
     def setUp(self) -> None:
+        self.arr = light.LightArray()
+
+    def test_add(self):
+        self.arr.add(pygame.math.Vector2(2, 3), radius=5.0, color=pygame.Color('red'))
+        self.arr.add_batch(numpy.zeros((4, 2)), radius=1.0, color=pygame.Color('white'), intensity=0.5)
+        self.assertEqual(len(self.arr), 5)
+        self.assertEqual(self.arr.data[0, light.Offset.POS_Y], 3)
+        self.assertEqual(self.arr.data[0, light.Offset.COLOR_R], 1.0)
+        self.assertEqual(self.arr.data[0, light.Offset.COLOR_G], 0.0)
+        self.assertEqual(self.arr.data[4, light.Offset.INTENSITY], 0.5)
+
+    def test_update(self):
+        self.arr.add(pygame.math.Vector2(), radius=5.0, color=pygame.Color('red'), intensity=1.0, decay=0.01)
+        self.arr.add(pygame.math.Vector2(), radius=5.0, color=pygame.Color('red'), intensity=1.0)
+        self.arr.update(50)
+        self.assertAlmostEqual(self.arr.data[0, light.Offset.INTENSITY], 0.5)
+
+        # faded lights are removed
+        self.arr.update(50)
+        self.assertEqual(len(self.arr), 1)
+        self.assertEqual(self.arr.data[0, light.Offset.INTENSITY], 1.0)
+
+    def test_snapshot(self):
+        self.assertIs(self.arr.get_front(), self.arr)
+        self.arr.add(pygame.math.Vector2(), radius=5.0, color=pygame.Color('red'))
+        self.arr.snapshot()
+        self.arr.clear()
+        self.assertEqual(len(self.arr.get_front()), 1)
+
+
+class RestoreFramebufferTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.ctx = moderngl.create_context(standalone=True)
+
+    def tearDown(self) -> None:
+        self.ctx.release()
+
+    def test_restore_framebuffer(self):
+        fbo = self.ctx.simple_framebuffer((4, 4))
+        offscreen = self.ctx.simple_framebuffer((2, 2))
+        offscreen.use()
+        light.restore_framebuffer(self.ctx, fbo)
+        self.assertIs(self.ctx.fbo, fbo)
+
+    def test_restore_without_framebuffer(self):
+        # standalone contexts have neither a bound framebuffer nor a screen
+        offscreen = self.ctx.simple_framebuffer((2, 2))
+        offscreen.use()
+        light.restore_framebuffer(self.ctx, None)
+        self.assertIs(self.ctx.fbo, offscreen)
+
+
+class LightRendererTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        pygame.display.init()
+        pygame.display.set_mode((64, 64))
+
         self.ctx = moderngl.create_context(standalone=True)
+        self.renderer = light.LightRenderer(self.ctx, resources.Cache(self.ctx), scale=0.5)
 
     def tearDown(self) -> None:
         self.ctx.release()
+        pygame.display.quit()
+
+    def test_render(self):
+        self.assertEqual(self.renderer.get_texture().size, (32, 32))
+
+        arr = light.LightArray()
+        arr.add(pygame.math.Vector2(0, 0), radius=16.0, color=pygame.Color('white'))
+        self.renderer.render(glm.mat4x4(), glm.ortho(-32, 32, -32, 32, 1, -1), arr)
+
+        data = numpy.frombuffer(self.renderer.get_texture().read(), dtype=numpy.float16).reshape(32, 32, 4)
+        self.assertGreater(data[16, 16, 0], 0.5)
+        self.assertEqual(data[0, 0, 0], 0.0)
+
+    def test_render_restores_framebuffer(self):
+        # e.g. a scaled render target
+        fbo = self.ctx.simple_framebuffer((64, 64))
+        fbo.use()
+        self.ctx.viewport = (0, 0, 48, 48)
+
+        self.renderer.render(glm.mat4x4(), glm.mat4x4(), light.LightArray())
+        self.assertIs(self.ctx.fbo, fbo)
+        self.assertEqual(self.ctx.viewport, (0, 0, 48, 48))
 
-    def test_create_lightmap(self):
-        # FIXME: cannot return to screen framebuffer because of headless mode
-        # tex = light.create_lightmap(self.ctx, radius=5)
-        # self.assertIsNotNone(tex)
-        pass
+    def test_set_scale(self):
+        self.renderer.set_scale(0.25)
+        self.assertEqual(self.renderer.get_texture().size, (16, 16))
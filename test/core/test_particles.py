@@ -2,6 +2,7 @@ import unittest
 import pygame
 import moderngl
 import glm
+import numpy
 
 from core import resources, particles
 
@@ -74,3 +75,46 @@ class ParticlesTest(unittest.TestCase):
         # cleanup
         self.sys.update(10000)
         self.assertEqual(len(self.sys), 0)
+
+    def test_emit_batch(self):
+        origins = numpy.array([[2, 3], [4, 5], [6, 7]], dtype=numpy.float32)
+        impacts = numpy.array([[0, 1], [1, 0], [0, -1]], dtype=numpy.float32)
+        self.sys.emit_batch(origins, radius=5.0, color=pygame.Color('red'), impacts=impacts, spread=1.0)
+        self.assertEqual(len(self.sys), 3)
+        self.assertEqual(len(self.sys._data.tobytes()), 3 * len(particles.Offset) * 4)
+        self.assertAlmostEqual(self.sys._data[1, particles.Offset.SIZE], 5.0)
+        self.assertAlmostEqual(self.sys._data[1, particles.Offset.COLOR_R], 1.0)
+        self.assertLessEqual(abs(self.sys._data[2, particles.Offset.POS_X] - 6), 1.0)
+
+        # with delta_degree=0, particles move away from the impact
+        self.sys.emit_batch(origins, radius=5.0, color=pygame.Color('red'), impacts=impacts, delta_degree=0.0)
+        self.assertLess(self.sys._data[3, particles.Offset.DIR_Y], 0.0)
+        self.assertLess(self.sys._data[4, particles.Offset.DIR_X], 0.0)
+
+        # emission stops at the maximum number of particles
+        self.sys.emit_batch(numpy.zeros((6000, 2)), radius=5.0, color=pygame.Color('red'))
+        self.assertEqual(len(self.sys), 5000)
+
+    def test_limit_and_emission_rate(self):
+        self.sys.set_limit(2)
+        for _ in range(5):
+            self.sys.emit(origin=pygame.math.Vector2(2, 3), radius=5.0, color=pygame.Color('red'))
+        self.assertEqual(len(self.sys), 2)
+
+        self.sys.set_limit(10)
+        self.sys.emission_rate = 0.0
+        self.sys.emit(origin=pygame.math.Vector2(2, 3), radius=5.0, color=pygame.Color('red'))
+        self.sys.emit_batch(numpy.zeros((5, 2)), radius=5.0, color=pygame.Color('red'))
+        self.assertEqual(len(self.sys), 2)
+
+    def test_seeded_rng(self):
+        cache = resources.Cache(self.ctx)
+        shaders = cache.get_shaders('data/glsl/particles', ['vert', 'geom', 'frag'])
+        systems = [particles.ParticleSystem(self.ctx, 100, 150, *shaders, rng=numpy.random.default_rng(7))
+                   for _ in range(2)]
+
+        # same seed emits the same particles
+        for sys in systems:
+            sys.emit(origin=pygame.math.Vector2(2, 3), radius=5.0, color=pygame.Color('red'))
+            sys.emit_batch(numpy.zeros((5, 2)), radius=5.0, color=pygame.Color('red'))
+        numpy.testing.assert_array_equal(systems[0]._data, systems[1]._data)
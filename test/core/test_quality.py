@@ -0,0 +1,50 @@
+import unittest
+
+from core import app, quality
+
+
+class QualitySchedulerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.monitor = app.PerformanceMonitor()
+        self.scheduler = quality.QualityScheduler(self.monitor, target_ms=10)
+        self.scheduler.smoothing = 1.0
+        self.scheduler.degrade_cooldown = 0
+        self.scheduler.improve_cooldown = 0
+
+        self.values = dict()
+        for name in ['foo', 'bar']:
+            knob = quality.QualityKnob(name, [1.0, 0.5, 0.0], lambda v, n=name: self.values.__setitem__(n, v))
+            self.scheduler.register(knob)
+
+    def test_register_applies_level(self):
+        self.assertEqual(self.values, {'foo': 1.0, 'bar': 1.0})
+
+    def test_degrade_and_improve(self):
+        self.monitor.record('frame', 20)
+        self.scheduler.update()
+        self.assertEqual(self.values, {'foo': 0.5, 'bar': 1.0})
+        self.scheduler.update()
+        self.assertEqual(self.values, {'foo': 0.5, 'bar': 0.5})
+
+        # within the hysteresis band, nothing changes
+        self.monitor.record('frame', 10)
+        self.scheduler.update()
+        self.assertEqual(self.values, {'foo': 0.5, 'bar': 0.5})
+
+        self.monitor.record('frame', 2)
+        self.scheduler.update()
+        self.scheduler.update()
+        self.scheduler.update()
+        self.assertEqual(self.values, {'foo': 1.0, 'bar': 1.0})
+
+    def test_cooldown(self):
+        self.scheduler.degrade_cooldown = 2
+        self.monitor.record('frame', 20)
+        for _ in range(3):
+            self.scheduler.update()
+        self.assertEqual(self.scheduler.get_knob('foo').level, 1)
+        self.assertEqual(self.scheduler.get_knob('bar').level, 0)
+
+        self.scheduler.update()
+        self.assertEqual(self.scheduler.get_knob('bar').level, 1)
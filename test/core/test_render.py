@@ -0,0 +1,175 @@
+import os
+import unittest
+import moderngl
+import numpy
+import pygame
+import glm
+
+from core import render, resources, sprite
+
+
+class RenderTargetTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.ctx = moderngl.create_context(standalone=True)
+        self.screen = self.ctx.simple_framebuffer((16, 16))
+        self.target = render.RenderTarget(self.ctx, resources.Cache(self.ctx), (16, 16))
+
+    def tearDown(self) -> None:
+        self.ctx.release()
+
+    def test_viewport(self):
+        self.assertEqual(self.target.get_viewport(), (0, 0, 16, 16))
+
+        # scaling keeps the texture
+        texture = self.target.get_texture()
+        self.target.scale = 0.5
+        self.assertEqual(self.target.get_viewport(), (0, 0, 8, 8))
+        self.assertIs(self.target.get_texture(), texture)
+
+    def test_blit(self):
+        self.target.scale = 0.5
+        self.target.use()
+        self.assertEqual(self.ctx.viewport, (0, 0, 8, 8))
+        self.ctx.clear(1.0, 0.0, 0.0, 1.0)
+
+        # the scaled part covers the entire screen
+        self.screen.use()
+        self.screen.clear()
+        self.target.blit()
+        data = numpy.frombuffer(self.screen.read(), dtype=numpy.uint8).reshape(16, 16, 3)
+        self.assertTrue(numpy.all(data[..., 0] == 255))
+
+
+class RenderQueueTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.ctx = moderngl.create_context(standalone=True)
+        self.cache = resources.Cache(self.ctx)
+        self.texture = self.ctx.texture((4, 4), 4)
+        self.queue = render.RenderQueue()
+
+    def tearDown(self) -> None:
+        self.ctx.release()
+
+    def create_batch(self, texture: moderngl.Texture) -> render.RenderBatch:
+        arr = sprite.SpriteArray()
+        arr.add(sprite.Sprite(texture))
+        return render.RenderBatch(self.ctx, self.cache, 10, arr, texture)
+
+    def test_program_is_shared(self):
+        self.assertIs(self.create_batch(self.texture).get_program(), self.create_batch(self.texture).get_program())
+
+    def test_layer_order(self):
+        drawn = list()
+        for layer in [2, 0, 1]:
+            self.queue.submit_pass(layer, lambda view_matrix, projection_matrix, layer=layer: drawn.append(layer))
+        self.assertEqual(len(self.queue), 3)
+
+        self.queue.flush(glm.mat4x4(), glm.mat4x4())
+        self.assertEqual(drawn, [0, 1, 2])
+        self.assertEqual(len(self.queue), 0)
+        self.assertEqual(self.queue.stats.draw_calls, 3)
+
+    def test_redundant_state(self):
+        self.queue.submit(0, self.create_batch(self.texture))
+        self.queue.flush(glm.mat4x4(), glm.mat4x4())
+        single = self.queue.stats.state_changes
+        uploaded = self.queue.stats.bytes_uploaded
+        self.assertEqual(uploaded, len(sprite.Offset) * 4)
+
+        # a second batch with the same program, texture and uniforms changes no state
+        self.queue.stats.reset()
+        self.queue.submit(0, self.create_batch(self.texture))
+        self.queue.submit(0, self.create_batch(self.texture))
+        self.queue.flush(glm.mat4x4(), glm.mat4x4())
+        self.assertEqual(self.queue.stats.draw_calls, 2)
+        self.assertEqual(self.queue.stats.state_changes, single)
+        self.assertEqual(self.queue.stats.bytes_uploaded, 2 * uploaded)
+
+        # another texture has to be bound
+        self.queue.stats.reset()
+        self.queue.submit(0, self.create_batch(self.texture))
+        self.queue.submit(0, self.create_batch(self.ctx.texture((4, 4), 4)))
+        self.queue.flush(glm.mat4x4(), glm.mat4x4())
+        self.assertEqual(self.queue.stats.state_changes, single + 1)
+
+
+class CameraTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        pygame.display.init()
+        pygame.display.set_mode((64, 64))
+
+        self.ctx = moderngl.create_context(standalone=True)
+        self.camera = render.Camera(self.ctx, resources.Cache(self.ctx))
+
+        self.arr = sprite.SpriteArray()
+        self.arr.data = numpy.zeros((3, len(sprite.Offset)), dtype=numpy.float32)
+        self.arr.data[:, sprite.Offset.POS_X] = [0.0, 20.0, 500.0]
+
+    def tearDown(self) -> None:
+        self.ctx.release()
+        pygame.display.quit()
+
+    def test_query_visible(self):
+        indices = self.camera.query_visible(self.arr)
+        self.assertEqual(list(indices), [0, 1])
+
+        # repeated queries are cached
+        self.assertIs(self.camera.query_visible(self.arr), indices)
+
+    def test_query_visible_invalidation(self):
+        indices = self.camera.query_visible(self.arr)
+
+        # modified array
+        self.arr.data[2, sprite.Offset.POS_X] = 10.0
+        self.arr.touch()
+        indices = self.camera.query_visible(self.arr)
+        self.assertEqual(list(indices), [0, 1, 2])
+
+        # moved camera
+        self.camera.center.x = 500.0
+        self.assertIs(self.camera.query_visible(self.arr), indices)
+        self.camera.update()
+        self.assertEqual(list(self.camera.query_visible(self.arr)), [])
+
+        # replaced data
+        self.arr.data = self.arr.data[:2].copy()
+        self.arr.data[:, sprite.Offset.POS_X] = 500.0
+        self.assertEqual(list(self.camera.query_visible(self.arr)), [0, 1])
+
+    def test_query_visible_extent(self):
+        # only the sprite's center is outside of the view
+        self.arr.data[2, sprite.Offset.POS_X] = 40.0
+        self.assertEqual(list(self.camera.query_visible(self.arr)), [0, 1])
+
+        self.arr.data[2, sprite.Offset.ORIGIN_X:sprite.Offset.ORIGIN_Y+1] = 0.5
+        self.arr.data[2, sprite.Offset.SIZE_X:sprite.Offset.SIZE_Y+1] = 20.0
+        self.arr.touch()
+        self.assertEqual(list(self.camera.query_visible(self.arr)), [0, 1, 2])
+
+    def test_query_visible_rotation(self):
+        # beyond the view's edge, but inside once the view is rotated
+        self.arr.data[2, sprite.Offset.POS_X] = 40.0
+        self.assertEqual(list(self.camera.query_visible(self.arr)), [0, 1])
+
+        self.camera.rotation = 45.0
+        self.camera.update()
+        self.assertEqual(list(self.camera.query_visible(self.arr)), [0, 1, 2])
+
+    def test_get_view(self):
+        self.camera.rotation = 45.0
+        self.camera.update()
+        view = self.camera.get_view()
+        self.assertEqual(view.center, self.camera.center)
+        self.assertEqual(view.get_bounding_rect(), self.camera.get_bounding_rect())
+
+        # moving the camera does not affect the view
+        self.camera.center.x = 500.0
+        self.camera.rotation = 0.0
+        self.camera.update()
+        self.assertEqual(list(self.camera.query_visible(self.arr)), [2])
+        self.assertEqual(view.center.x, 0.0)
+        self.assertEqual(list(view.query_visible(self.arr)), [0, 1])
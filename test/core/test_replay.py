@@ -0,0 +1,64 @@
+import unittest
+import os
+import tempfile
+import pathlib
+import pygame
+
+from core import replay
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        pygame.display.init()
+
+    def tearDown(self) -> None:
+        pygame.display.quit()
+
+    def test_serialize_event(self):
+        event = pygame.event.Event(pygame.MOUSEBUTTONDOWN, {'pos': (3, 4), 'button': 1, 'window': object()})
+        event_type, attributes = replay.serialize_event(event)
+        self.assertEqual(attributes, {'pos': [3, 4], 'button': 1})
+
+        restored = replay.deserialize_event(event_type, attributes)
+        self.assertEqual(restored.type, pygame.MOUSEBUTTONDOWN)
+        self.assertEqual(restored.pos, (3, 4))
+
+    def test_record_and_replay(self):
+        recorder = replay.InputLayer()
+        recorder.start_recording(seed=42)
+
+        pygame.event.clear()
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, {'key': pygame.K_w}))
+        recorder.poll(16.0)
+        self.assertTrue(recorder.is_pressed(pygame.K_w))
+
+        pygame.event.post(pygame.event.Event(pygame.KEYUP, {'key': pygame.K_w}))
+        recorder.poll(20.0)
+        self.assertFalse(recorder.is_pressed(pygame.K_w))
+        self.assertEqual(len(recorder), 2)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = str(pathlib.Path(tmp) / 'session.json')
+            recorder.save(filename)
+
+            player = replay.InputLayer()
+            player.load(filename)
+
+        self.assertEqual(player.seed, 42)
+        self.assertTrue(player.is_replaying())
+
+        # live events and times are replaced by the recorded ones
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, {'key': pygame.K_s}))
+        elapsed_ms, events = player.poll(1000.0)
+        self.assertEqual(elapsed_ms, 16.0)
+        self.assertEqual([event.key for event in events], [pygame.K_w])
+        self.assertTrue(player.is_pressed(pygame.K_w))
+        self.assertFalse(player.is_pressed(pygame.K_s))
+
+        elapsed_ms, _ = player.poll(1000.0)
+        self.assertEqual(elapsed_ms, 20.0)
+        self.assertFalse(player.is_pressed(pygame.K_w))
+        self.assertTrue(player.is_finished())
+
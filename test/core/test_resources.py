@@ -91,6 +91,50 @@ class ResourcesTest(unittest.TestCase):
         tex = resources.texture_from_surface(self.ctx, surf)
         # FIXME: more detailed testing?
         self.assertIsNotNone(tex)
+        self.assertEqual(tex.size, (20, 20))
+
+    def test_texture_from_surface_layout(self):
+        surf = pygame.Surface((3, 2), pygame.SRCALPHA)
+        surf.fill(pygame.Color('blue'))
+        surf.set_at((0, 0), pygame.Color('red'))
+
+        # the surface's bytes are uploaded as they are, with the top row first
+        tex = resources.texture_from_surface(self.ctx, surf)
+        self.assertEqual(tex.read()[:4], surf.get_buffer().raw[:4])
+        self.assertEqual(tex.swizzle, resources.get_swizzle(surf))
+
+    def test_get_swizzle(self):
+        surf = pygame.Surface((2, 2), pygame.SRCALPHA)
+        surf.set_at((0, 0), pygame.Color(10, 20, 30, 40))
+        swizzle = resources.get_swizzle(surf)
+
+        # reading the stored bytes using the swizzle yields RGBA
+        stored = surf.get_buffer().raw[:4]
+        self.assertEqual([stored['RGBA'.index(channel)] for channel in swizzle], [10, 20, 30, 40])
+
+        # missing alpha is always opaque
+        self.assertEqual(resources.get_swizzle(pygame.Surface((2, 2), depth=32))[3], '1')
+
+    def test_streaming_texture(self):
+        streaming = resources.StreamingTexture(self.ctx)
+
+        surf = pygame.Surface((5, 3), pygame.SRCALPHA)
+        surf.fill(pygame.Color('red'))
+        self.assertEqual(streaming.update(surf), pygame.Rect(0, 0, 5, 3))
+        self.assertEqual(streaming.get_texture().size, (5, 3))
+        self.assertEqual(streaming.get_texture().read(), surf.get_buffer().raw)
+
+        # smaller surfaces reuse the texture
+        texture = streaming.get_texture()
+        surf = pygame.Surface((2, 2), pygame.SRCALPHA)
+        self.assertEqual(streaming.update(surf), pygame.Rect(0, 0, 2, 2))
+        self.assertIs(streaming.get_texture(), texture)
+
+        # larger surfaces grow it
+        streaming.update(pygame.Surface((8, 1), pygame.SRCALPHA))
+        self.assertEqual(streaming.get_texture().size, (8, 3))
+
+        streaming.release()
 
     def test_get_png(self):
         file_name = str(self.root / 'image.png')
@@ -197,6 +241,18 @@ class ResourcesTest(unittest.TestCase):
         self.assertEqual(shaders[1], dummy)
         self.assertEqual(shaders[2], dummy)
 
+    def test_get_program(self):
+        file_name = str(self.root / 'shader')
+        with open(f'{file_name}.vert', 'w') as file:
+            file.write('#version 330\nin vec2 pos;\nvoid main() { gl_Position = vec4(pos, 0.0, 1.0); }\n')
+        with open(f'{file_name}.frag', 'w') as file:
+            file.write('#version 330\nout vec4 color;\nvoid main() { color = vec4(1.0); }\n')
+
+        # programs are linked once and shared
+        program = self.cache.get_program(file_name, ['vert', 'frag'])
+        self.assertIsInstance(program, moderngl.Program)
+        self.assertIs(self.cache.get_program(file_name, ['vert', 'frag']), program)
+
     def test_get_font(self):
         # FIXME: not fully implemented yet
         pass
@@ -1,6 +1,7 @@
 import unittest
 import moderngl
 import pygame
+import numpy
 
 from core import sprite
 
@@ -38,6 +39,10 @@ class SpriteTest(unittest.TestCase):
         s.rotation = 135
         s.color = pygame.Color(123, 63, 94)
         s.brightness = 1.32
+        s.frame_start = 2
+        s.num_frames = 4
+        s.fps = 12.5
+        s.phase = 1.5
 
         arr = s.to_array()
         self.assertAlmostEqual(arr[sprite.Offset.POS_X], 70)
@@ -58,6 +63,33 @@ class SpriteTest(unittest.TestCase):
         self.assertAlmostEqual(arr[sprite.Offset.CLIP_W], s.clip.w / self.tex.size[0])
         self.assertAlmostEqual(arr[sprite.Offset.CLIP_H], s.clip.h / self.tex.size[1])
         self.assertAlmostEqual(arr[sprite.Offset.BRIGHTNESS], 1.32, 5)
+        self.assertAlmostEqual(arr[sprite.Offset.FRAME_START], 2)
+        self.assertAlmostEqual(arr[sprite.Offset.NUM_FRAMES], 4)
+        self.assertAlmostEqual(arr[sprite.Offset.FPS], 12.5)
+        self.assertAlmostEqual(arr[sprite.Offset.PHASE], 1.5)
+
+    def test_from_array(self):
+        s = sprite.Sprite(self.tex, clip=pygame.Rect(1, 2, 3, 4), scale=2.5, rotation=135, brightness=1.32,
+                          frame_start=2, num_frames=4, fps=12.5, phase=1.5)
+        s.center.x = 70
+        s.velocity.y = 73
+        s.origin.x = 0.75
+        s.color = pygame.Color(123, 63, 94)
+
+        other = sprite.Sprite.from_array(s.to_array(), self.tex)
+        self.assertEqual(other.center, s.center)
+        self.assertEqual(other.velocity, s.velocity)
+        self.assertEqual(other.origin, s.origin)
+        self.assertEqual(other.color, s.color)
+        self.assertEqual(other.clip, s.clip)
+        self.assertAlmostEqual(other.scale, 2.5)
+        self.assertAlmostEqual(other.rotation, 135)
+        self.assertAlmostEqual(other.brightness, 1.32, 5)
+        self.assertEqual(other.frame_start, 2)
+        self.assertEqual(other.num_frames, 4)
+        self.assertAlmostEqual(other.fps, 12.5)
+        self.assertAlmostEqual(other.phase, 1.5)
+        numpy.testing.assert_array_equal(other.to_array(), s.to_array())
 
     def test_get_center(self):
         s = sprite.Sprite(self.tex, clip=pygame.Rect(1, 2, 10, 8))
@@ -120,3 +152,126 @@ class SpriteArrayTest(unittest.TestCase):
 
         self.arr.clear()
         self.assertEqual(len(self.arr), 0)
+
+    def test_interpolate(self):
+        s = sprite.Sprite(self.tex)
+        self.arr.add(s)
+        self.arr.save_state()
+        self.arr.data[0, sprite.Offset.POS_X] = 10
+        self.arr.data[0, sprite.Offset.POS_Y] = -20
+
+        data = self.arr.interpolate(0.25)
+        self.assertAlmostEqual(data[0, sprite.Offset.POS_X], 2.5)
+        self.assertAlmostEqual(data[0, sprite.Offset.POS_Y], -5.0)
+        self.assertAlmostEqual(self.arr.data[0, sprite.Offset.POS_X], 10)
+
+        # no interpolation if the number of sprites changed
+        self.arr.add(s)
+        data = self.arr.interpolate(0.25)
+        self.assertAlmostEqual(data[0, sprite.Offset.POS_X], 10)
+
+    def test_select_and_remove(self):
+        for x in range(3):
+            s = sprite.Sprite(self.tex)
+            s.center.x = x
+            self.arr.add(s)
+        self.arr.save_state()
+
+        self.arr.select(numpy.array([2, 0, 1]))
+        self.assertAlmostEqual(self.arr.data[0, sprite.Offset.POS_X], 2)
+        self.assertAlmostEqual(self.arr.previous[0, 0], 2)
+
+        self.arr.remove([0])
+        self.assertEqual(len(self.arr), 2)
+        self.assertEqual(self.arr.previous.shape[0], 2)
+        self.assertAlmostEqual(self.arr.previous[0, 0], 0)
+
+    def test_extrapolate(self):
+        s = sprite.Sprite(self.tex)
+        s.center.x = 10
+        s.velocity.x = 0.5
+        s.velocity.y = -0.25
+        self.arr.add(s)
+
+        data = self.arr.extrapolate(8)
+        self.assertAlmostEqual(data[0, sprite.Offset.POS_X], 14)
+        self.assertAlmostEqual(data[0, sprite.Offset.POS_Y], -2)
+        self.assertAlmostEqual(self.arr.data[0, sprite.Offset.POS_X], 10)
+
+    def test_version(self):
+        version = self.arr.version
+        self.arr.add(sprite.Sprite(self.tex))
+        self.assertGreater(self.arr.version, version)
+
+        version = self.arr.version
+        self.arr.touch()
+        self.assertGreater(self.arr.version, version)
+
+    def test_snapshot(self):
+        self.assertIs(self.arr.get_front(), self.arr)
+
+        self.arr.add(sprite.Sprite(self.tex))
+        self.arr.snapshot()
+        self.arr.data[0, sprite.Offset.POS_X] = 42
+        self.arr.add(sprite.Sprite(self.tex))
+
+        front = self.arr.get_front()
+        self.assertEqual(len(front), 1)
+        self.assertAlmostEqual(front.data[0, sprite.Offset.POS_X], 0)
+
+    def test_add_to_foreign_data(self):
+        # e.g. memory-mapped data that cannot be resized in place
+        data = numpy.zeros((4, len(sprite.Offset)), dtype=numpy.float32)
+        self.arr.data = data[:2]
+        self.arr.add(sprite.Sprite(self.tex))
+        self.assertEqual(len(self.arr), 3)
+        self.assertEqual(len(data), 4)
+
+
+class SharedSpriteArrayTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.ctx = moderngl.create_context(standalone=True)
+        self.tex = self.ctx.texture((10, 8), 4)
+        self.arr = sprite.SharedSpriteArray(capacity=2)
+
+    def tearDown(self) -> None:
+        self.arr.release()
+        self.ctx.release()
+
+    def test_add_grows_memory(self):
+        name = self.arr.name
+        for i in range(3):
+            s = sprite.Sprite(self.tex)
+            s.center.x = i
+            self.arr.add(s)
+
+        self.assertEqual(len(self.arr), 3)
+        self.assertNotEqual(self.arr.name, name)
+        numpy.testing.assert_array_equal(self.arr.data[:, sprite.Offset.POS_X], [0, 1, 2])
+
+    def test_attach(self):
+        self.arr.add(sprite.Sprite(self.tex))
+        self.arr.add(sprite.Sprite(self.tex))
+
+        other = sprite.SharedSpriteArray(name=self.arr.name)
+        other.resize(len(self.arr))
+        other.data[1, sprite.Offset.POS_X] = 42
+
+        # both arrays share the same memory
+        self.assertEqual(self.arr.data[1, sprite.Offset.POS_X], 42)
+
+        # only the owner can grow the array
+        with self.assertRaises(ValueError):
+            other.data = numpy.zeros((len(other._buffer) + 1, len(sprite.Offset)), dtype=numpy.float32)
+        other.release()
+
+    def test_select_and_remove(self):
+        for i in range(3):
+            s = sprite.Sprite(self.tex)
+            s.center.x = i
+            self.arr.add(s)
+
+        self.arr.select(numpy.array([2, 0, 1]))
+        self.arr.remove([1])
+        numpy.testing.assert_array_equal(self.arr.data[:, sprite.Offset.POS_X], [2, 1])
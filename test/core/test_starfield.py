@@ -0,0 +1,33 @@
+import unittest
+import moderngl
+import glm
+import numpy
+import pygame
+
+from core import resources, starfield
+
+
+class StarfieldTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.ctx = moderngl.create_context(standalone=True)
+        self.fbo = self.ctx.simple_framebuffer((256, 256))
+        self.fbo.use()
+
+        cache = resources.Cache(self.ctx)
+        self.stars = starfield.Starfield(self.ctx, cache)
+
+    def tearDown(self) -> None:
+        self.ctx.release()
+
+    def render(self) -> numpy.ndarray:
+        self.fbo.clear()
+        self.stars.render(glm.mat4x4(), glm.ortho(-128, 128, -128, 128, 1, -1), pygame.math.Vector2(0, 0), 1.0)
+        return numpy.frombuffer(self.fbo.read(), dtype=numpy.uint8)
+
+    def test_render(self):
+        self.assertGreater(self.render().max(), 0)
+
+    def test_no_layers(self):
+        self.stars.num_layers = 0
+        self.assertEqual(self.render().max(), 0)
@@ -24,3 +24,10 @@ class TextTest(unittest.TestCase):
 
         t.set_string('hello world')
         self.assertIsNotNone(t.sprite)
+        self.assertEqual(t.sprite.clip.size, self.font.render('hello world', True, pygame.Color('white')).get_size())
+
+        # shorter strings are streamed into the same texture
+        texture = t.sprite.texture
+        t.set_string('hello')
+        self.assertIs(t.sprite.texture, texture)
+        self.assertEqual(t.sprite.clip.size, self.font.render('hello', True, pygame.Color('white')).get_size())
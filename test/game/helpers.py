@@ -0,0 +1,32 @@
+import gc
+import unittest
+import numpy
+
+import core
+from core import app
+
+
+def create_rows(positions, velocities=(0.0, 0.0), sizes=0.0) -> numpy.ndarray:
+    """Returns sprite rows with the given positions, velocities and (square) sizes."""
+    data = numpy.zeros((len(positions), len(core.SpriteOffset)), dtype=numpy.float32)
+    data[:, core.SpriteOffset.POS_X:core.SpriteOffset.POS_Y+1] = positions
+    data[:, core.SpriteOffset.VEL_X:core.SpriteOffset.VEL_Y+1] = velocities
+    data[:, core.SpriteOffset.SIZE_X] = sizes
+    data[:, core.SpriteOffset.SIZE_Y] = sizes
+    return data
+
+
+class EngineTestCase(unittest.TestCase):
+    """Provides a headless engine to each test."""
+
+    def setUp(self) -> None:
+        self._fixtures = set(vars(self))
+        self.engine = app.Engine(320, 180, headless=True, seed=0)
+
+    def tearDown(self) -> None:
+        self.engine.context.release()
+        # the engine quits pygame when it is destroyed, which must not happen during the next test. Hence everything
+        # that the test created (e.g. scenes referring to the engine) is dropped now.
+        for name in set(vars(self)) - self._fixtures:
+            delattr(self, name)
+        gc.collect()
@@ -0,0 +1,58 @@
+import unittest
+import numpy
+import pygame
+
+from game import controls
+from test.game.helpers import create_rows
+
+
+
+class SteeringTest(unittest.TestCase):
+
+    def test_normalize(self):
+        vectors = numpy.array([[3.0, 4.0], [0.0, 0.0], [0.0, -2.0]])
+        numpy.testing.assert_allclose(controls.normalize(vectors), [[0.6, 0.8], [0.0, 0.0], [0.0, -1.0]])
+
+    def test_get_forward(self):
+        rotations = numpy.array([0.0, 45.0, 90.0, -135.0])
+        expected = [pygame.math.Vector2(0, 1).rotate(rotation).xy for rotation in rotations]
+        numpy.testing.assert_allclose(controls.get_forward(rotations), expected, atol=1e-6)
+
+    def test_steer_seek_and_flee(self):
+        positions = numpy.array([[0.0, 0.0], [10.0, 10.0], [5.0, 0.0]])
+        target = numpy.array([10.0, 0.0])
+        seek = controls.steer_seek(positions, target)
+        numpy.testing.assert_allclose(seek, [[1.0, 0.0], [0.0, -1.0], [1.0, 0.0]])
+        numpy.testing.assert_allclose(controls.steer_flee(positions, target), -seek)
+
+    def test_steer_pursuit(self):
+        positions = numpy.array([[0.0, 0.0]])
+        direction = controls.steer_pursuit(positions, numpy.array([10.0, 0.0]), numpy.array([0.0, 0.02]), 500.0)
+        # aims at the target's predicted position (10, 10)
+        numpy.testing.assert_allclose(direction, [[numpy.sqrt(0.5), numpy.sqrt(0.5)]])
+
+    def test_steer_separation(self):
+        data = create_rows([(0.0, 0.0), (50.0, 0.0), (1000.0, 1000.0)])
+        direction = controls.steer_separation(data, 100.0)
+        # both neighbors are pushed apart by half the weight, the distant one is not affected
+        numpy.testing.assert_allclose(direction, [[-0.5, 0.0], [0.5, 0.0], [0.0, 0.0]])
+
+    def test_steer_separation_across_regions(self):
+        # neighbors on both sides of a region border still repel each other
+        data = create_rows([(99.0, 0.0), (101.0, 0.0)])
+        direction = controls.steer_separation(data, 100.0)
+        numpy.testing.assert_allclose(direction, [[-0.98, 0.0], [0.98, 0.0]], rtol=1e-5)
+
+    def test_steer_separation_matches_brute_force(self):
+        rng = numpy.random.default_rng(0)
+        positions = rng.uniform(-500.0, 500.0, (200, 2)).astype(numpy.float32)
+        direction = controls.steer_separation(create_rows(positions), 100.0)
+
+        diff = positions[:, numpy.newaxis, :] - positions[numpy.newaxis, :, :]
+        dist = numpy.linalg.norm(diff, axis=2, keepdims=True)
+        weight = numpy.clip(1.0 - dist / 100.0, 0.0, None)
+        away = numpy.divide(diff, dist, out=numpy.zeros_like(diff), where=dist > 0)
+        numpy.testing.assert_allclose(direction, numpy.sum(away * weight, axis=1), atol=1e-5)
+
+    def test_steer_separation_empty(self):
+        self.assertEqual(controls.steer_separation(create_rows(numpy.zeros((0, 2))), 100.0).shape, (0, 2))
@@ -0,0 +1,82 @@
+import unittest
+import numpy
+
+import core
+import game
+from game import physics
+from test.game.helpers import EngineTestCase, create_rows
+
+
+
+class PhysicsSystemTest(EngineTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.scene = game.Scene(self.engine)
+        self.collisions = list()
+        self.physics = game.PhysicsSystem(self.scene, lambda *args: self.collisions.append(args))
+
+    def test_far_asteroids_catch_up(self):
+        # one asteroid near the camera, one far away
+        self.scene.asteroids.append(create_rows([(0, 0), (10_000, 0)], [(0.1, 0.0), (0.1, 0.05)], [20, 10]))
+
+        num_ticks = physics.FAR_TICK_RATE * 2 + 3
+        for _ in range(num_ticks):
+            self.physics.update_asteroids_movement(16)
+        self.physics.flush()
+
+        # the far asteroid ends where integrating every tick would have moved it
+        data = self.scene.asteroids.data
+        self.assertAlmostEqual(data[1, core.SpriteOffset.POS_X], 10_000 + 0.1 * 16 * num_ticks, places=2)
+        self.assertAlmostEqual(data[1, core.SpriteOffset.POS_Y], 0.05 * 16 * num_ticks, places=3)
+        self.assertAlmostEqual(data[1, core.SpriteOffset.ROTATION], physics.ASTEROID_SPIN * 16 * num_ticks, places=3)
+        self.assertAlmostEqual(data[0, core.SpriteOffset.POS_X], 0.1 * 16 * num_ticks, places=3)
+
+    def test_appending_keeps_pending_motion(self):
+        self.scene.asteroids.append(create_rows([(10_000, 0)], [(0.1, 0.0)], [20]))
+        for _ in range(3):
+            self.physics.update_asteroids_movement(16)
+
+        # e.g. a chunk that was streamed in
+        self.scene.asteroids.append(create_rows([(20_000, 0)], [(0.1, 0.0)], [10]))
+        for _ in range(physics.FAR_TICK_RATE):
+            self.physics.update_asteroids_movement(16)
+        self.physics.flush()
+
+        data = self.scene.asteroids.data
+        self.assertAlmostEqual(data[0, core.SpriteOffset.POS_X], 10_000 + 0.1 * 16 * (3 + physics.FAR_TICK_RATE),
+                               places=2)
+        self.assertAlmostEqual(data[1, core.SpriteOffset.POS_X], 20_000 + 0.1 * 16 * physics.FAR_TICK_RATE,
+                               places=2)
+
+    def test_flush_without_pending_motion(self):
+        self.scene.asteroids.append(create_rows([(0, 0)], [(0.1, 0.0)], [20]))
+        self.physics.update_asteroids_movement(16)
+        version = self.scene.asteroids.version
+
+        # nothing is pending near the camera
+        self.physics.flush()
+        self.assertEqual(self.scene.asteroids.version, version)
+
+
+class SweptCollisionTest(unittest.TestCase):
+
+    def test_tunneling_pair(self):
+        # within one step, both pass through each other and end far apart
+        data = create_rows([(50, 0), (-50, 0)], [(1.0, 0.0), (-1.0, 0.0)], [10, 10])
+        indices = numpy.arange(2)
+        self.assertEqual(physics.query_collision_indices(data, indices[:1], data, indices[1:], 1.0), [])
+
+        collisions = physics.query_swept_collision_indices(data, indices[:1], 100.0, data, indices[1:], 100.0, 1.0)
+        self.assertEqual(len(collisions), 1)
+        first, second, time_of_impact = collisions[0]
+        self.assertEqual((first, second), (0, 1))
+        # they touch after moving 45 of 100 units each
+        self.assertAlmostEqual(time_of_impact, 0.45, places=5)
+
+    def test_diverging_pair(self):
+        # close at the start of the step but moving apart
+        data = create_rows([(16, 0), (-16, 0)], [(0.1, 0.0), (-0.1, 0.0)], [10, 10])
+        indices = numpy.arange(2)
+        self.assertEqual(physics.query_swept_collision_indices(data, indices[:1], 100.0, data, indices[1:], 100.0,
+                                                               1.0), [])
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import numpy
+
+import core
+import game
+from test.game.helpers import EngineTestCase
+
+
+class SceneTest(EngineTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'test.scene')
+        self.scene = game.Scene(self.engine)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    def test_save_after_load(self):
+        data = numpy.zeros((5_000, len(core.SpriteOffset)), dtype=numpy.float32)
+        data[:, core.SpriteOffset.POS_X] = numpy.arange(len(data))
+        self.scene.asteroids.append(data)
+        self.scene.save(self.path)
+
+        # e.g. quickload followed by quicksave
+        self.scene.load(self.path)
+        self.scene.save(self.path)
+
+        self.scene.asteroids.clear()
+        self.scene.load(self.path)
+        numpy.testing.assert_array_equal(self.scene.asteroids.data, data)
+
+    def test_load_particle_columns(self):
+        core.save_arrays(self.path, {
+            'spacecrafts': self.scene.spacecrafts.data,
+            'asteroids': self.scene.asteroids.data,
+            'particles': numpy.zeros((3, self.scene.particles.data.shape[1] + 1), dtype=numpy.float32)
+        }, {'texture_refs': {}})
+
+        with self.assertRaises(ValueError):
+            self.scene.load(self.path)
@@ -0,0 +1,56 @@
+import numpy
+
+import game
+from test.game.helpers import EngineTestCase, create_rows
+
+
+
+class ShardedPhysicsSystemTest(EngineTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.scene = game.Scene(self.engine, shared_asteroids=True)
+        self.collisions = list()
+        self.physics = game.ShardedPhysicsSystem(self.scene, lambda *args: self.collisions.append(args),
+                                                 continuous=True, num_shards=2)
+
+        # reference that simulates all regions every tick, like the sharded system
+        self.reference_scene = game.Scene(self.engine)
+        self.reference_collisions = list()
+        self.reference = game.PhysicsSystem(self.reference_scene, lambda *args: self.reference_collisions.append(args),
+                                            continuous=True)
+        self.reference.far_tick_rate = 1
+
+    def tearDown(self) -> None:
+        self.physics.shutdown()
+        self.scene.release()
+        super().tearDown()
+
+    def test_matches_physics_system(self):
+        rng = numpy.random.default_rng(0)
+        num_asteroids = 60
+        # distinct sizes, so both systems sort the asteroids the same way
+        data = create_rows(rng.uniform(-300.0, 300.0, (num_asteroids, 2)), rng.uniform(-0.2, 0.2, (num_asteroids, 2)),
+                           numpy.linspace(10.0, 40.0, num_asteroids))
+        self.scene.asteroids.append(data)
+        self.reference_scene.asteroids.append(data.copy())
+
+        for _ in range(5):
+            self.physics.update(16)
+            self.reference.update(16)
+
+        numpy.testing.assert_allclose(self.scene.asteroids.data, self.reference_scene.asteroids.data, atol=1e-3)
+        self.assertGreater(len(self.reference_collisions), 0)
+        self.assertEqual(set(self.collisions), set(self.reference_collisions))
+
+    def test_far_ticks(self):
+        self.scene.asteroids.append(create_rows([(0, 0)], [(0.1, 0.0)], [20]))
+
+        far_ticks = list()
+        for _ in range(self.physics.far_tick_rate * 2):
+            self.physics.update_asteroids_movement(16)
+            far_ticks.append(self.physics.is_far_tick())
+
+        # e.g. streaming pages the world only on far ticks
+        self.assertEqual(far_ticks.count(True), 2)
+        self.assertTrue(far_ticks[-1])
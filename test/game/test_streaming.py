@@ -0,0 +1,87 @@
+import os
+import tempfile
+import numpy
+
+import core
+import game
+from test.game.helpers import EngineTestCase, create_rows
+
+
+def create_numbered_rows(positions) -> numpy.ndarray:
+    """Returns sprite rows at the given positions, numbered by their size."""
+    return create_rows(positions, sizes=numpy.arange(1, len(positions) + 1))
+
+
+def sort_rows(data: numpy.ndarray) -> numpy.ndarray:
+    return data[numpy.argsort(data[:, core.SpriteOffset.SIZE_X])]
+
+
+class WorldStreamerTest(EngineTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.scene = game.Scene(self.engine)
+        # only the chunk around the camera is kept in memory
+        self.streaming = game.WorldStreamer(self.scene, self.tmp_dir.name, chunk_size=1000.0, radius=0)
+
+    def tearDown(self) -> None:
+        self.streaming.shutdown()
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    def test_store_and_page(self):
+        data = create_numbered_rows([(100, 100), (200, -300), (1500, 100), (-2500, 4000)])
+        self.assertFalse(self.streaming.has_chunks())
+        self.streaming.store(data)
+        self.assertTrue(self.streaming.has_chunks())
+
+        # only the asteroid near the camera is paged in
+        self.streaming.page()
+        numpy.testing.assert_array_equal(sort_rows(self.scene.asteroids.data), data[[0]])
+
+        # and all asteroids are on disk again after shutdown
+        self.streaming.shutdown()
+        stored = numpy.concatenate([numpy.load(os.path.join(self.tmp_dir.name, name))
+                                    for name in os.listdir(self.tmp_dir.name)])
+        numpy.testing.assert_array_equal(sort_rows(stored), sort_rows(data))
+
+    def test_store_into_loaded_chunk(self):
+        self.streaming.page()
+        self.streaming.store(create_numbered_rows([(100, 100)]))
+        self.assertEqual(len(self.scene.asteroids), 1)
+
+    def test_moving_into_stored_chunk(self):
+        data = create_numbered_rows([(100, 100), (1500, 100)])
+        self.streaming.store(data)
+        self.streaming.page()
+        self.assertEqual(len(self.scene.asteroids), 1)
+
+        # the asteroid moves into the chunk on disk and is stored along with it
+        self.scene.asteroids.data[0, core.SpriteOffset.POS_X] = 1600
+        self.streaming.page()
+        self.assertEqual(len(self.scene.asteroids), 0)
+        self.assertEqual(len(self.streaming.read_chunk((1, 0))), 2)
+
+        # both are paged in once the camera follows
+        self.scene.camera.center.x = 1500
+        self.streaming.page()
+        numpy.testing.assert_array_equal(self.scene.asteroids.data[:, core.SpriteOffset.POS_X], [1500, 1600])
+        # while the chunk it left is stored without it
+        self.assertEqual(len(self.streaming.read_chunk((0, 0))), 0)
+
+    def test_prefetch_invalidation(self):
+        self.streaming.store(create_numbered_rows([(100, 100)]))
+        self.streaming.update(16)
+        self.streaming._prefetched[(0, 0)].result()
+
+        # the chunk changes after it was read ahead of time
+        replaced = create_numbered_rows([(200, 200), (300, 300)])
+        self.streaming.write_chunk((0, 0), replaced)
+        self.streaming.page()
+        numpy.testing.assert_array_equal(self.scene.asteroids.data, replaced)
+
+    def test_read_chunk_columns(self):
+        numpy.save(self.streaming.get_path((0, 0)), numpy.zeros((3, len(core.SpriteOffset) - 4), dtype=numpy.float32))
+        with self.assertRaises(ValueError):
+            self.streaming.read_chunk((0, 0))